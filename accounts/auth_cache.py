@@ -0,0 +1,75 @@
+"""Request user loaded with its ``StudentProfile`` in one query, cached per user.
+
+``CachedAuthenticationMiddleware`` replaces Django's ``AuthenticationMiddleware``.
+The logged-in user is read as ``User`` + ``studentprofile`` with one
+``select_related`` query, or from the cache. So ``{{ user.studentprofile }}`` in
+templates costs nothing extra. The cached row is dropped whenever the user or
+their profile is saved or deleted (``accounts.signals``).
+
+The session auth hash is still checked against the cached row on every request.
+A password change saves the user, which evicts the row, so other sessions are
+logged out just as they would be without the cache. Anything unusual (another
+auth backend, a hash mismatch, an inactive user) goes through
+``django.contrib.auth.get_user`` unchanged.
+
+Settings: ``AUTH_USER_CACHE_TIMEOUT`` (0 disables the cache, the single query stays).
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def _key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(_key(user_id))
+
+
+def load_user(user_id):
+    """User with ``studentprofile`` joined (a missing profile is cached as absent too)."""
+    timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 0)
+    user = cache.get(_key(user_id)) if timeout else None
+    if user is None:
+        user = User.objects.select_related('studentprofile').filter(pk=user_id).first()
+        if user is not None and timeout:
+            cache.set(_key(user_id), user, timeout)
+    return user
+
+
+def get_user(request):
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    if user_id is None or backend_path != MODEL_BACKEND or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+    user = load_user(User._meta.pk.to_python(user_id))
+    session_hash = session.get(HASH_SESSION_KEY)
+    if (
+        user is None or not user.is_active
+        or not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()))
+    ):
+        # Flush / fallback-key handling stays with Django
+        return auth.get_user(request)
+    user.backend = backend_path
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+
+        def lazy_user():
+            if not hasattr(request, '_cached_user'):
+                request._cached_user = get_user(request)
+            return request._cached_user
+
+        request.user = SimpleLazyObject(lazy_user)
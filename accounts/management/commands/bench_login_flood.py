@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from accounts import throttle
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmark chống dò mật khẩu: mô phỏng đợt đăng nhập ồ ạt trên đồng hồ giả lập '
+            '(dữ liệu được rollback sau khi chạy)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=600_000)
+        parser.add_argument('--rate', type=int, default=1000, help='Số request/giây của đợt tấn công')
+        parser.add_argument('--ips', type=int, default=200, help='Số IP tấn công')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['requests'], options['rate'], options['ips'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, n, rate, ips):
+        """Replay login_view's decision path (throttle check -> hash -> record) for ``n``
+        attempts spaced ``1/rate`` apart on a simulated clock, so lockouts expire as they
+        would in production. Attack hashes are counted and charged at their measured cost
+        instead of being run; the throttle work is timed for real."""
+        rng = random.Random(42)
+        tag = time.time_ns()
+        victim = User.objects.create_user(username=f'__bench_{tag}', password='correct-horse-42')
+        factory = RequestFactory()
+
+        start = time.perf_counter()
+        for _ in range(3):
+            authenticate(username=victim.username, password='wrong')
+        hash_cost = (time.perf_counter() - start) / 3
+        self.stdout.write(f'authenticate() (1 password hash): {hash_cost * 1000:.1f} ms')
+
+        # 10.<run>.x.y: fresh counters on every run
+        attackers = [factory.post('/', REMOTE_ADDR=f'10.{tag % 250}.{i // 250}.{i % 250}') for i in range(ips)]
+        t0 = time.time()
+        hashed = rejected = 0
+        hashed_per_minute = [0] * -(-n // (rate * 60))
+        throttle_time = 0.0
+        honest = []
+        for i in range(n):
+            now = t0 + i / rate
+            request, username = rng.choice(attackers), f'user{rng.randrange(10 ** 6)}'
+            start = time.perf_counter()
+            if throttle.blocked(request, username, now=now):
+                rejected += 1
+            else:
+                hashed += 1
+                hashed_per_minute[i // (rate * 60)] += 1
+                throttle.record_failure(request, username, now=now)
+            throttle_time += time.perf_counter() - start
+            if i % (rate * 5) == 0:  # an honest user from elsewhere logs in during the flood
+                request = factory.post('/', REMOTE_ADDR=f'192.0.2.{len(honest) % 250}')
+                start = time.perf_counter()
+                ok = not throttle.blocked(request, victim.username, now=now) and authenticate(
+                    request, username=victim.username, password='correct-horse-42') is not None
+                honest.append((ok, time.perf_counter() - start))
+
+        seconds = n / rate
+        busy = throttle_time + hashed * hash_cost
+        self.stdout.write(f'Flood: {n} attempts @ {rate}/s from {ips} IPs ({seconds:.0f} s simulated)')
+        self.stdout.write(f'  hashed {hashed}, rejected before hashing {rejected}')
+        self.stdout.write(f'  throttle overhead {throttle_time / n * 1e6:.0f} us/attempt')
+        self.stdout.write(f'  CPU needed {busy / seconds:.2f} cores '
+                          f'(without throttling {n * hash_cost / seconds:.0f} cores)')
+        self.stdout.write('  hashes per minute: ' + ' '.join(map(str, hashed_per_minute)))
+        self.stdout.write(f'Honest logins during flood: {sum(ok for ok, _ in honest)}/{len(honest)} ok, '
+                          f'median {statistics.median(t for _, t in honest) * 1000:.0f} ms')
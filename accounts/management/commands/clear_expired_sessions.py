@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts.sessions import delete_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Xoá các phiên đăng nhập đã hết hạn theo từng lô nhỏ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Số giây nghỉ giữa các lô để giảm tải cho database')
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_sessions(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Đã xoá {deleted} phiên hết hạn'))
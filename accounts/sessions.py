@@ -0,0 +1,27 @@
+"""Expired-session cleanup in bounded batches.
+
+``clearsessions`` deletes every expired row in one statement, which on a
+large ``django_session`` table holds locks (and grows the undo log) for
+the whole run. This deletes ``batch_size`` keys at a time, walking the
+``expire_date`` index, with an optional pause between batches.
+"""
+import time
+
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+
+def delete_expired_sessions(batch_size=1000, pause=0, now=None):
+    """Delete expired sessions; returns the number deleted."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by('expire_date').values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,17 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth_cache import invalidate_user
+from .models import StudentProfile
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Password / permission / last_login changes: reload the request user."""
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
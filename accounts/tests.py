@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import StudentProfile
+from . import throttle
+from .sessions import delete_expired_sessions
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=300)
+class CachedRequestUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='sv1', password='pass12345')
+        StudentProfile.objects.create(
+            user=self.user, student_code='SV001', full_name='Nguyễn Văn A',
+            phone='0912345678', faculty='CNTT', class_name='K20',
+        )
+        self.client.force_login(self.user)
+
+    def test_profile_page_queries(self):
+        url = reverse('accounts:profile')
+        with self.assertNumQueries(2):  # session + user joined with profile
+            resp = self.client.get(url)
+        self.assertContains(resp, 'SV001')
+        with self.assertNumQueries(1):  # session only
+            self.client.get(url)
+
+    def test_profile_change_is_visible_next_request(self):
+        url = reverse('accounts:profile')
+        self.client.get(url)
+        StudentProfile.objects.filter(pk=self.user.pk).update(full_name='stale')  # bypasses signals
+        self.assertNotContains(self.client.get(url), 'stale')
+        profile = StudentProfile.objects.get(pk=self.user.pk)
+        profile.full_name = 'Trần Thị B'
+        profile.save()
+        self.assertContains(self.client.get(url), 'Trần Thị B')
+
+    def test_password_change_ends_other_sessions(self):
+        url = reverse('accounts:profile')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.set_password('new-pass-678')
+        self.user.save()
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn(reverse('accounts:login'), resp['Location'])
+
+
+class ExpiredSessionCleanupTests(TestCase):
+    def test_deletes_only_expired_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'old{i}', session_data='', expire_date=now - timedelta(days=1)) for i in range(25)]
+            + [Session(session_key=f'new{i}', session_data='', expire_date=now + timedelta(days=1)) for i in range(3)]
+        )
+        with self.assertNumQueries(3 * 2 + 1):  # (select keys + delete) per batch, final empty select
+            self.assertEqual(delete_expired_sessions(batch_size=10, now=now), 25)
+        self.assertEqual(Session.objects.count(), 3)
+
+
+@override_settings(
+    LOGIN_THROTTLE_WINDOW=60, LOGIN_THROTTLE_USER_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=5,
+    LOGIN_LOCKOUT_SECONDS=30, LOGIN_LOCKOUT_MAX_SECONDS=100,
+)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches[throttle.CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='sv1', password='pass12345')
+        self.url = reverse('accounts:login')
+
+    def _login(self, username, password='wrong', ip='10.0.0.1'):
+        return self.client.post(self.url, {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_username_lockout_rejects_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self._login('sv1').status_code, 200)
+        with self.assertNumQueries(0):  # no user lookup, no hash
+            resp = self._login('SV1', password='pass12345', ip='10.0.0.2')
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp['Retry-After'], '30')
+        # Other accounts from another address are unaffected
+        self.assertEqual(self._login('other', ip='10.0.0.3').status_code, 200)
+
+    def test_ip_lockout_and_progressive_lockout(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.9')
+        now = 1_000_000.0
+        lockouts = []
+        for attempt in range(12):
+            if throttle.blocked(request, f'u{attempt}', now=now):
+                now += 1
+                continue
+            lockouts.append(throttle.record_failure(request, f'u{attempt}', now=now))
+            now += 1
+        self.assertEqual([s for s in lockouts if s], [30])
+        now += 30
+        self.assertEqual(throttle.blocked(request, 'anyone', now=now), 0)
+        lockouts = [throttle.record_failure(request, f'v{i}', now=now) for i in range(5)]
+        self.assertEqual(lockouts[-1], 60)  # doubled on the second offence
+
+    def test_sliding_window_forgets_old_failures(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.5')
+        now = 1_000_020.0  # start of a 60 s bucket
+        for _ in range(2):
+            throttle.record_failure(request, 'sv1', now=now)
+        # 1/3 into the next bucket the old failures weigh 2/3: 1 + 2 * 2/3 is below the limit of 3
+        self.assertEqual(throttle.record_failure(request, 'sv1', now=now + 80), 0)
+        self.assertEqual(throttle.blocked(request, 'sv1', now=now + 80), 0)
+
+    def test_success_resets_username_counter(self):
+        self._login('sv1')
+        self._login('sv1')
+        self.assertEqual(self._login('sv1', password='pass12345').status_code, 302)
+        self.client.logout()
+        self._login('sv1')
+        self._login('sv1')
+        self.assertEqual(self._login('sv1', password='pass12345').status_code, 302)
@@ -0,0 +1,105 @@
+"""Login throttling before any password hashing.
+
+Failed logins are counted per client IP and per username in the shared
+cache, using a sliding-window estimate over two fixed buckets:
+``current + previous * (1 - elapsed fraction)``. Each check is a single
+``get_many`` and each failure is a few ``incr``. Every key expires after
+two windows, so memory stays bounded.
+
+Once a counter reaches its limit, the IP or username is locked out for
+``LOGIN_LOCKOUT_SECONDS``. The lockout doubles with every repeat offence,
+up to ``LOGIN_LOCKOUT_MAX_SECONDS``. This is the progressive delay. It is
+enforced by refusing requests (``Retry-After``) instead of sleeping, so
+a flood never ties up workers. A locked-out attempt is rejected before
+``authenticate()`` runs the password hasher.
+
+Counters live in the ``login_throttle`` cache alias. It must be shared
+between workers (Redis/Memcached). With the default LocMemCache every
+process keeps its own counters.
+
+Settings: ``LOGIN_THROTTLE_WINDOW``, ``LOGIN_THROTTLE_USER_LIMIT``,
+``LOGIN_THROTTLE_IP_LIMIT``, ``LOGIN_LOCKOUT_SECONDS``,
+``LOGIN_LOCKOUT_MAX_SECONDS``, ``LOGIN_THROTTLE_IP_HEADER``.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+STRIKE_TTL = 24 * 3600
+CACHE_ALIAS = 'login_throttle'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def client_ip(request):
+    header = _setting('LOGIN_THROTTLE_IP_HEADER', '')
+    if header and request.META.get(header):
+        # e.g. HTTP_X_FORWARDED_FOR set by our own proxy: the first hop is the client
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _subjects(request, username):
+    user_key = hashlib.md5((username or '').strip().lower().encode()).hexdigest()
+    return [
+        ('ip', client_ip(request), _setting('LOGIN_THROTTLE_IP_LIMIT', 20)),
+        ('user', user_key, _setting('LOGIN_THROTTLE_USER_LIMIT', 5)),
+    ]
+
+
+def _bucket_keys(scope, ident, now, window):
+    bucket = int(now // window)
+    return f'login:{scope}:{ident}:{bucket}', f'login:{scope}:{ident}:{bucket - 1}'
+
+
+def blocked(request, username, now=None):
+    """Seconds until this login attempt may be tried, or 0 if it may go ahead."""
+    now = now or time.time()
+    keys = [f'login:lock:{scope}:{ident}' for scope, ident, _ in _subjects(request, username)]
+    until = max(_cache().get_many(keys).values(), default=0)
+    return max(0, math.ceil(until - now))
+
+
+def record_failure(request, username, now=None):
+    """Count a failed login. Returns the lockout in seconds it triggered, or 0."""
+    now = now or time.time()
+    window = _setting('LOGIN_THROTTLE_WINDOW', 300)
+    cache = _cache()
+    lockout = 0
+    for scope, ident, limit in _subjects(request, username):
+        current, previous = _bucket_keys(scope, ident, now, window)
+        cache.add(current, 0, 2 * window)
+        count = cache.incr(current)
+        elapsed = (now % window) / window
+        estimate = count + (cache.get(previous) or 0) * (1 - elapsed)
+        if estimate < limit:
+            continue
+        strike_key = f'login:strikes:{scope}:{ident}'
+        cache.add(strike_key, 0, STRIKE_TTL)
+        strikes = cache.incr(strike_key)
+        seconds = min(
+            _setting('LOGIN_LOCKOUT_SECONDS', 30) * 2 ** (strikes - 1),
+            _setting('LOGIN_LOCKOUT_MAX_SECONDS', 900),
+        )
+        cache.set(f'login:lock:{scope}:{ident}', now + seconds, seconds)
+        # The window starts over after the lockout
+        cache.delete_many([current, previous])
+        lockout = max(lockout, seconds)
+    return lockout
+
+
+def record_success(request, username, now=None):
+    """Forget the username's failures (the IP counter keeps running)."""
+    now = now or time.time()
+    ident = _subjects(request, username)[1][1]
+    window = _setting('LOGIN_THROTTLE_WINDOW', 300)
+    _cache().delete_many([*_bucket_keys('user', ident, now, window), f'login:strikes:user:{ident}'])
@@ -3,6 +3,7 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import StudentRegistrationForm
+from . import throttle
 
 def register_view(request):
     if request.method == 'POST':
@@ -20,12 +21,21 @@ def login_view(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
+        # Checked before authenticate() so a flood never reaches the password hasher
+        retry = throttle.blocked(request, username)
+        if retry:
+            messages.error(request, f'Đăng nhập sai quá nhiều lần. Vui lòng thử lại sau {retry} giây.')
+            response = render(request, 'accounts/login.html', status=429)
+            response['Retry-After'] = str(retry)
+            return response
         user = authenticate(request, username=username, password=password)
         if user:
+            throttle.record_success(request, username)
             login(request, user)
             messages.success(request, f'Chào mừng {user.username}!')
             return redirect(request.GET.get('next', 'home'))
         else:
+            throttle.record_failure(request, username)
             messages.error(request, 'Tên đăng nhập hoặc mật khẩu không đúng')
     return render(request, 'accounts/login.html')
 
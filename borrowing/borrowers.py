@@ -0,0 +1,97 @@
+"""Per-user loan counters (``BorrowerStats``).
+
+Submitting, cancelling, approving, returning and the overdue sweep adjust
+the counters with ``F()`` updates in their own transactions, so policy
+checks and the "my requests" summary read one row instead of running COUNT
+queries over the user's history. ``rebuild_borrower_stats`` recomputes
+them from history.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+
+from .models import BorrowerStats, BorrowRequest, BorrowTransaction
+
+OPEN_STATUSES = ['BORROWING', 'OVERDUE', 'RETURN_PENDING']
+
+
+def bump_borrowers(field, per_user):
+    """Add ``per_user[user_id]`` to ``field`` for each user (one UPDATE per distinct delta)."""
+    per_user = {user_id: delta for user_id, delta in per_user.items() if delta}
+    if not per_user:
+        return
+    BorrowerStats.objects.bulk_create(
+        [BorrowerStats(user_id=user_id) for user_id in per_user], ignore_conflicts=True,
+    )
+    by_delta = defaultdict(list)
+    for user_id, delta in per_user.items():
+        by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        rows = BorrowerStats.objects.filter(user_id__in=user_ids)
+        if delta < 0:
+            # Never go negative if the counters drifted (rebuild_borrower_stats repairs them)
+            rows = rows.filter(**{f'{field}__gte': -delta})
+        rows.update(**{field: F(field) + delta})
+
+
+def bump_borrower(user_id, **deltas):
+    """Apply several deltas to one user's counters in a single UPDATE."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    BorrowerStats.objects.bulk_create([BorrowerStats(user_id=user_id)], ignore_conflicts=True)
+    BorrowerStats.objects.filter(user_id=user_id).update(**{
+        # Clamp at zero without computing a negative (unsigned columns on MySQL)
+        field: F(field) + delta if delta > 0 else Case(When(**{f'{field}__gte': -delta}, then=F(field) + delta), default=0)
+        for field, delta in deltas.items()
+    })
+
+
+def get_borrower_stats(user_ids):
+    """Return ``{user_id: BorrowerStats}``; users without a row get zeroed counters."""
+    found = BorrowerStats.objects.in_bulk(list(user_ids))
+    return {user_id: found.get(user_id) or BorrowerStats(user_id=user_id) for user_id in user_ids}
+
+
+def borrow_block_reason(stats):
+    """Why this borrower may not submit another request right now, or None."""
+    max_pending = getattr(settings, 'BORROW_MAX_PENDING_REQUESTS', 5)
+    if max_pending is not None and stats.pending_requests >= max_pending:
+        return f'Bạn đang có {stats.pending_requests} yêu cầu chờ duyệt, vui lòng chờ xử lý trước khi gửi thêm'
+    return None
+
+
+def rebuild_borrower_stats():
+    """Recompute every counter with two GROUP BYs. Returns the number of rows written."""
+    counters = defaultdict(dict)
+    loans = (
+        BorrowTransaction.objects
+        .values('borrow_request__user_id')
+        .annotate(
+            active=Count('id', filter=Q(status__in=OPEN_STATUSES)),
+            overdue=Count('id', filter=Q(status='OVERDUE')),
+            lifetime=Count('id'),
+            fines=Sum('fine_amount', filter=Q(status='RETURNED')),
+        )
+        .order_by()
+    )
+    for row in loans:
+        counters[row['borrow_request__user_id']].update(
+            active_loans=row['active'], overdue_loans=row['overdue'],
+            lifetime_borrows=row['lifetime'], total_fines=row['fines'] or 0,
+        )
+    pending = (
+        BorrowRequest.objects.filter(status='PENDING')
+        .values('user_id').annotate(count=Count('id')).order_by()
+    )
+    for row in pending:
+        counters[row['user_id']]['pending_requests'] = row['count']
+
+    with transaction.atomic():
+        BorrowerStats.objects.all().delete()
+        BorrowerStats.objects.bulk_create([
+            BorrowerStats(user_id=user_id, **fields) for user_id, fields in counters.items()
+        ], batch_size=1000)
+    return len(counters)
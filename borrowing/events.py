@@ -0,0 +1,148 @@
+"""Live update pub/sub for the SSE stream (``borrowing:live_events``).
+
+Write paths call ``publish_book_stock`` / ``publish_request_status``; the
+message goes out after commit on a channel (``book:<id>``, ``user:<id>``).
+Each open SSE connection is one ``asyncio.Queue`` registered on the
+channels it watches, so idle connections cost a few hundred bytes and a
+publish only touches the watchers of that channel.
+
+The backend is ``LIVE_EVENTS_BACKEND``. ``InProcessBroker`` (default) fans
+out inside one process; ``RedisBroker`` relays through Redis pub/sub so
+every node's local subscribers see writes made on any node.
+
+The stream is only served with ``LIVE_EVENTS_ENABLED`` under ASGI: WSGI
+drains a streaming response's async iterator before sending anything, so
+a never-ending stream would hold a worker thread forever.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # channel -> {(loop, queue)}
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        """Yield a queue of ``(event, data)`` for ``channels`` until the block exits."""
+        entry = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                for channel in channels:
+                    watchers = self._subscribers.get(channel)
+                    if watchers is not None:
+                        watchers.discard(entry)
+                        if not watchers:
+                            del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, event, data):
+        """Thread-safe: callable from sync views running outside the event loop."""
+        with self._lock:
+            watchers = list(self._subscribers.get(channel, ()))
+        for loop, queue in watchers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, (event, data))
+            except RuntimeError:
+                pass  # loop already closed; the subscription is being torn down
+
+
+def _offer(queue, message):
+    if queue.full():
+        # Slow consumer: drop its oldest message rather than grow without bound
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class RedisBroker(InProcessBroker):
+    """Multi-node backend: publishes go through Redis, a listener thread fans them out locally.
+
+    Requires the ``redis`` package and ``LIVE_EVENTS_REDIS_URL``.
+    """
+    PREFIX = 'bookclub:live:'
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.LIVE_EVENTS_REDIS_URL)
+        self._listener = threading.Thread(target=self._listen, name='live-events', daemon=True)
+        self._listener.start()
+
+    def publish(self, channel, event, data):
+        self._redis.publish(self.PREFIX + channel, json.dumps({'event': event, 'data': data}))
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.PREFIX + '*')
+        for message in pubsub.listen():
+            try:
+                channel = message['channel'].decode()[len(self.PREFIX):]
+                payload = json.loads(message['data'])
+                super().publish(channel, payload['event'], payload['data'])
+            except Exception:
+                logger.exception('Bad live event from Redis: %r', message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'LIVE_EVENTS_BACKEND', 'borrowing.events.InProcessBroker')
+                _broker = import_string(backend)()
+    return _broker
+
+
+def live_events_enabled(request):
+    """Whether pages may open the SSE stream for ``request``."""
+    return getattr(settings, 'LIVE_EVENTS_ENABLED', False) and isinstance(request, ASGIRequest)
+
+
+def publish_book_stock(book_id):
+    """After commit, push the book's current ``available_copies`` to its watchers."""
+    def send():
+        from library.models import Book
+
+        broker = get_broker()
+        if isinstance(broker, RedisBroker) or broker.subscriber_count(f'book:{book_id}'):
+            copies = Book.objects.filter(pk=book_id).values_list('available_copies', flat=True).first()
+            if copies is not None:
+                broker.publish(f'book:{book_id}', 'stock', {'book': book_id, 'available_copies': copies})
+
+    transaction.on_commit(send)
+
+
+def publish_request_status(borrow_request):
+    """After commit, tell the borrower their request changed status."""
+    user_id, data = borrow_request.user_id, {
+        'request': borrow_request.pk,
+        'book': borrow_request.book_id,
+        'status': borrow_request.status,
+    }
+    transaction.on_commit(lambda: get_broker().publish(f'user:{user_id}', 'request', data))
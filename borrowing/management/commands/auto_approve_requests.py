@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from borrowing.models import BorrowRequest
+from borrowing.rules import APPROVED, auto_decide_pending
+from borrowing.services import BorrowError
+from dashboard.snapshot import invalidate_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Chạy chính sách tự động duyệt trên các yêu cầu đang chờ (ví dụ sau khi có sách được trả)'
+
+    def handle(self, *args, **options):
+        try:
+            decisions = auto_decide_pending()
+        except BorrowError as exc:
+            self.stderr.write(f'{exc} - hãy chạy lại')
+            return
+        if decisions[APPROVED]:
+            invalidate_dashboard()
+        labels = dict(BorrowRequest.DECISION_RULE_CHOICES)
+        for rule, count in decisions.most_common():
+            self.stdout.write(f'  {labels[rule]}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Đã tự động duyệt {decisions[APPROVED]} yêu cầu'))
@@ -0,0 +1,89 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from borrowing.models import BorrowRequest, BorrowTransaction
+from borrowing.overdue import accrue_fines, mark_overdue
+from library.models import Book, Category
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark sweep_overdue trên dữ liệu tổng hợp (dữ liệu được rollback sau khi chạy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=1_000_000)
+        parser.add_argument('--overdue-ratio', type=float, default=0.02,
+                            help='Tỉ lệ lượt mượn đang mở đã quá hạn')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['loans'], options['overdue_ratio'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _timeit(self, label, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.stdout.write(f'{label:<40} {(time.perf_counter() - start) * 1000:10.1f} ms  ({result} rows)')
+
+    def _seed(self, n, overdue_ratio):
+        rng = random.Random(42)
+        now = timezone.now()
+        category = Category.objects.create(name=f'__bench_{time.time_ns()}')
+        user = User.objects.create(username=f'__bench_{time.time_ns()}')
+        book = Book.objects.create(
+            title='Bench', author='Bench', publisher='Bench', publish_year=2000, category=category,
+            total_copies=1, available_copies=1,
+        )
+        first_request_id = None
+        for offset in range(0, n, 10_000):
+            size = min(10_000, n - offset)
+            requests = BorrowRequest.objects.bulk_create([
+                BorrowRequest(user=user, book=book, expected_return_date=now.date(), status='RETURNED')
+                for _ in range(size)
+            ])
+            if requests[0].pk is None:  # backends without RETURNING
+                first_request_id = first_request_id or BorrowRequest.objects.filter(user=user).order_by('id').first().pk
+                ids = range(first_request_id + offset, first_request_id + offset + size)
+            else:
+                ids = [r.pk for r in requests]
+
+            loans = []
+            for request_id in ids:
+                roll = rng.random()
+                if roll < 0.9:  # history: returned long ago
+                    due = now - timedelta(days=rng.randint(30, 1500))
+                    loans.append(BorrowTransaction(borrow_request_id=request_id, due_at=due,
+                                                   returned_at=due, status='RETURNED'))
+                elif roll < 0.9 + overdue_ratio:
+                    loans.append(BorrowTransaction(borrow_request_id=request_id, status='BORROWING',
+                                                   due_at=now - timedelta(hours=rng.randint(1, 24 * 60))))
+                else:
+                    loans.append(BorrowTransaction(borrow_request_id=request_id, status='BORROWING',
+                                                   due_at=now + timedelta(hours=rng.randint(1, 24 * 30))))
+            BorrowTransaction.objects.bulk_create(loans)
+
+    def _run(self, n, overdue_ratio):
+        self.stdout.write(f'Seeding {n} loans...')
+        start = time.perf_counter()
+        self._seed(n, overdue_ratio)
+        self.stdout.write(f'Seed: {time.perf_counter() - start:.1f} s')
+
+        probe = BorrowTransaction.objects.filter(status='BORROWING', due_at__lt=timezone.now()).order_by()
+        self.stdout.write('Plan: ' + probe.only('id').explain().replace('\n', ' | '))
+
+        self._timeit('mark_overdue (first run)', mark_overdue)
+        self._timeit('accrue_fines (first run)', accrue_fines)
+        self._timeit('mark_overdue (nothing new)', mark_overdue)
+        self._timeit('accrue_fines (nothing new)', accrue_fines)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from borrowing.outbox import BATCH_SIZE, MAX_ATTEMPTS, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Gửi các email đang chờ trong outbox (theo lô, dùng chung một kết nối SMTP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                            help='Số lần thử tối đa trước khi chuyển sang DEAD')
+        parser.add_argument('--loop', action='store_true',
+                            help='Chạy liên tục như một worker thay vì gửi hết rồi thoát')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Số giây nghỉ khi outbox trống (với --loop)')
+
+    def handle(self, *args, **options):
+        totals = [0, 0, 0]
+        while True:
+            sent, failed, dead = deliver_batch(options['batch_size'], options['max_attempts'])
+            totals = [t + n for t, n in zip(totals, (sent, failed, dead))]
+            if sent or failed:
+                self.stdout.write(f'  gửi {sent}, lỗi {failed}, bỏ {dead}')
+            # Full batch: more may be due. Failed rows were pushed into the future, so this ends.
+            if sent + failed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Xong: đã gửi {totals[0]}, lỗi {totals[1]}, chuyển DEAD {totals[2]}'
+        ))
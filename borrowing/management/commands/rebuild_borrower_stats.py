@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from borrowing.borrowers import rebuild_borrower_stats
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bộ đếm lượt mượn đang mở / quá hạn của từng người dùng'
+
+    def handle(self, *args, **options):
+        rows = rebuild_borrower_stats()
+        self.stdout.write(self.style.SUCCESS(f'Đã ghi {rows} dòng'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from borrowing.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng thống kê mượn/trả theo ngày từ lịch sử giao dịch'
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f'Đã ghi {rows} dòng thống kê'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from borrowing.overdue import accrue_fines, mark_overdue
+from dashboard.snapshot import invalidate_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Chuyển các lượt mượn quá hạn sang OVERDUE và cập nhật tiền phạt (an toàn khi chạy mỗi phút)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-fines', action='store_true', help='Chỉ đánh dấu quá hạn, không tính phạt')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        flipped = mark_overdue()
+        fined = 0 if options['no_fines'] else accrue_fines()
+        if flipped or fined:
+            invalidate_dashboard()
+        self.stdout.write(self.style.SUCCESS(
+            f'Quá hạn mới: {flipped}, cập nhật phạt: {fined} ({time.perf_counter() - start:.2f}s)'
+        ))
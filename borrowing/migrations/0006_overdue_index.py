@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0005_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(fields=['status', 'due_at'], name='idx_tx_status_due'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_borrower_stats(apps, schema_editor):
+    BorrowTransaction = apps.get_model('borrowing', 'BorrowTransaction')
+    BorrowerStats = apps.get_model('borrowing', 'BorrowerStats')
+    rows = (
+        BorrowTransaction.objects.filter(status__in=['BORROWING', 'OVERDUE', 'RETURN_PENDING'])
+        .values('borrow_request__user_id')
+        .annotate(active=Count('id'), overdue=Count('id', filter=Q(status='OVERDUE')))
+        .order_by()
+    )
+    BorrowerStats.objects.bulk_create([
+        BorrowerStats(user_id=row['borrow_request__user_id'], active_loans=row['active'], overdue_loans=row['overdue'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('borrowing', '0006_overdue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='borrower_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_loans', models.PositiveIntegerField(default=0)),
+                ('overdue_loans', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'borrower_stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='borrowrequest',
+            name='decision_rule',
+            field=models.CharField(blank=True, choices=[('auto_approved', 'Tự động duyệt'), ('copies_available', 'Sách đã hết bản'), ('no_overdue_loans', 'Đang có sách quá hạn / tiền phạt'), ('under_loan_cap', 'Vượt số sách được mượn cùng lúc'), ('short_loan', 'Thời gian mượn dài hơn mức tự duyệt')], max_length=30),
+        ),
+        migrations.RunPython(backfill_borrower_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0007_borrower_stats_auto_approval'),
+        ('library', '0005_book_cover_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('WAITING', 'Đang chờ'), ('ALLOCATED', 'Đã nhận sách'), ('CANCELLED', 'Đã huỷ')], default='WAITING', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('allocated_at', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='library.book')),
+                ('borrow_request', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hold', to='borrowing.borrowrequest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='book_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'book_holds',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['book', 'status', 'id'], name='idx_holds_queue')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0008_book_holds'),
+        ('library', '0005_book_cover_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(fields=['status', 'request_date', 'id'], name='idx_req_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(fields=['status', 'expected_return_date', 'id'], name='idx_req_status_return'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(fields=['status', 'borrowed_at', 'id'], name='idx_tx_status_borrowed'),
+        ),
+    ]
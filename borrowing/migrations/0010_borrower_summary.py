@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_summary(apps, schema_editor):
+    BorrowTransaction = apps.get_model('borrowing', 'BorrowTransaction')
+    BorrowRequest = apps.get_model('borrowing', 'BorrowRequest')
+    BorrowerStats = apps.get_model('borrowing', 'BorrowerStats')
+    counters = {}
+    loans = (
+        BorrowTransaction.objects.values('borrow_request__user_id')
+        .annotate(lifetime=Count('id'), fines=Sum('fine_amount', filter=Q(status='RETURNED')))
+        .order_by()
+    )
+    for row in loans:
+        counters.setdefault(row['borrow_request__user_id'], {}).update(
+            lifetime_borrows=row['lifetime'], total_fines=row['fines'] or 0,
+        )
+    pending = BorrowRequest.objects.filter(status='PENDING').values('user_id').annotate(count=Count('id')).order_by()
+    for row in pending:
+        counters.setdefault(row['user_id'], {})['pending_requests'] = row['count']
+
+    BorrowerStats.objects.bulk_create(
+        [BorrowerStats(user_id=user_id) for user_id in counters], ignore_conflicts=True, batch_size=1000,
+    )
+    for user_id, fields in counters.items():
+        BorrowerStats.objects.filter(user_id=user_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0009_admin_list_indexes'),
+        ('library', '0005_book_cover_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowerstats',
+            name='lifetime_borrows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='borrowerstats',
+            name='pending_requests',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='borrowerstats',
+            name='total_fines',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(fields=['user', 'request_date', 'id'], name='idx_req_user_date'),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
-from library.models import Book
+from library.models import Book, Category
 from django.utils import timezone
 
+FINE_PER_DAY = 5000
+
+
 class BorrowRequest(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Đang chờ'),
@@ -11,6 +14,13 @@ class BorrowRequest(models.Model):
         ('CANCELLED', 'Đã huỷ'),
         ('RETURNED', 'Đã trả'),
     ]
+    DECISION_RULE_CHOICES = [
+        ('auto_approved', 'Tự động duyệt'),
+        ('copies_available', 'Sách đã hết bản'),
+        ('no_overdue_loans', 'Đang có sách quá hạn / tiền phạt'),
+        ('under_loan_cap', 'Vượt số sách được mượn cùng lúc'),
+        ('short_loan', 'Thời gian mượn dài hơn mức tự duyệt'),
+    ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrow_requests')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrow_requests')
@@ -21,10 +31,19 @@ class BorrowRequest(models.Model):
     reject_reason = models.TextField(blank=True)  # ✅ Thêm mới
     handled_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='handled_requests')
     handled_at = models.DateTimeField(null=True, blank=True)
+    # Rule that auto-approved the request or kept it for staff (borrowing.rules)
+    decision_rule = models.CharField(max_length=30, choices=DECISION_RULE_CHOICES, blank=True)
 
     class Meta:
         db_table = 'borrow_requests'
         ordering = ['-request_date']
+        indexes = [
+            # Keyset sorts of admin_pending_requests_view
+            models.Index(fields=['status', 'request_date', 'id'], name='idx_req_status_date'),
+            models.Index(fields=['status', 'expected_return_date', 'id'], name='idx_req_status_return'),
+            # Keyset history of my_borrow_requests_view
+            models.Index(fields=['user', 'request_date', 'id'], name='idx_req_user_date'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.book.title}"
@@ -48,6 +67,12 @@ class BorrowTransaction(models.Model):
     class Meta:
         db_table = 'borrow_transactions'
         ordering = ['-borrowed_at']
+        indexes = [
+            # Also serves the due_at sort of admin_active_transactions_view
+            # (InnoDB appends the primary key to every secondary index).
+            models.Index(fields=['status', 'due_at'], name='idx_tx_status_due'),
+            models.Index(fields=['status', 'borrowed_at', 'id'], name='idx_tx_status_borrowed'),
+        ]
 
     def __str__(self):
         return f"Transaction #{self.id} - {self.borrow_request.user.username}"
@@ -55,5 +80,101 @@ class BorrowTransaction(models.Model):
     def calculate_fine(self):
         if self.returned_at and self.returned_at > self.due_at:
             days_late = (self.returned_at - self.due_at).days
-            self.fine_amount = days_late * 5000
-            self.save()
\ No newline at end of file
+            self.fine_amount = days_late * FINE_PER_DAY
+            self.save()
+
+
+class BookHold(models.Model):
+    """FIFO waitlist entry for a book with no copies left (see ``borrowing.services``)."""
+    STATUS_CHOICES = [
+        ('WAITING', 'Đang chờ'),
+        ('ALLOCATED', 'Đã nhận sách'),
+        ('CANCELLED', 'Đã huỷ'),
+    ]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='book_holds')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='WAITING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+    borrow_request = models.OneToOneField(
+        BorrowRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='hold',
+    )
+
+    class Meta:
+        db_table = 'book_holds'
+        ordering = ['id']
+        indexes = [
+            # Queue order is id order: position = COUNT over this range, next holder = first row
+            models.Index(fields=['book', 'status', 'id'], name='idx_holds_queue'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} chờ {self.book.title}"
+
+
+class BorrowerStats(models.Model):
+    """Per-user loan counters kept in step by the borrow services (see ``borrowing.borrowers``)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='borrower_stats')
+    active_loans = models.PositiveIntegerField(default=0)
+    overdue_loans = models.PositiveIntegerField(default=0)
+    pending_requests = models.PositiveIntegerField(default=0)
+    # Fines assessed when loans are returned (calculate_fine)
+    total_fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    lifetime_borrows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'borrower_stats'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.active_loans} active, {self.overdue_loans} overdue"
+
+
+class DailyCirculationStat(models.Model):
+    """Per-day, per-category circulation rollup (see ``borrowing.stats``)."""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_stats')
+    borrows = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_circulation_stats'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='uniq_daily_stat_date_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.category_id}"
+
+
+class OutboxEmail(models.Model):
+    """Email written in the same transaction as the change it reports (see ``borrowing.outbox``)."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Chờ gửi'),
+        ('SENT', 'Đã gửi'),
+        ('DEAD', 'Gửi thất bại'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject}"
@@ -0,0 +1,107 @@
+"""Transactional email outbox.
+
+``enqueue_email`` only inserts an ``OutboxEmail`` row, so it commits or
+rolls back together with the state change it reports and never touches
+SMTP on the request path. ``manage.py deliver_outbox`` drains due rows in
+batches over one reused mail connection, retrying failures with
+exponential backoff and giving up (status DEAD) after ``MAX_ATTEMPTS``.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 3600
+
+
+def enqueue_email(subject, body, to_email, from_email=None):
+    if not to_email:
+        return None
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        to_email=to_email,
+        from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@bookclub.local'),
+    )
+
+
+def enqueue_emails(messages):
+    """Queue many ``(subject, body, to_email)`` tuples with one INSERT."""
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@bookclub.local')
+    return OutboxEmail.objects.bulk_create([
+        OutboxEmail(subject=subject, body=body, to_email=to_email, from_email=from_email)
+        for subject, body, to_email in messages if to_email
+    ])
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _record_failure(email, error, now, max_attempts):
+    attempts = email.attempts + 1
+    dead = attempts >= max_attempts
+    OutboxEmail.objects.filter(pk=email.pk).update(
+        attempts=attempts,
+        status='DEAD' if dead else 'PENDING',
+        next_attempt_at=now + backoff(attempts),
+        last_error=error[:2000],
+    )
+    if dead:
+        logger.error('Outbox email %s dead-lettered after %s attempts: %s', email.pk, attempts, error)
+    return dead
+
+
+def deliver_batch(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Send up to ``batch_size`` due emails. Returns ``(sent, failed, dead)``."""
+    now = timezone.now()
+    sent = failed = dead = 0
+    with transaction.atomic():
+        # SKIP LOCKED lets several workers drain the outbox without double sends
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return 0, 0, 0
+
+        delivered, handled = [], set()
+        try:
+            with get_connection() as connection:
+                for email in emails:
+                    message = EmailMessage(
+                        email.subject, email.body, email.from_email, [email.to_email],
+                        connection=connection,
+                    )
+                    try:
+                        message.send()
+                    except Exception as exc:
+                        failed += 1
+                        dead += _record_failure(email, f'{type(exc).__name__}: {exc}', now, max_attempts)
+                    else:
+                        delivered.append(email.pk)
+                    handled.add(email.pk)
+        except Exception as exc:
+            # Could not open (or cleanly close) the connection: retry the rest of the batch later
+            error = f'{type(exc).__name__}: {exc}'
+            for email in emails:
+                if email.pk not in handled:
+                    failed += 1
+                    dead += _record_failure(email, error, now, max_attempts)
+
+        sent = OutboxEmail.objects.filter(pk__in=delivered).update(
+            status='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+        )
+    return sent, failed, dead
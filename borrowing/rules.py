@@ -0,0 +1,116 @@
+"""Auto-approval policy for borrow requests.
+
+``RULES`` are checked in order against the book's stock and the borrower's
+precomputed ``BorrowerStats`` counters (no COUNT queries). The first rule
+that fails keeps the request PENDING for staff; if every rule passes the
+request is approved through the normal atomic service path. The deciding
+rule's code is stored on ``BorrowRequest.decision_rule``.
+
+Settings: ``AUTO_APPROVE_ENABLED``, ``AUTO_APPROVE_MAX_ACTIVE_LOANS``,
+``AUTO_APPROVE_MAX_LOAN_DAYS``.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from library.models import Book
+from .borrowers import get_borrower_stats
+from .models import BorrowRequest
+from .services import BorrowError, approve_request, bulk_approve
+
+APPROVED = 'auto_approved'
+
+
+def copies_available(br, stats, stock):
+    return stock.get(br.book_id, 0) > 0
+
+
+def no_overdue_loans(br, stats, stock):
+    # Fines only accrue on overdue loans, so this also covers outstanding fines
+    return stats.overdue_loans == 0
+
+
+def under_loan_cap(br, stats, stock):
+    return stats.active_loans < getattr(settings, 'AUTO_APPROVE_MAX_ACTIVE_LOANS', 3)
+
+
+def short_loan(br, stats, stock):
+    days = (br.expected_return_date - timezone.localdate()).days
+    return days <= getattr(settings, 'AUTO_APPROVE_MAX_LOAN_DAYS', 14)
+
+
+# Codes match BorrowRequest.DECISION_RULE_CHOICES
+RULES = [
+    ('copies_available', copies_available),
+    ('no_overdue_loans', no_overdue_loans),
+    ('under_loan_cap', under_loan_cap),
+    ('short_loan', short_loan),
+]
+
+
+def evaluate(br, stats, stock):
+    """Return the code of the first failing rule, or ``APPROVED``."""
+    for code, check in RULES:
+        if not check(br, stats, stock):
+            return code
+    return APPROVED
+
+
+def auto_decide(br):
+    """Run the policy on one freshly created request. Returns the deciding rule code."""
+    if not getattr(settings, 'AUTO_APPROVE_ENABLED', False):
+        return None
+    stats = get_borrower_stats([br.user_id])[br.user_id]
+    stock = {br.book_id: br.book.available_copies if br.book.is_active else 0}
+    decision = evaluate(br, stats, stock)
+    if decision == APPROVED:
+        try:
+            approve_request(br, handled_by=None)
+        except BorrowError:
+            decision = 'copies_available'  # lost the race for the last copy
+    BorrowRequest.objects.filter(pk=br.pk).update(decision_rule=decision)
+    br.decision_rule = decision
+    return decision
+
+
+def auto_decide_pending(requests=None):
+    """Batch pass over PENDING requests, oldest first. Returns ``Counter`` of decisions.
+
+    Counters are loaded once and updated in memory as requests are accepted,
+    so the cap and stock rules stay correct within the batch; accepted ones
+    go through ``bulk_approve`` in a single transaction.
+    """
+    pending = list(
+        (requests if requests is not None else BorrowRequest.objects.all())
+        .filter(status='PENDING').order_by('request_date', 'id')
+    )
+    if not pending:
+        return Counter()
+    # Hidden books count as out of stock
+    stock = dict(
+        Book.objects.filter(pk__in={br.book_id for br in pending}, is_active=True)
+        .values_list('id', 'available_copies')
+    )
+    stats = get_borrower_stats({br.user_id for br in pending})
+
+    decisions = {}
+    for br in pending:
+        decision = evaluate(br, stats[br.user_id], stock)
+        if decision == APPROVED:
+            stock[br.book_id] -= 1
+            stats[br.user_id].active_loans += 1
+        decisions[br.pk] = decision
+
+    accepted = [pk for pk, decision in decisions.items() if decision == APPROVED]
+    if accepted:
+        _, short = bulk_approve(BorrowRequest.objects.filter(pk__in=accepted), handled_by=None)
+        for br in short:
+            decisions[br.pk] = 'copies_available'
+
+    by_rule = defaultdict(list)
+    for pk, decision in decisions.items():
+        by_rule[decision].append(pk)
+    for decision, pks in by_rule.items():
+        BorrowRequest.objects.filter(pk__in=pks).update(decision_rule=decision)
+    return Counter(decisions.values())
@@ -0,0 +1,355 @@
+"""Borrow state machine.
+
+Every transition is a conditional UPDATE (``WHERE status = ...``) and stock
+moves with ``F()`` expressions guarded by the copy bounds, all inside one
+atomic block. Two admins approving at once can therefore never both win,
+and ``available_copies`` can never leave ``0..total_copies``: the loser gets
+a ``BorrowError`` instead of a lost update or a CheckConstraint 500.
+Member notifications are queued in the same transaction (``outbox``).
+A returned copy goes to the oldest WAITING ``BookHold`` before it is put
+back on the shelf.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from library.detail_cache import invalidate_book_detail
+from library.models import Book
+from library.popularity import record_borrow
+from .borrowers import bump_borrower, bump_borrowers
+from .events import publish_book_stock, publish_request_status
+from .models import BookHold, BorrowRequest, BorrowTransaction
+from .outbox import enqueue_email, enqueue_emails
+from .stats import record_borrow_stat, record_borrow_stats, record_overdue_stat, record_return_stat
+
+RETURNABLE_STATUSES = ['BORROWING', 'OVERDUE', 'RETURN_PENDING']
+
+
+class BorrowError(Exception):
+    """A transition that is no longer allowed (already handled, out of stock...)."""
+
+
+def _approved_email(borrow_request):
+    return (
+        'Yêu cầu mượn sách đã được duyệt',
+        f'Xin chào {borrow_request.user.username},\n\n'
+        f'Yêu cầu mượn sách "{borrow_request.book.title}" của bạn đã được duyệt.\n'
+        f'Ngày trả dự kiến: {borrow_request.expected_return_date:%d/%m/%Y}.\n\n'
+        'Cảm ơn bạn.',
+        borrow_request.user.email,
+    )
+
+
+def _rejected_email(borrow_request):
+    return (
+        'Yêu cầu mượn sách bị từ chối',
+        f'Xin chào {borrow_request.user.username},\n\n'
+        f'Yêu cầu mượn sách "{borrow_request.book.title}" của bạn đã bị từ chối.\n'
+        f'Lý do: {borrow_request.reject_reason}\n\n'
+        'Vui lòng liên hệ quản trị nếu cần hỗ trợ thêm.\n\n'
+        'Cảm ơn bạn.',
+        borrow_request.user.email,
+    )
+
+
+def _hold_email(borrow_request):
+    return (
+        'Sách bạn đặt giữ đã sẵn sàng',
+        f'Xin chào {borrow_request.user.username},\n\n'
+        f'Sách "{borrow_request.book.title}" bạn đặt giữ vừa được trả và đã được chuyển cho bạn.\n'
+        f'Vui lòng đến thư viện nhận sách. Ngày trả dự kiến: {borrow_request.expected_return_date:%d/%m/%Y}.\n\n'
+        'Cảm ơn bạn.',
+        borrow_request.user.email,
+    )
+
+
+def _due_at(borrow_request, now):
+    return now + timedelta(days=(borrow_request.expected_return_date - timezone.localdate(now)).days)
+
+
+def take_copy(book_id, count=1):
+    """Atomically reserve ``count`` copies. Returns False when not enough are left
+    or the book is hidden (``is_active=False``), as ``Book.is_available`` does."""
+    taken = Book.objects.filter(pk=book_id, is_active=True, available_copies__gte=count).update(
+        available_copies=F('available_copies') - count, updated_at=timezone.now(),
+    )
+    if taken:
+        invalidate_book_detail(book_id)  # F() updates skip the Book post_save signal
+        publish_book_stock(book_id)
+    return bool(taken)
+
+
+def put_back_copy(book_id):
+    """Atomically give one copy back (never above ``total_copies``)."""
+    returned = Book.objects.filter(pk=book_id, available_copies__lt=F('total_copies')).update(
+        available_copies=F('available_copies') + 1, updated_at=timezone.now(),
+    )
+    if returned:
+        invalidate_book_detail(book_id)
+        publish_book_stock(book_id)
+    return bool(returned)
+
+
+def _open_loan(borrow_request, now):
+    """Create the loan for an APPROVED request and bump the book and daily counters (copy already taken).
+
+    Write paths lock shared rows in one order: book, category, daily stat,
+    borrower counters. The caller bumps the borrower last.
+    """
+    borrow_transaction = BorrowTransaction.objects.create(
+        borrow_request=borrow_request,
+        due_at=_due_at(borrow_request, now),
+        status='BORROWING',
+    )
+    record_borrow(borrow_request.book)
+    record_borrow_stat(borrow_transaction)
+    return borrow_transaction
+
+
+def submit_request(borrow_request):
+    """Save a new PENDING request and count it on the borrower's summary."""
+    with transaction.atomic():
+        borrow_request.status = 'PENDING'
+        borrow_request.save()
+        bump_borrower(borrow_request.user_id, pending_requests=1)
+    return borrow_request
+
+
+def cancel_request(borrow_request):
+    """PENDING -> CANCELLED by the member."""
+    with transaction.atomic():
+        if not BorrowRequest.objects.filter(pk=borrow_request.pk, status='PENDING').update(status='CANCELLED'):
+            raise BorrowError('Chỉ có thể huỷ yêu cầu đang chờ')
+        borrow_request.status = 'CANCELLED'
+        bump_borrower(borrow_request.user_id, pending_requests=-1)
+
+
+def approve_request(borrow_request, handled_by):
+    """PENDING -> APPROVED, reserve a copy and open a ``BorrowTransaction``."""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = BorrowRequest.objects.filter(pk=borrow_request.pk, status='PENDING').update(
+            status='APPROVED', handled_by=handled_by, handled_at=now,
+        )
+        if not claimed:
+            raise BorrowError('Yêu cầu này đã được xử lý')
+        if not take_copy(borrow_request.book_id):
+            # Rolls back the status change above
+            raise BorrowError('Sách không còn sẵn')
+
+        borrow_request.status = 'APPROVED'
+        borrow_request.handled_by = handled_by
+        borrow_request.handled_at = now
+        borrow_transaction = _open_loan(borrow_request, now)
+        bump_borrower(borrow_request.user_id, active_loans=1, lifetime_borrows=1, pending_requests=-1)
+        enqueue_email(*_approved_email(borrow_request))
+        publish_request_status(borrow_request)
+    return borrow_transaction
+
+
+def reject_request(borrow_request, handled_by, reason):
+    """PENDING -> REJECTED and notify the member."""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = BorrowRequest.objects.filter(pk=borrow_request.pk, status='PENDING').update(
+            status='REJECTED', handled_by=handled_by, handled_at=now, reject_reason=reason,
+        )
+        if not claimed:
+            raise BorrowError('Yêu cầu này đã được xử lý')
+        borrow_request.status = 'REJECTED'
+        borrow_request.handled_by = handled_by
+        borrow_request.handled_at = now
+        borrow_request.reject_reason = reason
+        bump_borrower(borrow_request.user_id, pending_requests=-1)
+
+        enqueue_email(*_rejected_email(borrow_request))
+        publish_request_status(borrow_request)
+
+
+def return_book(borrow_transaction, statuses=RETURNABLE_STATUSES):
+    """Close a loan: mark it RETURNED, compute the fine and put the copy back."""
+    now = timezone.now()
+    with transaction.atomic():
+        loan = BorrowTransaction.objects.filter(pk=borrow_transaction.pk)
+        closing = {'status': 'RETURNED', 'returned_at': now}
+        # Try the specific "from" states first so the counters know what was closed
+        was_overdue = 'OVERDUE' in statuses and loan.filter(status='OVERDUE').update(**closing)
+        # Late but not swept yet: closing it here also counts it as overdue (as rebuild_daily_stats does)
+        late_unswept = not was_overdue and 'BORROWING' in statuses and loan.filter(
+            status='BORROWING', due_at__lt=now,
+        ).update(**closing)
+        closed = was_overdue or late_unswept or loan.filter(status__in=statuses).update(**closing)
+        if not closed:
+            raise BorrowError('Giao dịch này không thể trả sách!')
+
+        borrow_request = borrow_transaction.borrow_request
+        BorrowRequest.objects.filter(pk=borrow_request.pk).update(status='RETURNED')
+        borrow_request.status = 'RETURNED'
+        publish_request_status(borrow_request)
+
+        # Same lock order as approve_request (see _open_loan): the copy goes
+        # back first, straight to the first person waiting for it if any
+        hold = _allocate_next_hold(borrow_request.book, now)
+        if hold is None:
+            put_back_copy(borrow_request.book_id)
+
+        if late_unswept:
+            record_overdue_stat(timezone.localdate(borrow_transaction.due_at), borrow_request.book.category_id)
+        borrow_transaction.status = 'RETURNED'
+        borrow_transaction.returned_at = now
+        borrow_transaction.calculate_fine()
+        record_return_stat(borrow_transaction)
+
+        borrowers = {borrow_request.user_id: Counter(
+            active_loans=-1, overdue_loans=-1 if was_overdue else 0, total_fines=borrow_transaction.fine_amount,
+        )}
+        if hold is not None:
+            borrowers.setdefault(hold.user_id, Counter()).update(active_loans=1, lifetime_borrows=1)
+        for user_id in sorted(borrowers):
+            bump_borrower(user_id, **borrowers[user_id])
+    return borrow_transaction
+
+
+def _lock_pending(requests):
+    return list(
+        requests.filter(status='PENDING')
+        .select_for_update(of=('self',) if connection.features.has_select_for_update_of else ())
+        .select_related('user', 'book')
+        .order_by('request_date', 'id')
+    )
+
+
+def bulk_approve(requests, handled_by):
+    """Approve many PENDING requests in one transaction, oldest first.
+
+    Copies are allocated per book in request order; one conditional
+    decrement per book, one ``bulk_create`` for the loans and one for the
+    emails. Returns ``(approved, short)`` where ``short`` lists the
+    requests left PENDING because their book ran out of copies.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = _lock_pending(requests)
+        stock = dict(
+            Book.objects.select_for_update()
+            .filter(pk__in={br.book_id for br in pending}, is_active=True)
+            .values_list('id', 'available_copies')
+        )
+        approved, short = [], []
+        for br in pending:
+            if stock.get(br.book_id, 0) > 0:
+                stock[br.book_id] -= 1
+                approved.append(br)
+            else:
+                short.append(br)
+        if not approved:
+            return [], short
+
+        claimed = BorrowRequest.objects.filter(pk__in=[br.pk for br in approved], status='PENDING').update(
+            status='APPROVED', handled_by=handled_by, handled_at=now,
+        )
+        if claimed != len(approved):
+            raise BorrowError('Một số yêu cầu vừa được xử lý bởi người khác, vui lòng thử lại')
+
+        per_book = Counter(br.book_id for br in approved)
+        books = {br.book_id: br.book for br in approved}
+        for book_id, count in per_book.items():
+            if not take_copy(book_id, count):
+                raise BorrowError(f'Sách "{books[book_id].title}" không còn đủ bản')
+            record_borrow(books[book_id], count=count)
+
+        for br in approved:
+            br.status = 'APPROVED'
+            br.handled_by = handled_by
+            br.handled_at = now
+        loans = BorrowTransaction.objects.bulk_create([
+            BorrowTransaction(borrow_request=br, due_at=_due_at(br, now), status='BORROWING')
+            for br in approved
+        ])
+        record_borrow_stats(now, Counter(br.book.category_id for br in approved))
+        per_user = Counter(br.user_id for br in approved)
+        bump_borrowers('active_loans', per_user)
+        bump_borrowers('lifetime_borrows', per_user)
+        bump_borrowers('pending_requests', {user_id: -count for user_id, count in per_user.items()})
+        enqueue_emails(_approved_email(br) for br in approved)
+        for br in approved:
+            publish_request_status(br)
+    return loans, short
+
+
+def bulk_reject(requests, handled_by, reason):
+    """Reject many PENDING requests in one transaction. Returns the rejected requests."""
+    now = timezone.now()
+    with transaction.atomic():
+        pending = _lock_pending(requests)
+        BorrowRequest.objects.filter(pk__in=[br.pk for br in pending], status='PENDING').update(
+            status='REJECTED', handled_by=handled_by, handled_at=now, reject_reason=reason,
+        )
+        for br in pending:
+            br.status = 'REJECTED'
+            br.reject_reason = reason
+        bump_borrowers('pending_requests', {
+            user_id: -count for user_id, count in Counter(br.user_id for br in pending).items()
+        })
+        enqueue_emails(_rejected_email(br) for br in pending)
+        for br in pending:
+            publish_request_status(br)
+    return pending
+
+
+def place_hold(user, book):
+    """Join the FIFO waitlist of a book that has no copy left."""
+    with transaction.atomic():
+        if BookHold.objects.filter(book=book, user=user, status='WAITING').exists():
+            raise BorrowError('Bạn đã ở trong hàng chờ của sách này')
+        if BorrowRequest.objects.filter(user=user, book=book, status__in=['PENDING', 'APPROVED']).exists():
+            raise BorrowError('Bạn đã có yêu cầu mượn sách này rồi')
+        if Book.objects.filter(pk=book.pk, available_copies__gt=0).exists():
+            raise BorrowError('Sách vẫn còn bản, hãy gửi yêu cầu mượn')
+        return BookHold.objects.create(book=book, user=user)
+
+
+def cancel_hold(hold):
+    if not BookHold.objects.filter(pk=hold.pk, status='WAITING').update(status='CANCELLED'):
+        raise BorrowError('Lượt đặt giữ này không còn trong hàng chờ')
+    hold.status = 'CANCELLED'
+
+
+def queue_position(hold):
+    """1-based position in the book's waitlist (one COUNT over ``idx_holds_queue``)."""
+    return BookHold.objects.filter(book_id=hold.book_id, status='WAITING', id__lte=hold.pk).count()
+
+
+def _allocate_next_hold(book, now):
+    """Lend the returned copy of ``book`` to the oldest WAITING hold. Returns the hold or None.
+
+    A hidden book (``is_active=False``) is lent to nobody; its holds keep waiting.
+    """
+    if not Book.objects.filter(pk=book.pk, is_active=True).exists():
+        return None
+    lock = {'skip_locked': True} if connection.features.has_select_for_update_skip_locked else {}
+    hold = (
+        BookHold.objects.filter(book_id=book.pk, status='WAITING')
+        .order_by('id').select_for_update(**lock).select_related('user').first()
+    )
+    if hold is None:
+        return None
+
+    borrow_request = BorrowRequest.objects.create(
+        user=hold.user,
+        book=book,
+        expected_return_date=timezone.localdate(now) + timedelta(days=getattr(settings, 'HOLD_LOAN_DAYS', 14)),
+        status='APPROVED',
+        handled_at=now,
+        note='Cấp tự động từ hàng chờ đặt giữ',
+    )
+    _open_loan(borrow_request, now)  # the caller bumps the borrower counters
+    BookHold.objects.filter(pk=hold.pk).update(status='ALLOCATED', allocated_at=now, borrow_request=borrow_request)
+    hold.status = 'ALLOCATED'
+    enqueue_email(*_hold_email(borrow_request))
+    publish_request_status(borrow_request)
+    return hold
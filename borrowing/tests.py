@@ -1,10 +1,32 @@
-from django.test import TestCase
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import skipIf
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 from library.models import Category, Book
-from .models import BorrowRequest, BorrowTransaction
+from asgiref.sync import sync_to_async
+
+from .borrowers import rebuild_borrower_stats
+from .events import get_broker
+from .models import FINE_PER_DAY, BookHold, BorrowerStats, BorrowRequest, BorrowTransaction, DailyCirculationStat, OutboxEmail
+from .outbox import MAX_ATTEMPTS
+from .overdue import accrue_fines, mark_overdue
+from .rules import auto_decide, auto_decide_pending
+from .services import BorrowError, approve_request, bulk_approve, place_hold, queue_position, return_book
+from .stats import circulation_trend, rebuild_daily_stats
 
 
 class BorrowingWorkflowTests(TestCase):
@@ -29,7 +51,7 @@ class BorrowingWorkflowTests(TestCase):
     def test_user_creates_borrow_request(self):
         self.client.force_login(self.user)
         resp = self.client.post(reverse('borrowing:create_request', args=[self.book.pk]), {
-            'expected_return_date': timezone.now().date(),
+            'expected_return_date': timezone.localdate(),
         }, follow=True)
         self.assertEqual(resp.status_code, 200)
         self.assertTrue(BorrowRequest.objects.filter(user=self.user, book=self.book).exists())
@@ -38,7 +60,7 @@ class BorrowingWorkflowTests(TestCase):
         # user create
         self.client.force_login(self.user)
         self.client.post(reverse('borrowing:create_request', args=[self.book.pk]), {
-            'expected_return_date': timezone.now().date(),
+            'expected_return_date': timezone.localdate(),
         })
         br = BorrowRequest.objects.get(user=self.user, book=self.book)
 
@@ -58,7 +80,7 @@ class BorrowingWorkflowTests(TestCase):
         # create + approve
         self.client.force_login(self.user)
         self.client.post(reverse('borrowing:create_request', args=[self.book.pk]), {
-            'expected_return_date': timezone.now().date(),
+            'expected_return_date': timezone.localdate(),
         })
         br = BorrowRequest.objects.get(user=self.user, book=self.book)
 
@@ -74,3 +96,716 @@ class BorrowingWorkflowTests(TestCase):
         self.book.refresh_from_db()
         self.assertEqual(tx.status, 'RETURNED')
         self.assertEqual(self.book.available_copies, 1)
+
+
+class DailyCirculationStatTests(TestCase):
+    """The daily rollup is maintained incrementally and matches a full rebuild."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Test Book', author='Author', publisher='Pub', publish_year=2022,
+            category=self.cat, total_copies=2, available_copies=2,
+        )
+
+    def _borrow_and_return(self):
+        br = BorrowRequest.objects.create(
+            user=self.user, book=self.book, expected_return_date=timezone.localdate(),
+        )
+        self.client.force_login(self.admin)
+        self.client.post(reverse('borrowing:approve_request', args=[br.pk]))
+        tx = BorrowTransaction.objects.get(borrow_request=br)
+        self.client.post(reverse('borrowing:return_book', args=[tx.pk]))
+
+    def _snapshot(self):
+        return list(DailyCirculationStat.objects.values_list(
+            'date', 'category_id', 'borrows', 'returns', 'fines',
+        ).order_by('date', 'category_id'))
+
+    def test_incremental_matches_rebuild(self):
+        self._borrow_and_return()
+        self._borrow_and_return()
+
+        stat = DailyCirculationStat.objects.get(category=self.cat, date=timezone.localdate())
+        self.assertEqual((stat.borrows, stat.returns), (2, 2))
+
+        incremental = self._snapshot()
+        rebuild_daily_stats()
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_trend_is_one_query(self):
+        self._borrow_and_return()
+        for period, length in [('30d', 30), ('12m', 12)]:
+            with self.assertNumQueries(1):
+                trend = circulation_trend(period)
+            self.assertEqual(len(trend), length)
+            self.assertEqual(trend[-1]['count'], 1)
+
+
+
+
+
+class BulkRequestActionTests(TestCase):
+    """Bulk approve/reject from the pending queue."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cat = Category.objects.create(name='Test', description='')
+        self.scarce = Book.objects.create(
+            title='Scarce', author='A', publisher='P', publish_year=2022, category=cat,
+            total_copies=2, available_copies=2,
+        )
+        self.plenty = Book.objects.create(
+            title='Plenty', author='A', publisher='P', publish_year=2022, category=cat,
+            total_copies=5, available_copies=5,
+        )
+        self.requests = []
+        for i, book in enumerate([self.scarce, self.scarce, self.plenty, self.scarce]):
+            user = User.objects.create_user(username=f'u{i}', password='x', email=f'u{i}@example.com')
+            self.requests.append(BorrowRequest.objects.create(
+                user=user, book=book, expected_return_date=timezone.localdate(),
+            ))
+        self.client.force_login(self.admin)
+
+    def test_bulk_approve_allocates_stock_oldest_first(self):
+        resp = self.client.post(reverse('borrowing:admin_bulk'), {
+            'action': 'approve', 'ids': [br.pk for br in self.requests],
+        }, follow=True)
+
+        statuses = [BorrowRequest.objects.get(pk=br.pk).status for br in self.requests]
+        self.assertEqual(statuses, ['APPROVED', 'APPROVED', 'APPROVED', 'PENDING'])
+        self.scarce.refresh_from_db()
+        self.plenty.refresh_from_db()
+        self.assertEqual((self.scarce.available_copies, self.scarce.borrow_count), (0, 2))
+        self.assertEqual((self.plenty.available_copies, self.plenty.borrow_count), (4, 1))
+        self.assertEqual(BorrowTransaction.objects.count(), 3)
+        self.assertEqual(OutboxEmail.objects.count(), 3)
+        self.assertEqual(DailyCirculationStat.objects.get().borrows, 3)
+        self.assertContains(resp, 'u3 - &quot;Scarce&quot;')
+
+    def test_bulk_approve_skips_hidden_books(self):
+        Book.objects.filter(pk=self.plenty.pk).update(is_active=False)
+        loans, short = bulk_approve(BorrowRequest.objects.filter(pk__in=[br.pk for br in self.requests]), self.admin)
+
+        self.assertEqual([loan.borrow_request_id for loan in loans], [br.pk for br in self.requests[:2]])
+        self.assertEqual([br.pk for br in short], [self.requests[2].pk, self.requests[3].pk])
+        self.plenty.refresh_from_db()
+        self.assertEqual((self.plenty.available_copies, self.plenty.borrow_count), (5, 0))
+
+    def test_bulk_reject_by_filter(self):
+        resp = self.client.post(reverse('borrowing:admin_bulk'), {
+            'action': 'reject', 'scope': 'filter', 'search': 'Scarce', 'reject_reason': 'Hết hạn đăng ký',
+        })
+        self.assertRedirects(resp, reverse('borrowing:admin_pending') + '?search=Scarce')
+        self.assertEqual(BorrowRequest.objects.filter(status='REJECTED').count(), 3)
+        self.assertEqual(BorrowRequest.objects.get(book=self.plenty).status, 'PENDING')
+        self.assertEqual(OutboxEmail.objects.filter(body__contains='Hết hạn đăng ký').count(), 3)
+
+    def test_bulk_reject_requires_reason(self):
+        self.client.post(reverse('borrowing:admin_bulk'), {'action': 'reject', 'ids': [self.requests[0].pk]})
+        self.assertFalse(BorrowRequest.objects.exclude(status='PENDING').exists())
+
+
+
+class AdminListPaginationTests(TestCase):
+    """Admin queues are keyset-paginated with a fixed number of queries per page."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cat = Category.objects.create(name='Test', description='')
+        self.alpha = Book.objects.create(title='Alpha', author='A', publisher='P', publish_year=2022, category=cat)
+        self.beta = Book.objects.create(title='Beta', author='A', publisher='P', publish_year=2022, category=cat)
+        due = timezone.now() + timedelta(days=7)
+        readers = User.objects.bulk_create([User(username=f'reader{i}') for i in range(30)])
+        for i, user in enumerate(readers):
+            br = BorrowRequest.objects.create(
+                user=user, book=self.alpha if i % 3 else self.beta,
+                # Repeated dates exercise the id tie-breaker
+                expected_return_date=timezone.localdate() + timedelta(days=i % 4),
+            )
+            if i < 28:
+                BorrowTransaction.objects.create(borrow_request=br, due_at=due + timedelta(days=i % 5))
+        self.client.force_login(self.admin)
+
+    def _walk(self, url, params, key):
+        resp = self.client.get(url, params)
+        pages = [[obj.pk for obj in resp.context[key]]]
+        while resp.context[key].has_next:
+            resp = self.client.get(url, {**params, 'cursor': resp.context[key].next_cursor})
+            pages.append([obj.pk for obj in resp.context[key]])
+        return pages
+
+    def test_walk_every_sort(self):
+        cases = [
+            ('borrowing:admin_pending', 'requests', ['-request_date', 'request_date', 'expected_return_date', '-expected_return_date'], 30),
+            ('borrowing:admin_transactions', 'transactions', ['due_at', '-due_at', 'borrowed_at', '-borrowed_at'], 28),
+        ]
+        for name, key, sorts, total in cases:
+            for sort in sorts:
+                with self.subTest(view=name, sort=sort):
+                    pages = self._walk(reverse(name), {'sort': sort}, key)
+                    self.assertEqual([len(p) for p in pages], [25, total - 25])
+                    self.assertEqual(len({pk for page in pages for pk in page}), total)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for name, key in [('borrowing:admin_pending', 'requests'), ('borrowing:admin_transactions', 'transactions')]:
+            url = reverse(name)
+            cursor = self.client.get(url).context[key].next_cursor
+            with self.subTest(view=name):
+                # session + user + one page query (with select_related)
+                with self.assertNumQueries(3):
+                    self.client.get(url)
+                with self.assertNumQueries(3):
+                    self.client.get(url, {'cursor': cursor, 'search': 'read'})
+
+    def test_prefix_and_contains_search(self):
+        url = reverse('borrowing:admin_pending')
+        rows = self.client.get(url, {'search': 'alp'}).context['requests']
+        self.assertEqual({r.book_id for r in rows}, {self.alpha.pk})
+        self.assertEqual(len(self.client.get(url, {'search': 'reader2'}).context['requests']), 11)  # reader2, reader20-29
+        self.assertEqual(len(self.client.get(url, {'search': 'lph'}).context['requests']), 0)
+        rows = self.client.get(url, {'search': 'lph', 'match': 'contains'}).context['requests']
+        self.assertEqual({r.book_id for r in rows}, {self.alpha.pk})
+
+
+@override_settings(AUTO_APPROVE_ENABLED=True, AUTO_APPROVE_MAX_ACTIVE_LOANS=2, AUTO_APPROVE_MAX_LOAN_DAYS=14)
+class AutoApprovalTests(TestCase):
+    """Policy rules run on precomputed counters and record the deciding rule."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='user123')
+        cat = Category.objects.create(name='Test', description='')
+        self.books = [
+            Book.objects.create(
+                title=f'Book {i}', author='A', publisher='P', publish_year=2022, category=cat,
+                total_copies=2, available_copies=2,
+            )
+            for i in range(4)
+        ]
+        self.client.force_login(self.user)
+
+    def _request(self, book, days=7):
+        self.client.post(reverse('borrowing:create_request', args=[book.pk]), {
+            'expected_return_date': timezone.localdate() + timedelta(days=days),
+        })
+        return BorrowRequest.objects.get(user=self.user, book=book)
+
+    def _counters(self):
+        stats = BorrowerStats.objects.get(user=self.user)
+        return stats.active_loans, stats.overdue_loans
+
+    def test_submission_is_auto_approved_until_a_rule_fails(self):
+        first = self._request(self.books[0])
+        self.assertEqual((first.status, first.decision_rule), ('APPROVED', 'auto_approved'))
+        self.assertTrue(BorrowTransaction.objects.filter(borrow_request=first).exists())
+        self.assertEqual(self._counters(), (1, 0))
+
+        long_loan = self._request(self.books[1], days=20)
+        self.assertEqual((long_loan.status, long_loan.decision_rule), ('PENDING', 'short_loan'))
+
+        self._request(self.books[2])
+        capped = self._request(self.books[3])
+        self.assertEqual((capped.status, capped.decision_rule), ('PENDING', 'under_loan_cap'))
+
+        # Counters follow returns and agree with a rebuild from history
+        return_book(BorrowTransaction.objects.get(borrow_request=first))
+        self.assertEqual(self._counters(), (1, 0))
+        rebuild_borrower_stats()
+        self.assertEqual(self._counters(), (1, 0))
+
+    def test_overdue_borrower_goes_to_the_queue(self):
+        loan = BorrowTransaction.objects.get(borrow_request=self._request(self.books[0]))
+        BorrowTransaction.objects.filter(pk=loan.pk).update(due_at=timezone.now() - timedelta(days=1))
+        mark_overdue()
+        self.assertEqual(self._counters(), (1, 1))
+
+        held = self._request(self.books[1])
+        self.assertEqual((held.status, held.decision_rule), ('PENDING', 'no_overdue_loans'))
+
+    def test_batch_pass_respects_cap_within_the_batch(self):
+        with self.settings(AUTO_APPROVE_ENABLED=False):
+            pending = [self._request(book) for book in self.books[:3]]
+        self.assertEqual({br.status for br in pending}, {'PENDING'})
+
+        call_command('auto_approve_requests', stdout=StringIO())
+        decisions = [BorrowRequest.objects.get(pk=br.pk).decision_rule for br in pending]
+        self.assertEqual(decisions, ['auto_approved', 'auto_approved', 'under_loan_cap'])
+        self.assertEqual(self._counters(), (2, 0))
+
+    def test_hidden_books_are_never_auto_approved(self):
+        with self.settings(AUTO_APPROVE_ENABLED=False):
+            queued = self._request(self.books[0])
+        Book.objects.filter(pk__in=[self.books[0].pk, self.books[1].pk]).update(is_active=False)
+
+        br = BorrowRequest.objects.create(
+            user=self.user, book=Book.objects.get(pk=self.books[1].pk),
+            expected_return_date=timezone.localdate() + timedelta(days=7),
+        )
+        self.assertEqual(auto_decide(br), 'copies_available')
+        self.assertEqual(auto_decide_pending(), Counter(copies_available=2))
+        self.assertEqual(BorrowRequest.objects.get(pk=queued.pk).status, 'PENDING')
+        self.assertFalse(BorrowTransaction.objects.exists())
+
+    @override_settings(AUTO_APPROVE_ENABLED=False)
+    def test_disabled_by_default_setting(self):
+        br = self._request(self.books[0])
+        self.assertEqual((br.status, br.decision_rule), ('PENDING', ''))
+
+
+
+class BorrowerSummaryTests(TestCase):
+    """The "my requests" summary is kept by the services and matches a rebuild."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        cat = Category.objects.create(name='Test', description='')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author='A', publisher='P', publish_year=2022, category=cat)
+            for i in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def _request(self, book):
+        self.client.post(reverse('borrowing:create_request', args=[book.pk]), {
+            'expected_return_date': timezone.localdate() + timedelta(days=7),
+        })
+        return BorrowRequest.objects.filter(user=self.user, book=book).first()
+
+    def _summary(self):
+        stats = BorrowerStats.objects.get(user=self.user)
+        return (stats.active_loans, stats.pending_requests, stats.overdue_loans,
+                int(stats.total_fines), stats.lifetime_borrows)
+
+    def test_counters_follow_submit_cancel_approve_and_return(self):
+        first, second = self._request(self.books[0]), self._request(self.books[1])
+        self.assertEqual(self._summary(), (0, 2, 0, 0, 0))
+
+        self.client.post(reverse('borrowing:cancel_request', args=[second.pk]))
+        self.assertEqual(self._summary(), (0, 1, 0, 0, 0))
+
+        loan = approve_request(first, self.admin)
+        self.assertEqual(self._summary(), (1, 0, 0, 0, 1))
+
+        BorrowTransaction.objects.filter(pk=loan.pk).update(due_at=timezone.now() - timedelta(days=2, hours=1))
+        mark_overdue()
+        loan.refresh_from_db()
+        return_book(loan)
+        self.assertEqual(self._summary(), (0, 0, 0, 2 * FINE_PER_DAY, 1))
+
+        rebuild_borrower_stats()
+        self.assertEqual(self._summary(), (0, 0, 0, 2 * FINE_PER_DAY, 1))
+
+    @override_settings(BORROW_MAX_PENDING_REQUESTS=1)
+    def test_pending_cap_uses_the_counters(self):
+        self._request(self.books[0])
+        self.assertIsNone(self._request(self.books[1]))
+        self.assertEqual(self._summary()[1], 1)
+
+    def test_history_is_paginated_with_fixed_queries(self):
+        BorrowRequest.objects.bulk_create([
+            BorrowRequest(user=self.user, book=self.books[i % 3], expected_return_date=timezone.localdate(),
+                          status='RETURNED')
+            for i in range(45)
+        ])
+        url = reverse('borrowing:my_requests')
+        resp = self.client.get(url)
+        pages = [list(resp.context['requests'])]
+        while resp.context['requests'].has_next:
+            # session + user + summary row + page (book, handler and loan joined)
+            with self.assertNumQueries(4):
+                resp = self.client.get(url, {'cursor': resp.context['requests'].next_cursor})
+            pages.append(list(resp.context['requests']))
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual(len({br.pk for page in pages for br in page}), 45)
+
+
+class HoldQueueTests(TestCase):
+    """FIFO waitlist: a returned copy goes straight to the oldest hold."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.users = [
+            User.objects.create_user(username=f'u{i}', password='x', email=f'u{i}@example.com') for i in range(3)
+        ]
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Hot Book', author='A', publisher='P', publish_year=2022, category=cat,
+            total_copies=1, available_copies=1,
+        )
+        br = BorrowRequest.objects.create(user=self.users[0], book=self.book, expected_return_date=timezone.localdate())
+        self.loan = approve_request(br, self.admin)
+
+    def _hold(self, user):
+        self.client.force_login(user)
+        self.client.post(reverse('borrowing:place_hold', args=[self.book.pk]))
+        return BookHold.objects.get(user=user, book=self.book)
+
+    def test_return_allocates_to_first_in_line(self):
+        second, third = self._hold(self.users[1]), self._hold(self.users[2])
+        with self.assertNumQueries(1):
+            self.assertEqual(queue_position(third), 2)
+        self.assertContains(self.client.get(reverse('library:book_detail', args=[self.book.pk])), 'vị trí số 2')
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse('borrowing:return_book', args=[self.loan.pk]))
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'ALLOCATED')
+        self.assertEqual(second.borrow_request.status, 'APPROVED')
+        self.assertEqual(second.borrow_request.transaction.status, 'BORROWING')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)  # handed over, never back on the shelf
+        self.assertEqual(self.book.borrow_count, 2)
+        self.assertTrue(OutboxEmail.objects.filter(to_email='u1@example.com', subject__contains='đặt giữ').exists())
+        self.assertEqual(queue_position(third), 1)
+
+        # Last in line, then nobody: the copy goes back on the shelf
+        return_book(second.borrow_request.transaction)
+        return_book(BookHold.objects.get(pk=third.pk).borrow_request.transaction)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_hidden_book_goes_back_on_the_shelf(self):
+        hold = self._hold(self.users[1])
+        Book.objects.filter(pk=self.book.pk).update(is_active=False)
+
+        return_book(self.loan)
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, 'WAITING')
+        self.assertFalse(BorrowRequest.objects.filter(user=self.users[1]).exists())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+    def test_hold_only_when_no_copy_left(self):
+        self.assertRaises(BorrowError, place_hold, self.users[0], self.book)  # already borrowing it
+        self._hold(self.users[1])
+        self.assertRaises(BorrowError, place_hold, self.users[1], self.book)  # already waiting
+
+        return_book(self.loan)
+        return_book(BookHold.objects.get(user=self.users[1]).borrow_request.transaction)
+        self.assertRaises(BorrowError, place_hold, self.users[2], self.book)  # copies available again
+
+
+
+@override_settings(LIVE_EVENTS_ENABLED=True)
+class LiveEventsTests(TestCase):
+    """SSE stream fed by the in-process broker, driven through the async test client."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Test Book', author='A', publisher='P', publish_year=2022, category=cat,
+            total_copies=2, available_copies=2,
+        )
+        self.br = BorrowRequest.objects.create(user=self.user, book=self.book, expected_return_date=timezone.localdate())
+
+    async def _open(self, **params):
+        response = await self.async_client.get(reverse('borrowing:live_events'), params)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertTrue((await self._read(stream)).startswith('retry:'))
+        return stream
+
+    async def _read(self, stream):
+        return (await anext(stream)).decode()
+
+    async def _next_event(self, stream, channel):
+        pending = asyncio.ensure_future(self._read(stream))
+        # Let the generator reach its subscription before publishing
+        while not get_broker().subscriber_count(channel):
+            await asyncio.sleep(0)
+        return pending
+
+    async def _disconnect(self, stream, channel):
+        # The ASGI handler cancels the streaming task when the client goes away
+        pending = await self._next_event(stream, channel)
+        for _ in range(3):
+            await asyncio.sleep(0)  # let the read reach queue.get()
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+    def _approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_request(self.br, self.admin)
+
+    async def test_stream_pushes_stock_and_own_request_status(self):
+        await self.async_client.aforce_login(self.user)
+        stream = await self._open(books=str(self.book.pk))
+        self.assertIn('"available_copies": 2', await self._read(stream))  # current value on connect
+
+        pending = await self._next_event(stream, f'user:{self.user.pk}')
+        await sync_to_async(self._approve)()
+        events = [await asyncio.wait_for(pending, 1), await asyncio.wait_for(self._read(stream), 1)]
+        self.assertTrue(any('event: request' in e and '"status": "APPROVED"' in e for e in events))
+        self.assertTrue(any('event: stock' in e and '"available_copies": 1' in e for e in events))
+        await self._disconnect(stream, f'user:{self.user.pk}')
+        self.assertEqual(get_broker().subscriber_count(f'user:{self.user.pk}'), 0)
+
+    async def test_pages_open_the_stream_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for url in [reverse('library:book_detail', args=[self.book.pk]), reverse('borrowing:my_requests')]:
+            response = await self.async_client.get(url)
+            self.assertContains(response, 'new EventSource(')
+
+    def test_not_streamed_under_wsgi(self):
+        # WSGI would drain the endless stream before sending a byte, pinning the worker thread
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('borrowing:live_events'), {'books': self.book.pk})
+        self.assertEqual(response.status_code, 204)
+        for url in [reverse('library:book_detail', args=[self.book.pk]), reverse('borrowing:my_requests')]:
+            self.assertNotContains(self.client.get(url), 'new EventSource(')
+
+    @override_settings(LIVE_EVENTS_ENABLED=False)
+    async def test_disabled_by_default(self):
+        response = await self.async_client.get(reverse('borrowing:live_events'), {'books': self.book.pk})
+        self.assertEqual(response.status_code, 204)
+
+    async def test_requires_something_to_watch(self):
+        response = await self.async_client.get(reverse('borrowing:live_events'))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_idle_connections_are_cheap(self):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        streams, waiting = [], []
+        for _ in range(300):
+            stream = await self._open(books=str(self.book.pk))
+            await self._read(stream)  # initial stock
+            waiting.append(asyncio.ensure_future(self._read(stream)))
+            streams.append(stream)
+        while get_broker().subscriber_count(f'book:{self.book.pk}') < len(streams):
+            await asyncio.sleep(0)
+        grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+        # Whole request/response included (~24 KB here), no thread per connection
+        self.assertLess(grown / len(streams), 32 * 1024)
+
+        # One publish reaches every watcher
+        get_broker().publish(f'book:{self.book.pk}', 'stock', {'book': self.book.pk, 'available_copies': 0})
+        chunks = await asyncio.wait_for(asyncio.gather(*waiting), 2)
+        self.assertTrue(all('"available_copies": 0' in chunk for chunk in chunks))
+        for stream in streams:
+            await self._disconnect(stream, f'book:{self.book.pk}')
+
+
+class OverdueSweepTests(TestCase):
+    """sweep_overdue flips late loans, accrues fines and is idempotent."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Test Book', author='Author', publisher='Pub', publish_year=2022,
+            category=self.cat, total_copies=5, available_copies=2,
+        )
+        now = timezone.now()
+        self.late = self._loan(now - timedelta(days=3, hours=1))
+        self.fresh = self._loan(now - timedelta(hours=2))
+        self.on_time = self._loan(now + timedelta(days=2))
+
+    def _loan(self, due_at):
+        br = BorrowRequest.objects.create(
+            user=self.user, book=self.book, expected_return_date=timezone.localdate(), status='APPROVED',
+        )
+        return BorrowTransaction.objects.create(borrow_request=br, due_at=due_at)
+
+    def test_sweep_is_set_based_and_idempotent(self):
+        call_command('sweep_overdue', stdout=StringIO())
+
+        statuses = dict(BorrowTransaction.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.late.pk], 'OVERDUE')
+        self.assertEqual(statuses[self.fresh.pk], 'OVERDUE')
+        self.assertEqual(statuses[self.on_time.pk], 'BORROWING')
+        fines = dict(BorrowTransaction.objects.values_list('pk', 'fine_amount'))
+        self.assertEqual(fines[self.late.pk], 3 * 5000)
+        self.assertEqual(fines[self.fresh.pk], 0)
+
+        # Overdue counts land on the due date and agree with a full rebuild
+        overdue = DailyCirculationStat.objects.filter(overdue__gt=0).values_list('date', 'overdue').order_by('date')
+        incremental = list(overdue)
+        rebuild_daily_stats()
+        self.assertEqual(list(overdue), incremental)
+
+        self.assertEqual(mark_overdue(), 0)
+        self.assertEqual(accrue_fines(), 0)
+
+    def test_fines_grow_with_time(self):
+        mark_overdue()
+        accrue_fines()
+        later = timezone.now() + timedelta(days=2)
+        with self.assertNumQueries(1):  # one UPDATE whatever the spread of due dates
+            self.assertEqual(accrue_fines(now=later), 2)
+        self.late.refresh_from_db()
+        self.assertEqual(self.late.fine_amount, 5 * 5000)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('smtp down')
+
+
+class EmailOutboxTests(TestCase):
+    """Notifications are queued with the state change and sent by deliver_outbox."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123', email='user@example.com')
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Test Book', author='Author', publisher='Pub', publish_year=2022,
+            category=cat, total_copies=1, available_copies=1,
+        )
+        self.br = BorrowRequest.objects.create(
+            user=self.user, book=self.book, expected_return_date=timezone.localdate(),
+        )
+
+    def test_approval_queues_email_and_worker_delivers_it(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('borrowing:approve_request', args=[self.br.pk]))
+
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxEmail.objects.get()
+        self.assertEqual((queued.status, queued.to_email), ('PENDING', 'user@example.com'))
+
+        call_command('deliver_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertIn('Test Book', mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('SENT', 1))
+
+        # Already sent: nothing more to deliver
+        call_command('deliver_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rejection_is_queued_in_the_same_transaction(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('borrowing:reject_request', args=[self.br.pk]), {'reject_reason': 'Hết sách'})
+        self.br.refresh_from_db()
+        self.assertEqual(self.br.status, 'REJECTED')
+        self.assertIn('Hết sách', OutboxEmail.objects.get().body)
+
+    @override_settings(EMAIL_BACKEND='borrowing.tests.FailingEmailBackend')
+    def test_failures_back_off_then_dead_letter(self):
+        email = OutboxEmail.objects.create(subject='s', body='b', from_email='a@x', to_email='b@x')
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            call_command('deliver_outbox', stdout=StringIO())
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertIn('smtp down', email.last_error)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            # Not due yet: the next run skips it
+            call_command('deliver_outbox', stdout=StringIO())
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(email.status, 'DEAD')
+
+
+@skipIf(
+    connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+    'Shared-cache in-memory SQLite fails concurrent writers instead of waiting',
+)
+class ConcurrentApprovalTests(TransactionTestCase):
+    """Many admins approving requests for the same book at once."""
+
+    COPIES = 5
+    REQUESTS = 200
+    THREADS = 16
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(
+            title='Hot Book', author='Author', publisher='Pub', publish_year=2022,
+            category=cat, total_copies=self.COPIES, available_copies=self.COPIES,
+        )
+        users = User.objects.bulk_create([User(username=f'u{i}') for i in range(self.REQUESTS)])
+        BorrowRequest.objects.bulk_create([
+            BorrowRequest(user=user, book=self.book, expected_return_date=timezone.localdate())
+            for user in users
+        ])
+
+    def _run_concurrently(self, jobs):
+        results = {'ok': 0, 'refused': 0, 'errors': []}
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(chunk):
+            barrier.wait()
+            try:
+                for job in chunk:
+                    try:
+                        job()
+                        outcome = 'ok'
+                    except BorrowError:
+                        outcome = 'refused'
+                    except Exception as exc:  # anything else is a bug (e.g. IntegrityError)
+                        with lock:
+                            results['errors'].append(repr(exc))
+                        continue
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, args=(jobs[i::self.THREADS],)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_invariants_hold_under_concurrent_approvals(self):
+        requests = list(BorrowRequest.objects.select_related('book', 'user'))
+        # Every request is approved twice to also race on the same row
+        jobs = [lambda br=br: approve_request(br, self.admin) for br in requests * 2]
+        results = self._run_concurrently(jobs)
+
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['ok'], self.COPIES)
+        self.assertEqual(results['refused'], len(jobs) - self.COPIES)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(self.book.borrow_count, self.COPIES)
+        self.assertEqual(BorrowRequest.objects.filter(status='APPROVED').count(), self.COPIES)
+        self.assertEqual(BorrowTransaction.objects.count(), self.COPIES)
+
+        # Returning every loan concurrently (twice) restores stock exactly once each
+        loans = list(BorrowTransaction.objects.select_related('borrow_request__book'))
+        results = self._run_concurrently([lambda tx=tx: return_book(tx) for tx in loans * 2])
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['ok'], self.COPIES)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, self.COPIES)
+        self.assertFalse(Book.objects.filter(available_copies__gt=F('total_copies')).exists())
+
+    def test_mixed_approvals_and_returns_do_not_deadlock(self):
+        requests = list(BorrowRequest.objects.select_related('book', 'user'))
+        for br in requests[:self.COPIES]:
+            approve_request(br, self.admin)
+        loans = list(BorrowTransaction.objects.select_related('borrow_request__book'))
+
+        # Returns (book -> daily stat -> borrower) interleaved with approvals of the same book
+        approvals = [lambda br=br: approve_request(br, self.admin) for br in requests[self.COPIES:]]
+        returns = [lambda tx=tx: return_book(tx) for tx in loans]
+        jobs = [job for pair in zip(returns, approvals) for job in pair] + approvals[len(returns):]
+        results = self._run_concurrently(jobs)
+        self.assertEqual(results['errors'], [])
+
+        open_loans = BorrowTransaction.objects.filter(status='BORROWING').count()
+        self.assertEqual(BorrowTransaction.objects.filter(status='RETURNED').count(), self.COPIES)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, self.COPIES - open_loans)
+        self.assertEqual(self.book.borrow_count, BorrowTransaction.objects.count())
+        stats = DailyCirculationStat.objects.aggregate(borrows=Sum('borrows'), returns=Sum('returns'))
+        self.assertEqual(stats, {'borrows': BorrowTransaction.objects.count(), 'returns': self.COPIES})
+        self.assertEqual(BorrowerStats.objects.aggregate(n=Sum('active_loans'))['n'], open_loans)
@@ -8,9 +8,13 @@ urlpatterns = [
     path('my-requests/', views.my_borrow_requests_view, name='my_requests'),
     path('cancel/<int:pk>/', views.cancel_borrow_request_view, name='cancel_request'),
     path('return/<int:pk>/', views.user_return_book_view, name='user_return_book'),
+    path('hold/<int:book_id>/', views.place_hold_view, name='place_hold'),
+    path('hold/<int:pk>/cancel/', views.cancel_hold_view, name='cancel_hold'),
+    path('live/', views.live_events_view, name='live_events'),
 
     # Admin
     path('admin/pending/', views.admin_pending_requests_view, name='admin_pending'),
+    path('admin/bulk/', views.admin_bulk_requests_view, name='admin_bulk'),
     path('admin/approve/<int:pk>/', views.approve_borrow_request_view, name='approve_request'),
     path('admin/reject/<int:pk>/', views.reject_borrow_request_view, name='reject_request'),
     path('admin/transactions/', views.admin_active_transactions_view, name='admin_transactions'),
@@ -1,14 +1,31 @@
+import asyncio
+import json
+
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.utils import timezone
-from django.conf import settings
-from django.core.mail import send_mail
-from datetime import timedelta
-from django.db.models import Q
-from .models import BorrowRequest, BorrowTransaction
+from .models import BookHold, BorrowRequest, BorrowTransaction
 from .forms import BorrowRequestForm, RejectRequestForm  # ✅ Thêm RejectRequestForm
 from library.models import Book
+from library.pagination import KeysetPaginator
+from library.search import SEARCH_MATCHES, admin_search_q
+from .borrowers import borrow_block_reason, get_borrower_stats
+from .events import get_broker, live_events_enabled
+from .rules import APPROVED, auto_decide
+from .services import (
+    BorrowError, approve_request, bulk_approve, bulk_reject, cancel_hold, cancel_request, place_hold, queue_position,
+    reject_request, return_book, submit_request,
+)
+from dashboard.snapshot import invalidate_dashboard
+
+BULK_REPORT_LIMIT = 20
+ADMIN_PAGE_SIZE = 25
+MY_REQUESTS_PAGE_SIZE = 20
+LIVE_MAX_BOOKS = 50
+LIVE_KEEPALIVE_SECONDS = 25
 
 
 @login_required
@@ -16,7 +33,13 @@ def create_borrow_request_view(request, book_id):
     book = get_object_or_404(Book, pk=book_id, is_active=True)
 
     if not book.is_available:
-        messages.error(request, 'Sách này hiện không còn sẵn')
+        messages.error(request, 'Sách này hiện không còn sẵn, bạn có thể đặt giữ để được nhận khi có người trả')
+        return redirect('library:book_detail', pk=book_id)
+
+    # Per-user limits come from the BorrowerStats counters (one row, no COUNT)
+    blocked = borrow_block_reason(get_borrower_stats([request.user.pk])[request.user.pk])
+    if blocked:
+        messages.warning(request, blocked)
         return redirect('library:book_detail', pk=book_id)
 
     existing = BorrowRequest.objects.filter(
@@ -34,8 +57,13 @@ def create_borrow_request_view(request, book_id):
             borrow_request = form.save(commit=False)
             borrow_request.user = request.user
             borrow_request.book = book
-            borrow_request.save()
-            messages.success(request, 'Đã gửi yêu cầu mượn sách')
+            submit_request(borrow_request)
+            decision = auto_decide(borrow_request)
+            invalidate_dashboard()
+            if decision == APPROVED:
+                messages.success(request, 'Yêu cầu mượn sách đã được tự động duyệt')
+            else:
+                messages.success(request, 'Đã gửi yêu cầu mượn sách')
             return redirect('borrowing:my_requests')
     else:
         form = BorrowRequestForm()
@@ -45,8 +73,23 @@ def create_borrow_request_view(request, book_id):
 
 @login_required
 def my_borrow_requests_view(request):
-    requests = BorrowRequest.objects.filter(user=request.user).select_related('book', 'handled_by')
-    return render(request, 'borrowing/my_requests.html', {'requests': requests})
+    # Summary from the counters row; history newest first, keyset-paginated on idx_req_user_date
+    stats = get_borrower_stats([request.user.pk])[request.user.pk]
+    requests = (
+        BorrowRequest.objects.filter(user=request.user)
+        .select_related('book', 'handled_by', 'transaction')
+        .order_by('-request_date', '-id')
+    )
+    page = KeysetPaginator(requests, MY_REQUESTS_PAGE_SIZE).get_page(request.GET.get('cursor'))
+
+    holds = []
+    if not page.has_previous:
+        holds = list(BookHold.objects.filter(user=request.user, status='WAITING').select_related('book'))
+        for hold in holds:
+            hold.position = queue_position(hold)
+    return render(request, 'borrowing/my_requests.html', {
+        'requests': page, 'holds': holds, 'stats': stats, 'live_events': live_events_enabled(request),
+    })
 
 
 @login_required
@@ -57,66 +100,149 @@ def cancel_borrow_request_view(request, pk):
         return redirect('borrowing:my_requests')
 
     if request.method == 'POST':
-        borrow_request.status = 'CANCELLED'
-        borrow_request.save()
+        try:
+            cancel_request(borrow_request)
+        except BorrowError as exc:
+            messages.error(request, str(exc))
+            return redirect('borrowing:my_requests')
+        invalidate_dashboard()
         messages.success(request, 'Đã huỷ yêu cầu')
         return redirect('borrowing:my_requests')
 
     return render(request, 'borrowing/cancel_request.html', {'request': borrow_request})
 
 
+@login_required
+def place_hold_view(request, book_id):
+    book = get_object_or_404(Book, pk=book_id, is_active=True)
+    if request.method == 'POST':
+        try:
+            hold = place_hold(request.user, book)
+        except BorrowError as exc:
+            messages.warning(request, str(exc))
+        else:
+            messages.success(request, f'Đã vào hàng chờ, bạn đang ở vị trí số {queue_position(hold)}')
+    return redirect('library:book_detail', pk=book_id)
+
+
+@login_required
+def cancel_hold_view(request, pk):
+    hold = get_object_or_404(BookHold, pk=pk, user=request.user)
+    if request.method == 'POST':
+        try:
+            cancel_hold(hold)
+        except BorrowError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, 'Đã rời hàng chờ')
+    return redirect('borrowing:my_requests')
+
+
 @login_required
 def user_return_book_view(request, pk):
-    transaction = get_object_or_404(BorrowTransaction, pk=pk)
+    transaction = get_object_or_404(
+        BorrowTransaction.objects.select_related('borrow_request__book'),
+        pk=pk, borrow_request__user=request.user,
+    )
 
     if transaction.status not in ['BORROWING', 'OVERDUE', 'RETURN_PENDING']:
         messages.error(request, 'Giao dịch này không thể trả sách!')
         return redirect('borrowing:my_requests')
 
     if request.method == 'POST':
-        transaction.returned_at = timezone.now()
-        transaction.status = 'RETURNED'
-        transaction.save()
-        transaction.calculate_fine()
-
-        transaction.borrow_request.status = 'RETURNED'
-        transaction.borrow_request.save()
-
-        book = transaction.borrow_request.book
-        book.available_copies += 1
-        book.save()
+        try:
+            return_book(transaction)
+        except BorrowError as exc:
+            messages.error(request, str(exc))
+            return redirect('borrowing:my_requests')
+        invalidate_dashboard()
         messages.success(request, 'Đã gửi yêu cầu trả sách thành công!')
         return redirect('borrowing:my_requests')
 
     return render(request, 'borrowing/user_return_book.html', {'transaction': transaction})
 
 
+async def live_events_view(request):
+    """Server-Sent Events: stock of the watched books (``?books=1,2``) and, when logged in,
+    status changes of the user's own requests. Serve under ASGI (``library_system.asgi``)."""
+    if not live_events_enabled(request):
+        return HttpResponse(status=204)  # EventSource stops reconnecting on 204
+    book_ids = [int(pk) for pk in request.GET.get('books', '').split(',') if pk.isdigit()][:LIVE_MAX_BOOKS]
+    user = await request.auser()
+    channels = [f'book:{pk}' for pk in book_ids]
+    if user.is_authenticated:
+        channels.append(f'user:{user.pk}')
+    if not channels:
+        return HttpResponseBadRequest('Không có gì để theo dõi')
+
+    # Current values first, so the page is correct even if it was rendered from cache
+    initial = [
+        {'book': pk, 'available_copies': copies}
+        async for pk, copies in Book.objects.filter(pk__in=book_ids).values_list('id', 'available_copies')
+    ]
+
+    async def stream():
+        yield 'retry: 5000\n\n'
+        for data in initial:
+            yield _sse('stock', data)
+        async with get_broker().subscribe(channels) as queue:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _sse(event, data)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
 # Admin views
 def is_admin(user):
     return user.is_staff
 
 
+def _pending_requests(search='', match='prefix'):
+    qs = BorrowRequest.objects.filter(status='PENDING')
+    if search:
+        qs = qs.filter(admin_search_q(search, match))
+    return qs
+
+
+def _search_params(request):
+    search = request.GET.get('search', '').strip()
+    match = request.GET.get('match', 'prefix')
+    if match not in SEARCH_MATCHES:
+        match = 'prefix'
+    return search, match
+
+
 @login_required
 @user_passes_test(is_admin)
 def admin_pending_requests_view(request):
-    qs = BorrowRequest.objects.filter(status='PENDING').select_related('user', 'book')
-
-    search = request.GET.get('search', '').strip()
-    if search:
-        qs = qs.filter(
-            Q(user__username__icontains=search) |
-            Q(book__title__icontains=search)
-        )
+    search, match = _search_params(request)
+    qs = _pending_requests(search, match).select_related('user', 'book')
 
     sort = request.GET.get('sort', '-request_date')
     allowed_sorts = ['-request_date', 'request_date', 'expected_return_date', '-expected_return_date']
     if sort not in allowed_sorts:
         sort = '-request_date'
-    qs = qs.order_by(sort)
+    # id tie-breaker in the same direction: matches idx_req_status_date / idx_req_status_return
+    qs = qs.order_by(sort, '-id' if sort.startswith('-') else 'id')
+
+    page = KeysetPaginator(qs, ADMIN_PAGE_SIZE).get_page(request.GET.get('cursor'))
 
     return render(request, 'borrowing/admin_pending_requests.html', {
-        'requests': qs,
+        'requests': page,
         'search': search,
+        'match': match,
         'sort': sort,
     })
 
@@ -132,43 +258,73 @@ def approve_borrow_request_view(request, pk):
         return redirect('borrowing:admin_pending')
 
     if request.method == 'POST':
-        borrow_request.status = 'APPROVED'
-        borrow_request.handled_by = request.user
-        borrow_request.handled_at = timezone.now()
-        borrow_request.save()
-
-        due_date = timezone.now() + timedelta(days=(borrow_request.expected_return_date - timezone.now().date()).days)
-        BorrowTransaction.objects.create(
-            borrow_request=borrow_request,
-            due_at=due_date,
-            status='BORROWING'
-        )
-
-        book.available_copies -= 1
-        book.save()
-
-        if borrow_request.user.email:
-            subject = 'Yêu cầu mượn sách đã được duyệt'
-            message = (
-                f'Xin chào {borrow_request.user.username},\n\n'
-                f'Yêu cầu mượn sách "{book.title}" của bạn đã được duyệt.\n'
-                f'Ngày trả dự kiến: {borrow_request.expected_return_date:%d/%m/%Y}.\n\n'
-                'Cảm ơn bạn.'
-            )
-            send_mail(
-                subject,
-                message,
-                getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@bookclub.local'),
-                [borrow_request.user.email],
-                fail_silently=True,
-            )
+        try:
+            approve_request(borrow_request, request.user)
+        except BorrowError as exc:
+            messages.error(request, str(exc))
+            return redirect('borrowing:admin_pending')
 
+        invalidate_dashboard()
         messages.success(request, f'Đã duyệt yêu cầu mượn sách cho {borrow_request.user.username}')
         return redirect('borrowing:admin_pending')
 
     return render(request, 'borrowing/approve_request.html', {'request': borrow_request})
 
 
+@login_required
+@user_passes_test(is_admin)
+def admin_bulk_requests_view(request):
+    """Duyệt / từ chối hàng loạt: các yêu cầu được chọn, hoặc mọi yêu cầu khớp bộ lọc hiện tại."""
+    if request.method != 'POST':
+        return redirect('borrowing:admin_pending')
+
+    search = request.POST.get('search', '').strip()
+    match = request.POST.get('match', 'prefix')
+    if match not in SEARCH_MATCHES:
+        match = 'prefix'
+    back_url = reverse('borrowing:admin_pending')
+    if search:
+        params = {'search': search}
+        if match != 'prefix':
+            params['match'] = match
+        back_url += '?' + urlencode(params)
+    if request.POST.get('scope') == 'filter':
+        selected = _pending_requests(search, match)
+    else:
+        ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+        if not ids:
+            messages.warning(request, 'Chưa chọn yêu cầu nào')
+            return redirect(back_url)
+        selected = _pending_requests().filter(pk__in=ids)
+
+    action = request.POST.get('action')
+    try:
+        if action == 'approve':
+            loans, short = bulk_approve(selected, request.user)
+            if loans:
+                messages.success(request, f'Đã duyệt {len(loans)} yêu cầu')
+            if short:
+                names = ', '.join(f'{br.user.username} - "{br.book.title}"' for br in short[:BULK_REPORT_LIMIT])
+                more = f' và {len(short) - BULK_REPORT_LIMIT} yêu cầu khác' if len(short) > BULK_REPORT_LIMIT else ''
+                messages.warning(request, f'Không đủ sách, vẫn chờ duyệt: {names}{more}')
+        elif action == 'reject':
+            reason = request.POST.get('reject_reason', '').strip()
+            if not reason:
+                messages.error(request, 'Vui lòng nhập lý do từ chối')
+                return redirect(back_url)
+            rejected = bulk_reject(selected, request.user, reason)
+            messages.success(request, f'Đã từ chối {len(rejected)} yêu cầu')
+        else:
+            messages.error(request, 'Thao tác không hợp lệ')
+            return redirect(back_url)
+    except BorrowError as exc:
+        messages.error(request, str(exc))
+        return redirect(back_url)
+
+    invalidate_dashboard()
+    return redirect(back_url)
+
+
 @login_required
 @user_passes_test(is_admin)
 def reject_borrow_request_view(request, pk):
@@ -177,29 +333,13 @@ def reject_borrow_request_view(request, pk):
     if request.method == 'POST':
         form = RejectRequestForm(request.POST)
         if form.is_valid():
-            borrow_request.status = 'REJECTED'
-            borrow_request.handled_by = request.user
-            borrow_request.handled_at = timezone.now()
-            borrow_request.reject_reason = form.cleaned_data['reject_reason']  # ✅
-            borrow_request.save()
-
-            if borrow_request.user.email:
-                subject = 'Yêu cầu mượn sách bị từ chối'
-                message = (
-                    f'Xin chào {borrow_request.user.username},\n\n'
-                    f'Yêu cầu mượn sách "{borrow_request.book.title}" của bạn đã bị từ chối.\n'
-                    f'Lý do: {borrow_request.reject_reason}\n\n'  # ✅
-                    'Vui lòng liên hệ quản trị nếu cần hỗ trợ thêm.\n\n'
-                    'Cảm ơn bạn.'
-                )
-                send_mail(
-                    subject,
-                    message,
-                    getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@bookclub.local'),
-                    [borrow_request.user.email],
-                    fail_silently=True,
-                )
+            try:
+                reject_request(borrow_request, request.user, form.cleaned_data['reject_reason'])
+            except BorrowError as exc:
+                messages.error(request, str(exc))
+                return redirect('borrowing:admin_pending')
 
+            invalidate_dashboard()
             messages.success(request, 'Đã từ chối yêu cầu')
             return redirect('borrowing:admin_pending')
     else:
@@ -218,27 +358,28 @@ def admin_active_transactions_view(request):
         status__in=['BORROWING', 'OVERDUE']
     ).select_related('borrow_request__user', 'borrow_request__book')
 
-    search = request.GET.get('search', '')
+    search, match = _search_params(request)
     if search:
-        qs = qs.filter(
-            Q(borrow_request__user__username__icontains=search) |
-            Q(borrow_request__user__email__icontains=search) |
-            Q(borrow_request__book__title__icontains=search)
-        )
+        qs = qs.filter(admin_search_q(
+            search, match, user='borrow_request__user', book='borrow_request__book',
+            contains=['borrow_request__user__email'],
+        ))
 
     status = request.GET.get('status', '')
     if status in ['BORROWING', 'OVERDUE']:
         qs = qs.filter(status=status)
 
     sort = request.GET.get('sort', 'due_at')
-    if sort in ['due_at', '-due_at', 'borrowed_at', '-borrowed_at']:
-        qs = qs.order_by(sort)
-    else:
-        qs = qs.order_by('due_at')
+    if sort not in ['due_at', '-due_at', 'borrowed_at', '-borrowed_at']:
+        sort = 'due_at'
+    qs = qs.order_by(sort, '-id' if sort.startswith('-') else 'id')
+
+    page = KeysetPaginator(qs, ADMIN_PAGE_SIZE).get_page(request.GET.get('cursor'))
 
     return render(request, 'borrowing/admin_transactions.html', {
-        'transactions': qs,
+        'transactions': page,
         'search': search,
+        'match': match,
         'status': status,
         'sort': sort,
     })
@@ -247,18 +388,19 @@ def admin_active_transactions_view(request):
 @login_required
 @user_passes_test(is_admin)
 def return_book_view(request, pk):
-    transaction = get_object_or_404(BorrowTransaction, pk=pk, status__in=['BORROWING', 'OVERDUE'])
+    transaction = get_object_or_404(
+        BorrowTransaction.objects.select_related('borrow_request__book'),
+        pk=pk, status__in=['BORROWING', 'OVERDUE'],
+    )
 
     if request.method == 'POST':
-        transaction.returned_at = timezone.now()
-        transaction.status = 'RETURNED'
-        transaction.save()
-        transaction.calculate_fine()
-
-        book = transaction.borrow_request.book
-        book.available_copies += 1
-        book.save()
+        try:
+            return_book(transaction, statuses=['BORROWING', 'OVERDUE'])
+        except BorrowError as exc:
+            messages.error(request, str(exc))
+            return redirect('borrowing:admin_transactions')
 
+        invalidate_dashboard()
         messages.success(request, 'Đã xác nhận trả sách')
         return redirect('borrowing:admin_transactions')
 
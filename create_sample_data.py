@@ -11,6 +11,9 @@ from django.utils import timezone
 from library.models import Category, Book
 from accounts.models import StudentProfile
 from borrowing.models import BorrowRequest, BorrowTransaction
+from library.popularity import recompute_popularity
+from borrowing.stats import rebuild_daily_stats
+from borrowing.borrowers import rebuild_borrower_stats
 
 # ============================================================
 # Tạo tài khoản admin
@@ -201,4 +204,9 @@ for i in range(30):
         )
 
 print("✅ Đã tạo dữ liệu mượn sách cho 30 ngày qua!")
+
+# Đồng bộ bộ đếm lượt mượn, thống kê theo ngày và bộ đếm của người mượn với dữ liệu vừa tạo
+recompute_popularity()
+rebuild_daily_stats()
+rebuild_borrower_stats()
 print("\n🎉 Hoàn thành! Dữ liệu mẫu đã được tạo thành công!")
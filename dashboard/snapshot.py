@@ -0,0 +1,104 @@
+"""Cached dashboard snapshot.
+
+All KPIs are computed together (one conditional aggregate per table) and
+cached. A snapshot is served fresh for ``FRESH_SECONDS``; after that the
+first worker to take the lock recomputes it while the others keep serving
+the stale copy, so concurrent misses never pile up on the database. Write
+paths call ``invalidate_dashboard`` to drop the snapshot after commit.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from borrowing.models import BorrowRequest, BorrowTransaction
+from borrowing.stats import TREND_PERIODS, circulation_trend
+from library.models import Book, Category
+from reviews.models import Review
+from reviews.moderation import THROUGHPUT_WINDOW_MINUTES, moderator_throughput
+
+FRESH_SECONDS = 60
+STALE_SECONDS = 600
+LOCK_SECONDS = 30
+WAIT_SECONDS = 5
+
+
+def _key(period):
+    return f'dashboard:snapshot:{period}'
+
+
+def compute_snapshot(period='30d'):
+    books = Book.objects.aggregate(total=Count('id', filter=Q(is_active=True)))
+    categories = Category.objects.aggregate(total=Count('id', filter=Q(is_active=True)))
+    users = User.objects.aggregate(total=Count('id', filter=Q(is_active=True)))
+    transactions = BorrowTransaction.objects.aggregate(
+        active=Count('id', filter=Q(status__in=['BORROWING', 'OVERDUE'])),
+        overdue=Count('id', filter=Q(status='OVERDUE')),
+    )
+    requests = BorrowRequest.objects.aggregate(pending=Count('id', filter=Q(status='PENDING')))
+    reviews = Review.objects.aggregate(pending=Count('id', filter=Q(status='PENDING')))
+
+    return {
+        'total_books': books['total'],
+        'total_categories': categories['total'],
+        'total_users': users['total'],
+        'active_borrows': transactions['active'],
+        'overdue_borrows': transactions['overdue'],
+        'pending_requests': requests['pending'],
+        'pending_reviews': reviews['pending'],
+        'top_books': list(
+            Book.objects.order_by('-borrow_count', '-id').values('id', 'title', 'borrow_count')[:5]
+        ),
+        'top_categories': list(
+            Category.objects.order_by('-borrow_count', 'name').values('id', 'name', 'borrow_count')[:5]
+        ),
+        'borrow_trend': circulation_trend(period),
+        'moderation': moderator_throughput(window=THROUGHPUT_WINDOW_MINUTES),
+        'computed_at': timezone.now(),
+    }
+
+
+def _refresh(period):
+    snapshot = compute_snapshot(period)
+    cache.set(_key(period), (time.time(), snapshot), STALE_SECONDS)
+    return snapshot
+
+
+def get_snapshot(period='30d'):
+    key = _key(period)
+    lock_key = f'{key}:lock'
+
+    cached = cache.get(key)
+    if cached is not None:
+        stored_at, snapshot = cached
+        if time.time() - stored_at < FRESH_SECONDS:
+            return snapshot
+        # Stale: only the lock holder recomputes, everyone else serves the old copy
+        if cache.add(lock_key, 1, LOCK_SECONDS):
+            try:
+                return _refresh(period)
+            finally:
+                cache.delete(lock_key)
+        return snapshot
+
+    # Cold miss: one worker computes, the others wait for its result
+    if cache.add(lock_key, 1, LOCK_SECONDS):
+        try:
+            return _refresh(period)
+        finally:
+            cache.delete(lock_key)
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[1]
+    return compute_snapshot(period)
+
+
+def invalidate_dashboard():
+    """Drop cached snapshots once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete_many([_key(period) for period in TREND_PERIODS]))
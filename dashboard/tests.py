@@ -0,0 +1,65 @@
+import time
+
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+from borrowing.models import BorrowRequest
+from library.models import Category, Book
+from .snapshot import _key, get_snapshot
+
+
+class DashboardQueryCountTests(TestCase):
+    """The dashboard used to run ~40 queries (one COUNT per day of the trend)."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_query_count_is_bounded(self):
+        for period in ['30d', '12m', 'year']:
+            with self.subTest(period=period):
+                with CaptureQueriesContext(connection) as ctx:
+                    resp = self.client.get(reverse('dashboard:dashboard'), {'period': period})
+                self.assertEqual(resp.status_code, 200)
+                # session + user + 6 KPI aggregates + 2 top-N + 1 trend + 1 moderator throughput
+                self.assertLessEqual(len(ctx.captured_queries), 12)
+
+    def test_cached_snapshot_skips_kpi_queries(self):
+        self.client.get(reverse('dashboard:dashboard'))
+        with self.assertNumQueries(2):  # session + user only
+            resp = self.client.get(reverse('dashboard:dashboard'))
+        self.assertContains(resp, 'Số liệu cập nhật')
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_snapshot_is_served_while_another_worker_refreshes(self):
+        snapshot = get_snapshot()
+        cache.set(_key('30d'), (time.time() - 3600, snapshot), 600)
+        cache.add(_key('30d') + ':lock', 1, 30)  # someone else is recomputing
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(), snapshot)
+
+    def test_write_paths_invalidate_snapshot(self):
+        user = User.objects.create_user(username='user', password='user123')
+        book = Book.objects.create(
+            title='Test Book', author='Author', publisher='Pub', publish_year=2022,
+            category=Category.objects.create(name='Test'),
+        )
+        self.assertEqual(get_snapshot()['pending_requests'], 0)
+
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('borrowing:create_request', args=[book.pk]), {
+                'expected_return_date': timezone.localdate(),
+            })
+        self.assertEqual(BorrowRequest.objects.count(), 1)
+        self.assertEqual(get_snapshot()['pending_requests'], 1)
@@ -0,0 +1,40 @@
+"""Cache for the anonymous part of ``book_detail_view``.
+
+The cached entry holds the book (with its category), the approved review
+count and the newest approved reviews. It is dropped when the book is saved
+(edit, hide), when borrowing changes its stock and when a review on it is
+approved.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Book
+
+DETAIL_TIMEOUT = 15 * 60
+TOP_REVIEWS = 10
+
+
+def _key(book_id):
+    return f'book_detail:{book_id}'
+
+
+def get_book_detail(book_id):
+    """Return ``{'book', 'reviews', 'reviews_count'}`` or None if the book is missing/hidden."""
+    key = _key(book_id)
+    data = cache.get(key)
+    if data is None:
+        book = Book.objects.select_related('category').filter(pk=book_id, is_active=True).first()
+        if book is None:
+            return None
+        approved = book.reviews.filter(status='APPROVED')
+        data = {
+            'book': book,
+            'reviews_count': approved.count(),
+            'reviews': list(approved.select_related('user').order_by('-created_at', '-id')[:TOP_REVIEWS]),
+        }
+        cache.set(key, data, DETAIL_TIMEOUT)
+    return data
+
+
+def invalidate_book_detail(book_id):
+    transaction.on_commit(lambda: cache.delete(_key(book_id)))
@@ -2,6 +2,12 @@ from django import forms
 from .models import Book, Category
 from django.core.exceptions import ValidationError
 
+def validate_copies(total, available):
+    """Số bản khả dụng không được vượt quá tổng số (dùng chung cho form và import)."""
+    if available is not None and total is not None and available > total:
+        raise ValidationError('Số lượng khả dụng không được vượt quá tổng số')
+
+
 class BookForm(forms.ModelForm):
     class Meta:
         model = Book
@@ -24,10 +30,7 @@ class BookForm(forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
-        total = cleaned_data.get('total_copies')
-        available = cleaned_data.get('available_copies')
-        if available and total and available > total:
-            raise ValidationError('Số lượng khả dụng không được vượt quá tổng số')
+        validate_copies(cleaned_data.get('total_copies'), cleaned_data.get('available_copies'))
         return cleaned_data
 
 class CategoryForm(forms.ModelForm):
@@ -0,0 +1,117 @@
+"""Cover image variants.
+
+Each uploaded cover gets WebP and JPEG thumbnails at ``VARIANT_WIDTHS``,
+stored next to the original (``book_covers/foo_w320.webp``) with all
+metadata stripped. Generation runs after commit on a small background
+thread pool, never on the request path; ``manage.py backfill_cover_variants``
+processes existing covers across CPU cores.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Book
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (160, 320, 640)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def variant_name(source_name, width, fmt):
+    stem, _ = os.path.splitext(source_name)
+    return f'{stem}_w{width}.{fmt}'
+
+
+def render_variants(source):
+    """Yield ``(fmt, width, bytes)`` for every variant of an image file object."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+
+        # Never upscale; always keep at least the smallest width
+        widths = [w for w in VARIANT_WIDTHS if w < image.width] or [min(image.width, VARIANT_WIDTHS[0])]
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for fmt, (pil_format, options) in VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                # No exif/icc arguments: saved variants carry no metadata
+                resized.save(buffer, pil_format, **options)
+                yield fmt, width, buffer.getvalue()
+
+
+def delete_variants(storage, variants):
+    for fmt in VARIANT_FORMATS:
+        for name in (variants or {}).get(fmt, {}).values():
+            storage.delete(name)
+
+
+def generate_variants(book):
+    """Write variants for ``book.cover_image`` and return the new ``cover_variants`` value."""
+    field = book.cover_image
+    storage = field.storage
+    variants = {'source': field.name}
+    with storage.open(field.name, 'rb') as source:
+        for fmt, width, data in render_variants(source):
+            name = variant_name(field.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            variants.setdefault(fmt, {})[str(width)] = storage.save(name, ContentFile(data))
+    return variants
+
+
+def process_book_cover(book_id):
+    """(Re)generate or clean up variants for one book. Safe to call repeatedly."""
+    from .detail_cache import invalidate_book_detail
+
+    book = Book.objects.filter(pk=book_id).only('id', 'cover_image', 'cover_variants').first()
+    if book is None:
+        return False
+    current = book.cover_variants or {}
+    if book.cover_image and current.get('source') == book.cover_image.name:
+        return False
+
+    storage = book.cover_image.storage
+    variants = generate_variants(book) if book.cover_image else {}
+    if current.get('source') != variants.get('source'):
+        delete_variants(storage, current)
+    Book.objects.filter(pk=book_id).update(cover_variants=variants)
+    invalidate_book_detail(book_id)
+    return True
+
+
+def _run_in_background(book_id):
+    close_old_connections()
+    try:
+        process_book_cover(book_id)
+    except Exception:
+        logger.exception('Cover processing failed for book %s', book_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_cover_processing(book_id):
+    """Queue variant generation for after the current transaction commits."""
+    def submit():
+        global _executor
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='covers')
+        _executor.submit(_run_in_background, book_id)
+
+    transaction.on_commit(submit)
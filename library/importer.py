@@ -0,0 +1,198 @@
+"""Bulk catalog import (``manage.py import_books``).
+
+Rows are streamed from CSV or NDJSON, validated with the same rules as
+``BookForm`` and upserted by ISBN in batches: one locking SELECT for the
+batch's existing books, then a single upserting
+``bulk_create(update_conflicts=True)`` inside a transaction.
+Invalid rows are written to a rejects file instead of aborting the run.
+
+Re-importing never touches circulation state: ``is_active`` (soft delete)
+is kept, and ``available_copies`` of an existing book moves by the change
+in ``total_copies`` so copies on loan stay accounted for. A row whose
+total is below the copies currently on loan is rejected.
+"""
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .detail_cache import invalidate_book_detail
+from .forms import validate_copies
+from .models import Book, Category
+from .search import index_books
+
+BOOK_FIELDS = [
+    'title', 'author', 'publisher', 'publish_year', 'isbn',
+    'description', 'total_copies', 'available_copies',
+]
+# is_active is only set on insert; available_copies is recomputed for existing books in _flush
+UPDATE_FIELDS = [f for f in BOOK_FIELDS if f != 'isbn'] + ['category_id', 'updated_at']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'có', 'x'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'không'}
+
+
+def _normalize_key(key):
+    # Accept both field names and the export headers ("Publish Year" -> publish_year)
+    return (key or '').strip().lower().replace(' ', '_')
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row_dict)`` from a text stream."""
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as exc:
+                yield line_number, {'__error__': f'JSON không hợp lệ: {exc}', '__raw__': line.strip()}
+                continue
+            if not isinstance(data, dict):
+                yield line_number, {'__error__': 'Mỗi dòng phải là một object JSON', '__raw__': line.strip()}
+                continue
+            yield line_number, {_normalize_key(k): v for k, v in data.items()}
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {_normalize_key(k): v for k, v in row.items()}
+
+
+class BookImporter:
+    def __init__(self, batch_size=1000, create_categories=False, created_by=None, rejects=None):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.created_by = created_by
+        self.rejects = rejects
+        self.categories = {name.casefold(): pk for pk, name in Category.objects.values_list('id', 'name')}
+        self.stats = {'read': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+
+    def _category_id(self, name):
+        name = (name or '').strip()
+        if not name:
+            raise ValidationError('Thiếu danh mục')
+        category_id = self.categories.get(name.casefold())
+        if category_id is None:
+            if not self.create_categories:
+                raise ValidationError(f'Danh mục "{name}" không tồn tại')
+            category_id = Category.objects.create(name=name).pk
+            self.categories[name.casefold()] = category_id
+        return category_id
+
+    def clean_row(self, row):
+        """Return model field values for a row or raise ValidationError."""
+        if '__error__' in row:
+            raise ValidationError(row['__error__'])
+
+        values = {}
+        errors = []
+        for name in BOOK_FIELDS:
+            raw = row.get(name)
+            raw = raw.strip() if isinstance(raw, str) else raw
+            if name == 'isbn' and raw:
+                raw = str(raw).replace('-', '').replace(' ', '')
+            if raw in (None, ''):
+                if name == 'isbn':
+                    errors.append('isbn: bắt buộc khi import (dùng để cập nhật sách đã có)')
+                    continue
+                if name in ('total_copies', 'available_copies'):
+                    continue  # defaults applied below
+            try:
+                values[name] = Book._meta.get_field(name).clean('' if raw is None else raw, None)
+            except ValidationError as exc:
+                errors.append(f'{name}: {"; ".join(exc.messages)}')
+
+        try:
+            values['category_id'] = self._category_id(row.get('category'))
+        except ValidationError as exc:
+            errors.extend(exc.messages)
+
+        active = str(row.get('active', row.get('is_active', '')) or '').strip().lower()
+        if active and active not in TRUE_VALUES | FALSE_VALUES:
+            errors.append(f'active: giá trị không hợp lệ "{active}"')
+        values['is_active'] = active not in FALSE_VALUES
+
+        if errors:
+            raise ValidationError(errors)
+
+        values.setdefault('total_copies', 1)
+        values.setdefault('available_copies', values['total_copies'])
+        validate_copies(values['total_copies'], values['available_copies'])
+        return values
+
+    def _reject(self, line_number, row, error):
+        self.stats['rejected'] += 1
+        if self.rejects is not None:
+            raw = row.get('__raw__', {k: v for k, v in row.items() if not k.startswith('__')})
+            self.rejects.write(json.dumps(
+                {'line': line_number, 'error': error, 'row': raw}, ensure_ascii=False, default=str,
+            ) + '\n')
+
+    def _flush(self, batch):
+        """Upsert ``{isbn: (line_number, row, values)}``."""
+        upsert = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+        if connection.features.supports_update_conflicts_with_target:
+            upsert['unique_fields'] = ['isbn']  # MySQL infers it from the unique key
+
+        with transaction.atomic():
+            # Locked so loans can't move stock between this read and the upsert
+            stock = {
+                isbn: total - available
+                for isbn, total, available in Book.objects.select_for_update()
+                .filter(isbn__in=list(batch)).values_list('isbn', 'total_copies', 'available_copies')
+            }
+            accepted = []
+            for isbn, (line_number, row, values) in batch.items():
+                if isbn in stock:
+                    on_loan = stock[isbn]
+                    if values['total_copies'] < on_loan:
+                        self._reject(line_number, row, f'total_copies: thấp hơn số bản đang cho mượn ({on_loan})')
+                        continue
+                    values['available_copies'] = values['total_copies'] - on_loan
+                accepted.append(values)
+            if not accepted:
+                return
+            existing = {values['isbn'] for values in accepted} & set(stock)
+            books = [Book(created_by=self.created_by, **values) for values in accepted]
+            # One INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE per batch
+            Book.objects.bulk_create(books, batch_size=self.batch_size, **upsert)
+
+            if any(book.pk is None for book in books):
+                ids = dict(Book.objects.filter(isbn__in=list(batch)).values_list('isbn', 'id'))
+                for book in books:
+                    book.pk = ids.get(book.isbn)
+
+            index_books(books)
+            for book in books:
+                if book.isbn in existing:
+                    invalidate_book_detail(book.pk)
+
+        self.stats['created'] += len(books) - len(existing)
+        self.stats['updated'] += len(existing)
+
+    def run(self, rows, progress=None):
+        """Import ``(line_number, row)`` pairs. ``progress(stats, rows_per_second)`` is called per batch."""
+        start = time.perf_counter()
+        batch = {}
+        for line_number, row in rows:
+            self.stats['read'] += 1
+            try:
+                values = self.clean_row(row)
+            except ValidationError as exc:
+                self._reject(line_number, row, '; '.join(exc.messages))
+                continue
+            # A repeated ISBN inside one batch: last row wins
+            batch[values['isbn']] = (line_number, row, values)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = {}
+                if progress:
+                    progress(self.stats, self.stats['read'] / (time.perf_counter() - start))
+        if batch:
+            self._flush(batch)
+        elapsed = time.perf_counter() - start
+        self.stats['seconds'] = elapsed
+        self.stats['rows_per_second'] = self.stats['read'] / elapsed if elapsed else 0
+        return self.stats
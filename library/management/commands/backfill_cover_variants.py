@@ -0,0 +1,57 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _init_worker():
+    # Needed when worker processes are spawned (Windows/macOS) rather than forked
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_system.settings')
+    django.setup()
+    connections.close_all()
+
+
+def _process(book_id):
+    from library.images import process_book_cover
+    return process_book_cover(book_id)
+
+
+class Command(BaseCommand):
+    help = 'Sinh ảnh thu nhỏ (WebP/JPEG) cho các ảnh bìa hiện có, chạy song song trên nhiều CPU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Sinh lại cả các ảnh đã có bản thu nhỏ')
+
+    def handle(self, *args, **options):
+        from library.models import Book
+
+        books = Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if options['force']:
+            books.update(cover_variants={})
+        book_ids = list(books.values_list('id', flat=True))
+        if not book_ids:
+            self.stdout.write('Không có ảnh bìa nào cần xử lý')
+            return
+
+        # Forked workers must not share the parent's DB connection
+        connections.close_all()
+        start = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = {pool.submit(_process, book_id): book_id for book_id in book_ids}
+            for future in as_completed(futures):
+                try:
+                    if future.result():
+                        done += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'Sách #{futures[future]}: {exc}')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã xử lý {done} ảnh bìa ({failed} lỗi, {len(book_ids) - done - failed} đã có sẵn) trong {elapsed:.1f}s'
+        ))
@@ -0,0 +1,123 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+
+from library.models import Book, Category
+from library.pagination import KeysetPaginator
+from library.search import rebuild_index, search_books
+
+SYLLABLES = [
+    'Dế', 'Mèn', 'Phiêu', 'Lưu', 'Ký', 'Truyện', 'Kiều', 'Lập', 'Trình', 'Py',
+    'Đắc', 'Nhân', 'Tâm', 'Kinh', 'Tế', 'Học', 'Lịch', 'Sử', 'Việt', 'Nam',
+    'Cle', 'an', 'Co', 'de', 'Da', 'ta', 'Ha', 'ri', 'Nguy', 'ễn', 'Tr', 'ần',
+]
+
+
+def search_term_prefix(word):
+    return word[:len(word) // 2 + 1]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark tìm kiếm sách trên dữ liệu tổng hợp (dữ liệu được rollback sau khi chạy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['books'], options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _timeit(self, label, fn, repeat):
+        fn()  # warm up
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        self.stdout.write(f'{label:<40} {elapsed:8.2f} ms')
+
+    def _seed(self, n):
+        rng = random.Random(42)
+        # A realistic catalog has a large vocabulary, so build ~30k distinct words
+        words = list({''.join(rng.choices(SYLLABLES, k=3)) for _ in range(40_000)})
+        self.words = words
+        category = Category.objects.create(name=f'__bench_{time.time_ns()}')
+        batch = []
+        for i in range(n):
+            batch.append(Book(
+                title=' '.join(rng.choices(words, k=4)),
+                author=' '.join(rng.choices(words, k=2)),
+                publisher='Bench',
+                publish_year=2000,
+                isbn=f'{9_000_000_000_000 + i}',
+                description=' '.join(rng.choices(words, k=12)),
+                category=category,
+            ))
+            if len(batch) == 5000:
+                Book.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Book.objects.bulk_create(batch)
+
+    def _run(self, n, repeat):
+        self.stdout.write(f'Seeding {n} books...')
+        self._seed(n)
+        start = time.perf_counter()
+        rebuild_index(batch_size=5000)
+        self.stdout.write(f'Index build: {time.perf_counter() - start:.1f} s')
+
+        base = Book.objects.filter(is_active=True).select_related('category')
+        rng = random.Random(7)
+        queries = [
+            ' '.join(rng.choices(self.words, k=1)),
+            ' '.join(rng.choices(self.words, k=2)),
+            search_term_prefix(rng.choice(self.words)),
+            '9000000000123',
+        ]
+        for query in queries:
+            def like():
+                list(base.filter(
+                    Q(title__icontains=query) |
+                    Q(author__icontains=query) |
+                    Q(isbn__icontains=query)
+                ).order_by('-created_at')[:12])
+
+            def indexed():
+                list(search_books(base, query).order_by('-search_rank', '-created_at')[:12])
+
+            self._timeit(f'LIKE   "{query}"', like, repeat)
+            self._timeit(f'index  "{query}"', indexed, repeat)
+
+        # Pagination: OFFSET + COUNT(*) vs keyset, page 1 and a deep page
+        per_page = 12
+        deep = min(5000, n // per_page)
+        ordered = base.order_by('-created_at', '-id')
+
+        def offset_page(number):
+            page = Paginator(ordered, per_page).get_page(number)
+            list(page)
+            page.paginator.num_pages
+
+        self._timeit('OFFSET page 1', lambda: offset_page(1), repeat)
+        self._timeit('keyset page 1', lambda: list(KeysetPaginator(ordered, per_page).get_page()), repeat)
+        if deep < 2:
+            self.stdout.write(f'Deep page skipped: {n} books fill fewer than 2 pages')
+            return
+
+        # Page `deep` starts right after the last row of page `deep - 1`
+        deep_obj = ordered[(deep - 1) * per_page - 1]
+        deep_cursor = KeysetPaginator(ordered, per_page)._cursor('n', deep_obj)
+        self._timeit(f'OFFSET page {deep}', lambda: offset_page(deep), repeat)
+        self._timeit(f'keyset page {deep}', lambda: list(KeysetPaginator(ordered, per_page).get_page(deep_cursor)), repeat)
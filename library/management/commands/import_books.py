@@ -0,0 +1,57 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from library.importer import BookImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import sách hàng loạt từ CSV/NDJSON, cập nhật theo ISBN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File CSV hoặc NDJSON')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Mặc định đoán theo đuôi file')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số dòng mỗi transaction')
+        parser.add_argument('--rejects', help='File ghi các dòng bị từ chối (mặc định: <path>.rejects.ndjson)')
+        parser.add_argument('--create-categories', action='store_true', help='Tự tạo danh mục chưa có')
+        parser.add_argument('--user', help='Username ghi vào created_by')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Không tìm thấy file {path}')
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+        created_by = None
+        if options['user']:
+            created_by = User.objects.filter(username=options['user']).first()
+            if created_by is None:
+                raise CommandError(f'Không tìm thấy user {options["user"]}')
+
+        rejects_path = options['rejects'] or f'{path}.rejects.ndjson'
+
+        def progress(stats, rate):
+            self.stdout.write(
+                f'  {stats["read"]} dòng | +{stats["created"]} mới, ~{stats["updated"]} cập nhật, '
+                f'{stats["rejected"]} lỗi | {rate:.0f} dòng/s'
+            )
+
+        with open(path, encoding='utf-8-sig', newline='') as stream, \
+                open(rejects_path, 'w', encoding='utf-8') as rejects:
+            importer = BookImporter(
+                batch_size=options['batch_size'],
+                create_categories=options['create_categories'],
+                created_by=created_by,
+                rejects=rejects,
+            )
+            stats = importer.run(read_rows(stream, fmt), progress=progress)
+
+        if not stats['rejected']:
+            os.remove(rejects_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Xong: {stats["read"]} dòng trong {stats["seconds"]:.1f}s ({stats["rows_per_second"]:.0f} dòng/s) - '
+            f'{stats["created"]} mới, {stats["updated"]} cập nhật, {stats["rejected"]} lỗi'
+        ))
+        if stats['rejected']:
+            self.stdout.write(self.style.WARNING(f'Các dòng lỗi được ghi vào {rejects_path}'))
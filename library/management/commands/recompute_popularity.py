@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from library.popularity import recompute_popularity
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bộ đếm lượt mượn của sách và danh mục từ lịch sử mượn'
+
+    def handle(self, *args, **options):
+        books, categories = recompute_popularity()
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã sửa {books} sách và {categories} danh mục bị lệch'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Tính lại điểm đánh giá trung bình và phân bố sao của sách từ các review đã duyệt'
+
+    def handle(self, *args, **options):
+        fixed = recompute_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Đã sửa {fixed} sách bị lệch'))
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from library.search import build_tokens
+
+    Book = apps.get_model('library', 'Book')
+    BookSearchToken = apps.get_model('library', 'BookSearchToken')
+    batch = []
+    for book in Book.objects.filter(is_active=True).iterator(chunk_size=1000):
+        batch.extend(
+            BookSearchToken(book_id=book.pk, token=token, weight=weight)
+            for token, weight in build_tokens(book).items()
+        )
+        if len(batch) >= 1000:
+            BookSearchToken.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        BookSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='library.book')),
+            ],
+            options={
+                'db_table': 'book_search_tokens',
+                'indexes': [models.Index(fields=['token', 'book'], name='idx_search_token_book')],
+                'unique_together': {('book', 'token')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
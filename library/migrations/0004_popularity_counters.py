@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Category = apps.get_model('library', 'Category')
+    BorrowRequest = apps.get_model('borrowing', 'BorrowRequest')
+
+    counts = (
+        BorrowRequest.objects.filter(status__in=['APPROVED', 'RETURNED'])
+        .values('book_id').annotate(n=Count('id')).values_list('book_id', 'n')
+    )
+    for book_id, n in counts:
+        Book.objects.filter(pk=book_id).update(borrow_count=n)
+    per_category = Book.objects.values('category_id').annotate(n=Sum('borrow_count')).values_list('category_id', 'n')
+    for category_id, n in per_category:
+        Category.objects.filter(pk=category_id).update(borrow_count=n or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_sort_indexes'),
+        ('borrowing', '0003_borrowrequest_reject_reason'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='borrow_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='borrow_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['borrow_count', 'id'], name='idx_books_popular'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:41
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Review = apps.get_model('reviews', 'Review')
+
+    rows = (
+        Review.objects.filter(status='APPROVED').values('book_id')
+        .annotate(count=Count('id'), total=Sum('rating'),
+                  **{f'r{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)})
+        .order_by()
+    )
+    for row in rows:
+        Book.objects.filter(pk=row['book_id']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            rating_avg=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01'), ROUND_HALF_UP),
+            **{f'rating_{stars}': row[f'r{stars}'] for stars in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_book_cover_variants'),
+        ('reviews', '0002_admin_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating_avg', 'rating_count', 'id'], name='idx_books_rating'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
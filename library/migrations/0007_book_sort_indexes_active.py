@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='idx_books_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='idx_books_title',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='idx_books_popular',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='idx_books_rating',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='idx_books_created'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', 'title', 'id'], name='idx_books_title'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', 'borrow_count', 'id'], name='idx_books_popular'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['is_active', 'rating_avg', 'rating_count', 'id'], name='idx_books_rating'),
+        ),
+    ]
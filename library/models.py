@@ -7,6 +7,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -31,11 +32,24 @@ class Book(models.Model):
         null=True,
         blank=True
     )
+    # Ảnh thu nhỏ sinh tự động từ cover_image (xem library.images)
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
     total_copies = models.IntegerField(default=1, validators=[MinValueValidator(0)])
     available_copies = models.IntegerField(default=1, validators=[MinValueValidator(0)])
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='books')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     is_active = models.BooleanField(default=True)
+    # Số lượt mượn đã duyệt, cập nhật cùng transaction duyệt mượn (xem library.popularity)
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+    # Tổng hợp các review đã duyệt, cập nhật khi duyệt review (xem library.ratings)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -44,6 +58,15 @@ class Book(models.Model):
         verbose_name = 'Sách'
         verbose_name_plural = 'Sách'
         ordering = ['-created_at']
+        indexes = [
+            # Match the keyset sorts of book_list_view and the export, which both
+            # filter is_active=True: the equality prefix keeps hidden books out of
+            # the scan and the rest of the index gives the sort order.
+            models.Index(fields=['is_active', 'created_at', 'id'], name='idx_books_created'),
+            models.Index(fields=['is_active', 'title', 'id'], name='idx_books_title'),
+            models.Index(fields=['is_active', 'borrow_count', 'id'], name='idx_books_popular'),
+            models.Index(fields=['is_active', 'rating_avg', 'rating_count', 'id'], name='idx_books_rating'),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=Q(available_copies__lte=F('total_copies')),
@@ -56,4 +79,43 @@ class Book(models.Model):
 
     @property
     def is_available(self):
-        return self.available_copies > 0 and self.is_active
\ No newline at end of file
+        return self.available_copies > 0 and self.is_active
+
+    @property
+    def rating_histogram(self):
+        """[(stars, count, percent)] from 5 down to 1, for the detail page bars."""
+        total = self.rating_count or 1
+        return [
+            (stars, getattr(self, f'rating_{stars}'), round(100 * getattr(self, f'rating_{stars}') / total))
+            for stars in range(5, 0, -1)
+        ]
+
+    @property
+    def cover_srcset(self):
+        """{'webp': 'url 160w, url 320w, ...', 'jpeg': ...}; empty until variants exist."""
+        variants = self.cover_variants or {}
+        if not self.cover_image or variants.get('source') != self.cover_image.name:
+            return {}
+        storage = self.cover_image.storage
+        return {
+            fmt: ', '.join(f'{storage.url(name)} {width}w' for width, name in sorted(
+                variants[fmt].items(), key=lambda item: int(item[0])
+            ))
+            for fmt in ('webp', 'jpeg') if variants.get(fmt)
+        }
+
+class BookSearchToken(models.Model):
+    """Inverted index for the book catalog (see ``library.search``)."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        db_table = 'book_search_tokens'
+        unique_together = [['book', 'token']]
+        indexes = [
+            models.Index(fields=['token', 'book'], name='idx_search_token_book'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.book_id}"
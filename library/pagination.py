@@ -0,0 +1,162 @@
+"""Keyset (cursor) pagination.
+
+Instead of ``OFFSET n`` + ``COUNT(*)``, each page is fetched with a
+``WHERE (sort keys) > (last row's keys)`` condition, so page 5000 costs the
+same as page 1. The sort keys are read from the queryset's ``order_by`` and
+must end with a unique column (``id``) to make the order total.
+
+A cursor carries the sort spec it was cut for; a cursor from another sort,
+or one whose values don't convert back through the key fields'
+``to_python``, is treated as no cursor (page 1) rather than reaching the ORM.
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+def _encode(spec, direction, values):
+    payload = json.dumps({'k': spec, 'd': direction, 'v': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode(token, spec):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data['k'] == spec and data['d'] in ('n', 'p') and isinstance(data['v'], list):
+            return data['d'], data['v']
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None, None
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class CursorPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, approx_count=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approx_count = approx_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = []
+        for field in queryset.query.order_by:
+            descending = field.startswith('-')
+            self.keys.append((field.lstrip('-'), descending))
+        self.spec = ','.join(queryset.query.order_by)
+
+    def _key_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        model = self.queryset.model
+        parts = name.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(parts[-1])
+
+    def _clean(self, values):
+        """Cursor values converted for the ORM, or None if any is missing / malformed."""
+        if len(values) != len(self.keys):
+            return None
+        cleaned = []
+        try:
+            for (name, _), value in zip(self.keys, values):
+                if value is None or isinstance(value, (list, dict)):
+                    return None
+                cleaned.append(self._key_field(name).to_python(value))
+        except (ValidationError, ValueError, TypeError, FieldDoesNotExist, AttributeError):
+            return None
+        return cleaned
+
+    def _after(self, values, reverse=False):
+        """Q for rows strictly after ``values`` in the (possibly reversed) order."""
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        # Redundant bound on the leading key turns the OR into an index range scan
+        field, descending = self.keys[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{field}__{lookup}': values[0]}) & condition
+
+    def _cursor(self, direction, obj):
+        return _encode(self.spec, direction, [_jsonable(self._value(obj, field)) for field, _ in self.keys])
+
+    @staticmethod
+    def _value(obj, name):
+        for part in name.split('__'):
+            obj = getattr(obj, part)
+        return obj
+
+    def cursor_after(self, obj):
+        """Cursor for the page following ``obj`` (e.g. the last row rendered from a cache)."""
+        return self._cursor('n', obj)
+
+    def get_page(self, cursor=None):
+        direction, values = _decode(cursor, self.spec) if cursor else (None, None)
+        if values is not None:
+            values = self._clean(values)
+        if values is None:
+            direction = None
+
+        qs = self.queryset
+        if direction == 'p':
+            reversed_order = [f'{"" if desc else "-"}{field}' for field, desc in self.keys]
+            qs = qs.filter(self._after(values, reverse=True)).order_by(*reversed_order)
+        elif direction == 'n':
+            qs = qs.filter(self._after(values))
+
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, direction == 'n'
+
+        return CursorPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self._cursor('n', rows[-1]) if has_next and rows else None,
+            previous_cursor=self._cursor('p', rows[0]) if has_previous and rows else None,
+        )
+
+
+def approximate_count(queryset, key_parts, timeout=300):
+    """Cached ``COUNT(*)`` for a page header; refreshed at most every ``timeout`` seconds."""
+    digest = hashlib.md5(json.dumps(key_parts, sort_keys=True, default=str).encode()).hexdigest()
+    return cache.get_or_set(f'approx_count:{digest}', lambda: queryset.order_by().count(), timeout)
@@ -0,0 +1,50 @@
+"""Denormalized popularity counters (``Book.borrow_count`` / ``Category.borrow_count``).
+
+A borrow counts once it has been approved (status APPROVED or RETURNED),
+the same definition the dashboard always used.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from borrowing.models import BorrowRequest
+from .models import Book, Category
+
+COUNTED_STATUSES = ['APPROVED', 'RETURNED']
+
+
+def record_borrow(book, count=1):
+    """Bump the counters of ``book`` and its category. Call inside the approval transaction."""
+    Book.objects.filter(pk=book.pk).update(borrow_count=F('borrow_count') + count)
+    Category.objects.filter(pk=book.category_id).update(borrow_count=F('borrow_count') + count)
+
+
+def recompute_popularity(batch_size=1000):
+    """Recompute every counter from borrow history with one GROUP BY pass.
+
+    Only rows that drifted are written. Returns (books_fixed, categories_fixed).
+    """
+    with transaction.atomic():
+        actual = dict(
+            BorrowRequest.objects.filter(status__in=COUNTED_STATUSES)
+            .values('book_id').annotate(n=Count('id')).values_list('book_id', 'n')
+        )
+        drifted = []
+        for book in Book.objects.only('id', 'borrow_count').iterator(chunk_size=batch_size):
+            count = actual.get(book.pk, 0)
+            if book.borrow_count != count:
+                book.borrow_count = count
+                drifted.append(book)
+        Book.objects.bulk_update(drifted, ['borrow_count'], batch_size=batch_size)
+
+        per_category = dict(
+            Book.objects.values('category_id').annotate(n=Sum('borrow_count'))
+            .values_list('category_id', 'n')
+        )
+        categories = []
+        for category in Category.objects.only('id', 'borrow_count'):
+            count = per_category.get(category.pk) or 0
+            if category.borrow_count != count:
+                category.borrow_count = count
+                categories.append(category)
+        Category.objects.bulk_update(categories, ['borrow_count'])
+    return len(drifted), len(categories)
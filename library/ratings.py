@@ -0,0 +1,85 @@
+"""Denormalized rating aggregates on ``Book``.
+
+Only APPROVED reviews count. ``rating_count`` / ``rating_sum`` and the
+``rating_1``..``rating_5`` histogram move with ``F()`` updates inside the
+moderation transaction; ``rating_avg`` is then recomputed from the new
+row values, so the catalog can sort by it from ``idx_books_rating``
+without joining ``reviews``.
+"""
+from collections import Counter, defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Round
+
+from reviews.models import Review
+from .models import Book
+
+STARS = range(1, 6)
+FIELDS = ['rating_count', 'rating_sum', 'rating_avg'] + [f'rating_{stars}' for stars in STARS]
+
+_AVERAGE = Case(
+    When(rating_count=0, then=Value(Decimal('0'))),
+    # Rounded in SQL too, so backends without a real DECIMAL type (SQLite) store
+    # the same value the keyset cursor carries
+    default=Cast(
+        Round(Cast('rating_sum', FloatField()) / F('rating_count'), 2),
+        DecimalField(max_digits=3, decimal_places=2),
+    ),
+    output_field=DecimalField(max_digits=3, decimal_places=2),
+)
+
+
+def record_rating(book_id, rating):
+    """Count one newly approved rating. Call inside the moderation transaction."""
+    record_ratings([(book_id, rating)])
+
+
+def record_ratings(ratings):
+    """Count newly approved ``(book_id, rating)`` pairs: one UPDATE per book, then one for the averages."""
+    per_book = defaultdict(Counter)
+    for book_id, rating in ratings:
+        per_book[book_id][rating] += 1
+    if not per_book:
+        return
+    for book_id, buckets in per_book.items():
+        Book.objects.filter(pk=book_id).update(
+            rating_count=F('rating_count') + sum(buckets.values()),
+            rating_sum=F('rating_sum') + sum(stars * n for stars, n in buckets.items()),
+            **{f'rating_{stars}': F(f'rating_{stars}') + n for stars, n in buckets.items()},
+        )
+    # Separate statement: MySQL evaluates SET assignments left to right on the
+    # already-updated row while other backends use the old one
+    Book.objects.filter(pk__in=list(per_book)).update(rating_avg=_AVERAGE)
+
+
+def _average(total, count):
+    return (Decimal(total) / count).quantize(Decimal('0.01'), ROUND_HALF_UP) if count else Decimal('0')
+
+
+def recompute_ratings(batch_size=1000):
+    """Recompute every book's aggregates with one GROUP BY pass. Returns books fixed."""
+    with transaction.atomic():
+        actual = {
+            row['book_id']: row
+            for row in Review.objects.filter(status='APPROVED').values('book_id').annotate(
+                count=Count('id'), total=Sum('rating'),
+                **{f'r{stars}': Count('id', filter=Q(rating=stars)) for stars in STARS},
+            ).order_by()
+        }
+        drifted = []
+        for book in Book.objects.only('id', *FIELDS).iterator(chunk_size=batch_size):
+            row = actual.get(book.pk, {})
+            values = {
+                'rating_count': row.get('count', 0),
+                'rating_sum': row.get('total') or 0,
+                'rating_avg': _average(row.get('total') or 0, row.get('count', 0)),
+                **{f'rating_{stars}': row.get(f'r{stars}', 0) for stars in STARS},
+            }
+            if any(getattr(book, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(book, field, value)
+                drifted.append(book)
+        Book.objects.bulk_update(drifted, FIELDS, batch_size=batch_size)
+    return len(drifted)
@@ -0,0 +1,161 @@
+import re
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Book, BookSearchToken
+
+# Trọng số từng trường khi xếp hạng kết quả tìm kiếm
+FIELD_WEIGHTS = {
+    'isbn': 10,
+    'title': 8,
+    'author': 4,
+    'description': 1,
+}
+
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# "978-604-1..." is indexed as one ISBN token (see build_tokens)
+_DIGIT_HYPHEN_RE = re.compile(r'(?<=\d)-(?=\d)')
+
+
+def fold(text):
+    """Lowercase and strip Vietnamese diacritics: "Dế Mèn" -> "de men"."""
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.lower()
+
+
+def tokenize(text):
+    return [t[:MAX_TOKEN_LENGTH] for t in _TOKEN_RE.findall(fold(text))]
+
+
+def build_tokens(book):
+    """Return {token: weight} for a book, summing weights across fields."""
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(book, field) or ''
+        if field == 'isbn':
+            value = value.replace('-', '')
+        for token in tokenize(value):
+            weights[token] = weights.get(token, 0) + weight
+    return weights
+
+
+def _prefix_q(term):
+    """Prefix match as a range ``term <= token < successor`` so any B-tree
+    index on ``token`` can serve it (``LIKE 'x%'`` is not indexable everywhere).
+
+    Tokens only contain [0-9a-z], which sort the same way under binary and
+    case-insensitive collations.
+    """
+    stem = term.rstrip('z')
+    if not stem:
+        return Q(token__gte=term)
+    last = stem[-1]
+    successor = stem[:-1] + ('a' if last == '9' else chr(ord(last) + 1))
+    return Q(token__gte=term, token__lt=successor)
+
+
+def index_book(book):
+    """(Re)index a single book. Hidden books are removed from the index."""
+    with transaction.atomic():
+        BookSearchToken.objects.filter(book=book).delete()
+        if not book.is_active:
+            return
+        BookSearchToken.objects.bulk_create([
+            BookSearchToken(book=book, token=token, weight=weight)
+            for token, weight in build_tokens(book).items()
+        ])
+
+
+def index_books(books):
+    """Bulk (re)index books written without signals (e.g. ``bulk_create``)."""
+    books = [book for book in books if book.pk]
+    with transaction.atomic():
+        BookSearchToken.objects.filter(book_id__in=[book.pk for book in books]).delete()
+        BookSearchToken.objects.bulk_create([
+            BookSearchToken(book_id=book.pk, token=token, weight=weight)
+            for book in books if book.is_active
+            for token, weight in build_tokens(book).items()
+        ])
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole index from the books table. Returns number of books indexed."""
+    count = 0
+    with transaction.atomic():
+        BookSearchToken.objects.all().delete()
+        books = Book.objects.filter(is_active=True).only(*FIELD_WEIGHTS, 'is_active')
+        batch = []
+        for book in books.iterator(chunk_size=batch_size):
+            batch.extend(
+                BookSearchToken(book_id=book.pk, token=token, weight=weight)
+                for token, weight in build_tokens(book).items()
+            )
+            count += 1
+            if len(batch) >= batch_size:
+                BookSearchToken.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            BookSearchToken.objects.bulk_create(batch)
+    return count
+
+
+def search_books(qs, query):
+    """Filter ``qs`` to books matching every term of ``query`` (prefix match on
+    folded tokens) and annotate ``search_rank``.
+
+    Each term is an indexed range scan on ``(token, book)``; no LIKE '%...%'.
+    """
+    terms = list(dict.fromkeys(tokenize(_DIGIT_HYPHEN_RE.sub('', query))))[:MAX_QUERY_TERMS]
+    if not terms:
+        return qs.none()
+
+    for term in terms:
+        qs = qs.filter(pk__in=BookSearchToken.objects.filter(
+            _prefix_q(term)
+        ).values('book_id'))
+
+    any_term = Q()
+    for term in terms:
+        any_term |= _prefix_q(term)
+    rank = (
+        BookSearchToken.objects
+        .filter(any_term, book=OuterRef('pk'))
+        .values('book')
+        .annotate(total=Sum('weight'))
+        .values('total')
+    )
+    return qs.annotate(
+        search_rank=Coalesce(Subquery(rank, output_field=IntegerField()), Value(0))
+    )
+
+
+SEARCH_MATCHES = ['prefix', 'contains']
+
+
+def admin_search_q(search, match='prefix', user='user', book='book', contains=()):
+    """Q for the admin list searches (username / book title).
+
+    ``prefix`` resolves ``username`` / ``title`` prefixes through their own
+    indexes (``LIKE 'x%'``) into ``IN (subquery)`` filters, so the list query
+    keeps walking its ``(status, sort)`` index. ``contains`` is the old
+    ``icontains`` scan over the joined tables, plus any extra ``contains``
+    lookups (email, review text...).
+    """
+    if match == 'contains':
+        q = Q(**{f'{user}__username__icontains': search}) | Q(**{f'{book}__title__icontains': search})
+        for field in contains:
+            q |= Q(**{f'{field}__icontains': search})
+        return q
+    return (
+        Q(**{f'{user}__in': User.objects.filter(username__istartswith=search).values('pk')}) |
+        Q(**{f'{book}__in': Book.objects.filter(title__istartswith=search).values('pk')})
+    )
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Book
+from .search import index_book
+from .detail_cache import invalidate_book_detail
+from .images import schedule_cover_processing
+
+
+@receiver(post_save, sender=Book)
+def reindex_book_on_save(sender, instance, raw=False, **kwargs):
+    """Keep the search index in sync on create / update / hide."""
+    if raw:
+        return
+    index_book(instance)
+
+
+@receiver(post_save, sender=Book)
+def invalidate_detail_on_save(sender, instance, raw=False, **kwargs):
+    """Edits and hiding go through Book.save(); borrow stock moves invalidate in borrowing.services."""
+    if raw:
+        return
+    invalidate_book_detail(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def process_cover_on_save(sender, instance, raw=False, **kwargs):
+    """Generate thumbnails off the request path when the cover changes."""
+    if raw:
+        return
+    source = (instance.cover_variants or {}).get('source')
+    current = instance.cover_image.name if instance.cover_image else None
+    if source != current:
+        schedule_cover_processing(instance.pk)
@@ -1,8 +1,31 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+from io import StringIO
+from unittest import mock
+
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.utils import timezone
 
+from borrowing.models import BorrowRequest
+from reviews.models import Review
+from .images import process_book_cover
 from .models import Category, Book
+from .pagination import _encode
+from .popularity import recompute_popularity
+from .search import fold
 
 
 class LibraryCrudAndPermissionsTests(TestCase):
@@ -64,3 +87,441 @@ class LibraryCrudAndPermissionsTests(TestCase):
 
         resp = self.client.get(reverse('library:category_list'))
         self.assertEqual(resp.status_code, 302)
+
+
+class BookSearchIndexTests(TestCase):
+    """Search goes through the token index (diacritic folding + ranking)."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Văn học')
+        self.de_men = Book.objects.create(
+            title='Dế Mèn Phiêu Lưu Ký', author='Tô Hoài', publisher='NXB',
+            publish_year=2020, isbn='9786041234567', category=self.cat,
+        )
+        self.other = Book.objects.create(
+            title='Truyện ngắn', author='Nguyễn Văn A', publisher='NXB',
+            publish_year=2020, category=self.cat,
+            description='Có nhắc tới Dế Mèn',
+        )
+
+    def test_fold_strips_vietnamese_diacritics(self):
+        self.assertEqual(fold('Dế Mèn Đường'), 'de men duong')
+
+    def test_title_match_ranks_above_description_match(self):
+        resp = self.client.get(reverse('library:book_list') + '?search=de%20men')
+        books = list(resp.context['books'])
+        self.assertEqual(books, [self.de_men, self.other])
+        self.assertEqual(resp.context['current_sort'], 'relevance')
+
+    def test_prefix_and_isbn_search(self):
+        resp = self.client.get(reverse('library:book_list') + '?search=phieu%20lu')
+        self.assertEqual(list(resp.context['books']), [self.de_men])
+        resp = self.client.get(reverse('library:book_list') + '?search=978604')
+        self.assertEqual(list(resp.context['books']), [self.de_men])
+
+    def test_hyphenated_isbn_search(self):
+        for query in ['978-604-1', '978-604-123456-7']:
+            with self.subTest(query=query):
+                resp = self.client.get(reverse('library:book_list'), {'search': query})
+                self.assertEqual(list(resp.context['books']), [self.de_men])
+
+    def test_index_follows_update_and_hide(self):
+        self.de_men.title = 'Tuổi thơ dữ dội'
+        self.de_men.save()
+        resp = self.client.get(reverse('library:book_list') + '?search=tuoi%20tho')
+        self.assertEqual(list(resp.context['books']), [self.de_men])
+
+        self.de_men.is_active = False
+        self.de_men.save()
+        self.assertFalse(self.de_men.search_tokens.exists())
+
+    def test_export_uses_same_search(self):
+        resp = self.client.get(reverse('library:book_export') + '?search=tuoi')
+        self.assertNotContains(resp, 'Dế Mèn')
+        resp = self.client.get(reverse('library:book_export') + '?search=to%20hoai')
+        self.assertContains(resp, 'Dế Mèn')
+
+
+class BookExportStreamingTests(TestCase):
+    """Export streams values_list rows; memory does not grow with catalog size."""
+
+    def setUp(self):
+        self.cat = Category.objects.create(name='Văn học')
+        Book.objects.create(
+            title='Dế Mèn Phiêu Lưu Ký', author='Tô Hoài', publisher='NXB',
+            publish_year=2020, isbn='9786041234567', category=self.cat,
+        )
+
+    def _bulk_books(self, n, start=0):
+        Book.objects.bulk_create([
+            Book(title=f'Sách số {i}', author='Tác giả', publisher='NXB',
+                 publish_year=2000, isbn=f'{1_000_000 + i}', category=self.cat)
+            for i in range(start, start + n)
+        ])
+
+    def _peak_export_memory(self):
+        tracemalloc.start()
+        resp = self.client.get(reverse('library:book_export'))
+        for _ in resp.streaming_content:
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    def test_formats(self):
+        resp = self.client.get(reverse('library:book_export'))
+        self.assertTrue(resp.streaming)
+        body = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertTrue(body.startswith('\ufeffTitle,Author'))
+        self.assertIn('Dế Mèn Phiêu Lưu Ký,Tô Hoài,Văn học', body)
+
+        resp = self.client.get(reverse('library:book_export') + '?format=ndjson')
+        rows = [json.loads(line) for line in b''.join(resp.streaming_content).splitlines()]
+        self.assertEqual(rows[0]['title'], 'Dế Mèn Phiêu Lưu Ký')
+        self.assertEqual(rows[0]['category'], 'Văn học')
+
+        resp = self.client.get(reverse('library:book_export') + '?format=csv.gz')
+        self.assertEqual(resp['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)).decode('utf-8'), body)
+
+    def test_peak_memory_stays_flat(self):
+        with mock.patch('library.export.CHUNK_SIZE', 100):
+            self._bulk_books(500)
+            small = self._peak_export_memory()
+            self._bulk_books(5000, start=500)
+            large = self._peak_export_memory()
+        # 10x more rows must not mean (anywhere near) 10x more memory
+        self.assertLess(large, small * 2)
+
+    def test_rows_are_read_in_keyset_chunks(self):
+        self._bulk_books(249)
+        Book.objects.filter(title__endswith='7').update(title='Trùng tên')  # ties broken by id
+        for sort, order in [('title', ['title', 'id']), ('-created_at', ['-created_at', '-id'])]:
+            with self.subTest(sort=sort), mock.patch('library.export.CHUNK_SIZE', 100):
+                with CaptureQueriesContext(connection) as queries:
+                    resp = self.client.get(reverse('library:book_export'), {'sort': sort, 'format': 'ndjson'})
+                    isbns = [json.loads(line)['isbn'] for line in b''.join(resp.streaming_content).splitlines()]
+                self.assertEqual(isbns, list(Book.objects.order_by(*order).values_list('isbn', flat=True)))
+                chunks = [q for q in queries.captured_queries if 'LIMIT 100' in q['sql']]
+                self.assertEqual(len(chunks), 3)  # 250 rows: 100 + 100 + 50
+
+
+class BookListCursorPaginationTests(TestCase):
+    """Keyset pagination walks every sort forwards and backwards without gaps."""
+
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name='Văn học')
+        for i in range(30):
+            # Duplicate titles exercise the id tie-breaker
+            Book.objects.create(
+                title=f'Sách {i % 7}', author='Tác giả', publisher='NXB',
+                publish_year=2000, category=self.cat,
+            )
+
+    def _walk(self, sort):
+        url = reverse('library:book_list')
+        resp = self.client.get(url, {'sort': sort})
+        pages = [list(resp.context['books'])]
+        while resp.context['books'].has_next:
+            resp = self.client.get(url, {'sort': sort, 'cursor': resp.context['books'].next_cursor})
+            pages.append(list(resp.context['books']))
+        # and back again
+        back = [pages[-1]]
+        while resp.context['books'].has_previous:
+            resp = self.client.get(url, {'sort': sort, 'cursor': resp.context['books'].previous_cursor})
+            back.append(list(resp.context['books']))
+        return pages, back[::-1]
+
+    def test_walk_each_sort(self):
+        for sort in ['-created_at', 'created_at', 'title', 'popular', 'top_rated']:
+            with self.subTest(sort=sort):
+                pages, back = self._walk(sort)
+                self.assertEqual([len(p) for p in pages], [12, 12, 6])
+                self.assertEqual(pages, back)
+                ids = [b.pk for page in pages for b in page]
+                self.assertEqual(len(set(ids)), 30)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        resp = self.client.get(reverse('library:book_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.context['books'].has_previous)
+
+    def test_foreign_or_forged_cursor_falls_back_to_first_page(self):
+        url = reverse('library:book_list')
+        title_cursor = self.client.get(url, {'sort': 'title'}).context['books'].next_cursor
+        forged = [
+            title_cursor,  # cut for another sort
+            _encode('-created_at,-id', 'n', [None, 5]),
+            _encode('-created_at,-id', 'n', ['not-a-date', 5]),
+            _encode('-created_at,-id', 'n', ['2024-01-01T00:00:00', 'x']),
+            _encode('-created_at,-id', 'n', [{'a': 1}, 5]),
+        ]
+        for cursor in forged:
+            with self.subTest(cursor=cursor):
+                resp = self.client.get(url, {'sort': '-created_at', 'cursor': cursor})
+                self.assertEqual(resp.status_code, 200)
+                self.assertFalse(resp.context['books'].has_previous)
+                self.assertEqual(len(resp.context['books']), 12)
+
+    def test_page_does_not_run_count_when_cached(self):
+        url = reverse('library:book_list')
+        self.client.get(url)
+        with self.assertNumQueries(2):  # books page + categories
+            resp = self.client.get(url)
+        self.assertEqual(resp.context['books'].approx_count, 30)
+
+
+class PopularityCounterTests(TestCase):
+    """borrow_count stays consistent with borrow history."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.cat = Category.objects.create(name='Văn học')
+        self.quiet = Book.objects.create(
+            title='Ít người mượn', author='A', publisher='NXB', publish_year=2020,
+            category=self.cat, total_copies=3, available_copies=3,
+        )
+        self.hot = Book.objects.create(
+            title='Nhiều người mượn', author='B', publisher='NXB', publish_year=2020,
+            category=self.cat, total_copies=3, available_copies=3,
+        )
+
+    def _approve(self, book):
+        br = BorrowRequest.objects.create(
+            user=self.user, book=book, expected_return_date=timezone.localdate(),
+        )
+        self.client.force_login(self.admin)
+        self.client.post(reverse('borrowing:approve_request', args=[br.pk]))
+        return br
+
+    def test_approval_updates_counters_and_popular_sort(self):
+        self._approve(self.hot)
+        self._approve(self.hot)
+        self._approve(self.quiet)
+
+        self.hot.refresh_from_db()
+        self.cat.refresh_from_db()
+        self.assertEqual(self.hot.borrow_count, 2)
+        self.assertEqual(self.cat.borrow_count, 3)
+
+        resp = self.client.get(reverse('library:book_list'), {'sort': 'popular'})
+        self.assertEqual(list(resp.context['books']), [self.hot, self.quiet])
+
+    def test_counters_match_history(self):
+        self._approve(self.hot)
+        self._approve(self.quiet)
+        # Consistency check: nothing to repair after normal operation
+        self.assertEqual(recompute_popularity(), (0, 0))
+
+    def test_recompute_command_repairs_drift(self):
+        self._approve(self.hot)
+        Book.objects.filter(pk=self.hot.pk).update(borrow_count=42)
+        Category.objects.filter(pk=self.cat.pk).update(borrow_count=0)
+
+        call_command('recompute_popularity', stdout=StringIO())
+
+        self.hot.refresh_from_db()
+        self.cat.refresh_from_db()
+        self.assertEqual(self.hot.borrow_count, 1)
+        self.assertEqual(self.cat.borrow_count, 1)
+
+
+class BookDetailCacheTests(TestCase):
+    """Anonymous detail data is cached and invalidated on the relevant writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.cat = Category.objects.create(name='Văn học')
+        self.book = Book.objects.create(
+            title='Dế Mèn Phiêu Lưu Ký', author='Tô Hoài', publisher='NXB',
+            publish_year=2020, category=self.cat, total_copies=2, available_copies=2,
+        )
+        self.url = reverse('library:book_detail', args=[self.book.pk])
+
+    def _review(self, user, status):
+        return Review.objects.create(user=user, book=self.book, rating=5, content=f'review {status}', status=status)
+
+    def test_anonymous_hit_runs_no_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertContains(resp, 'Dế Mèn')
+
+    def test_logged_in_user_sees_own_pending_review_with_one_extra_query(self):
+        self._review(self.admin, 'APPROVED')
+        self._review(self.user, 'PENDING')
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):  # session + user + own review
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.context['reviews_count'], 2)
+        self.assertContains(resp, 'review PENDING')
+
+    def test_invalidated_on_edit_hide_stock_and_review_approval(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.available_copies = 1
+            self.book.save()
+        self.assertContains(self.client.get(self.url), 'Còn 1/2 bản')
+
+        review = self._review(self.user, 'PENDING')
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reviews:approve_review', args=[review.pk]))
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).context['reviews_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.is_active = False
+            self.book.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CoverVariantTests(TestCase):
+    """Thumbnails are generated off-request, metadata-free and never upscaled."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.cat = Category.objects.create(name='Văn học')
+
+    def _upload(self, width=500, height=750):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_generated_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            book = Book.objects.create(
+                title='Có ảnh bìa', author='A', publisher='NXB', publish_year=2020,
+                category=self.cat, cover_image=self._upload(),
+            )
+        self.assertTrue(callbacks)  # scheduled, not run inline
+        self.assertEqual(book.cover_srcset, {})
+
+        process_book_cover(book.pk)
+        book.refresh_from_db()
+        # 640 would upscale a 500px original
+        self.assertEqual(sorted(book.cover_variants['webp']), ['160', '320'])
+        self.assertIn(' 320w', book.cover_srcset['jpeg'])
+
+        storage = book.cover_image.storage
+        with storage.open(book.cover_variants['jpeg']['320']) as f:
+            image = Image.open(f)
+            self.assertEqual(image.size, (320, 480))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_replacing_cover_removes_old_variants(self):
+        book = Book.objects.create(
+            title='Có ảnh bìa', author='A', publisher='NXB', publish_year=2020,
+            category=self.cat, cover_image=self._upload(),
+        )
+        process_book_cover(book.pk)
+        book.refresh_from_db()
+        old_name = book.cover_variants['webp']['160']
+
+        book.cover_image = self._upload(width=800, height=1200)
+        book.save()
+        process_book_cover(book.pk)
+        book.refresh_from_db()
+
+        self.assertFalse(book.cover_image.storage.exists(old_name))
+        self.assertEqual(sorted(book.cover_variants['webp'], key=int), ['160', '320', '640'])
+
+
+class ImportBooksCommandTests(TestCase):
+    """manage.py import_books upserts by ISBN and sets bad rows aside."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.cat = Category.objects.create(name='Văn học')
+        self.existing = Book.objects.create(
+            title='Tên cũ', author='A', publisher='NXB', publish_year=2000,
+            isbn='9786041234567', category=self.cat, total_copies=1, available_copies=1,
+        )
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _import(self, path, *args):
+        out = StringIO()
+        call_command('import_books', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_upsert_and_rejects(self):
+        path = self._write('books.csv', (
+            'Title,Author,Category,Publisher,Publish Year,ISBN,Total Copies,Available Copies\n'
+            'Dế Mèn Phiêu Lưu Ký,Tô Hoài,Văn học,NXB Kim Đồng,2019,978-604-1234567,5,5\n'
+            'Số Đỏ,Vũ Trọng Phụng,văn học,NXB,2015,9786049999999,2,2\n'
+            'Sai số bản,X,Văn học,NXB,2015,9786040000001,1,3\n'
+            'Sai năm,X,Văn học,NXB,1800,9786040000002,1,1\n'
+            'Sai danh mục,X,Không có,NXB,2015,9786040000003,1,1\n'
+        ))
+        output = self._import(path, '--batch-size', '2')
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, 'Dế Mèn Phiêu Lưu Ký')
+        self.assertEqual(self.existing.total_copies, 5)
+        self.assertTrue(Book.objects.filter(isbn='9786049999999', category=self.cat).exists())
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertIn('dòng/s', output)
+
+        with open(path + '.rejects.ndjson', encoding='utf-8') as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual([r['line'] for r in rejects], [4, 5, 6])
+        self.assertIn('khả dụng', rejects[0]['error'])
+
+        # Imported rows are searchable straight away
+        resp = self.client.get(reverse('library:book_list'), {'search': 'so do'})
+        self.assertEqual([b.isbn for b in resp.context['books']], ['9786049999999'])
+
+    def test_reimport_keeps_loans_and_visibility(self):
+        # One copy out on loan, the book hidden by a librarian
+        Book.objects.filter(pk=self.existing.pk).update(total_copies=3, available_copies=2, is_active=False)
+        path = self._write('books.csv', (
+            'Title,Author,Category,Publisher,Publish Year,ISBN,Total Copies,Available Copies\n'
+            'Tên mới,A,Văn học,NXB,2000,9786041234567,5,5\n'
+        ))
+        self._import(path)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.total_copies, self.existing.available_copies), (5, 4))
+        self.assertFalse(self.existing.is_active)
+
+        path = self._write('shrink.csv', (
+            'Title,Author,Category,Publisher,Publish Year,ISBN,Total Copies\n'
+            'Tên mới,A,Văn học,NXB,2000,9786041234567,0\n'
+        ))
+        self._import(path)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.total_copies, self.existing.available_copies), (5, 4))
+        with open(path + '.rejects.ndjson', encoding='utf-8') as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual([r['line'] for r in rejects], [2])
+        self.assertIn('đang cho mượn', rejects[0]['error'])
+
+    def test_ndjson_with_new_categories(self):
+        path = self._write('books.ndjson', (
+            '{"title": "Clean Code", "author": "Robert C. Martin", "category": "Công nghệ", '
+            '"publisher": "Prentice Hall", "publish_year": 2008, "isbn": "9780132350884", "total_copies": 3}\n'
+            'not json\n'
+        ))
+        self._import(path, '--create-categories')
+        book = Book.objects.get(isbn='9780132350884')
+        self.assertEqual(book.category.name, 'Công nghệ')
+        self.assertEqual(book.available_copies, 3)
@@ -1,11 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import Http404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Q, Count
-from django.core.paginator import Paginator
 from .models import Book, Category
 from .forms import BookForm, CategoryForm
+from .search import search_books
+from .export import streaming_export_response
+from .pagination import KeysetPaginator, approximate_count
+from .detail_cache import TOP_REVIEWS, get_book_detail
+from borrowing.events import live_events_enabled
+from borrowing.models import BookHold
+from borrowing.services import queue_position
+from reviews.models import Review
+from reviews.feed import feed_paginator
+from reviews.search import search_reviews
 
 
 def is_admin(user):
@@ -13,14 +22,10 @@ def is_admin(user):
 
 
 def _apply_book_filters(request, qs):
-    # Search
+    # Search (inverted index, diacritic-insensitive)
     search = request.GET.get('search', '')
     if search:
-        qs = qs.filter(
-            Q(title__icontains=search) |
-            Q(author__icontains=search) |
-            Q(isbn__icontains=search)
-        )
+        qs = search_books(qs, search)
 
     # Filter by category
     category_id = request.GET.get('category')
@@ -29,17 +34,22 @@ def _apply_book_filters(request, qs):
     elif category_id:
         category_id = ''
 
-    # Sort
-    sort = request.GET.get('sort', '-created_at')
-    if sort == 'title':
-        qs = qs.order_by('title')
+    # Sort (always ends with id so keyset pagination has a total order)
+    sort = request.GET.get('sort', 'relevance' if search else '-created_at')
+    if sort == 'relevance' and search:
+        qs = qs.order_by('-search_rank', '-created_at', '-id')
+    elif sort == 'title':
+        qs = qs.order_by('title', 'id')
     elif sort == 'popular':
-        qs = qs.annotate(borrow_count=Count('borrow_requests')).order_by('-borrow_count')
+        qs = qs.order_by('-borrow_count', '-id')
+    elif sort == 'top_rated':
+        # Stored aggregates (library.ratings), walked backwards on idx_books_rating
+        qs = qs.order_by('-rating_avg', '-rating_count', '-id')
     else:
         allowed_sorts = ['-created_at', 'created_at']
         if sort not in allowed_sorts:
             sort = '-created_at'
-        qs = qs.order_by(sort)
+        qs = qs.order_by(sort, sort.replace('created_at', 'id'))
 
     return qs, search, category_id, sort
 
@@ -49,10 +59,10 @@ def book_list_view(request):
 
     books, search, category_id, sort = _apply_book_filters(request, books)
 
-    # Pagination
-    paginator = Paginator(books, 12)
-    page = request.GET.get('page')
-    books = paginator.get_page(page)
+    # Keyset pagination + cached approximate total for the header
+    page = KeysetPaginator(books, 12).get_page(request.GET.get('cursor'))
+    page.approx_count = approximate_count(books, ['book_list', search, category_id])
+    books = page
 
     categories = Category.objects.filter(is_active=True)
 
@@ -67,60 +77,61 @@ def book_list_view(request):
 
 
 def book_export_csv_view(request):
-    books = Book.objects.filter(is_active=True).select_related('category')
+    books = Book.objects.filter(is_active=True)
     books, search, category_id, sort = _apply_book_filters(request, books)
-
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="books_export.csv"'
-
-    import csv
-    response.write('\ufeff')
-    writer = csv.writer(response)
-    writer.writerow([
-        'Title',
-        'Author',
-        'Category',
-        'Publisher',
-        'Publish Year',
-        'ISBN',
-        'Total Copies',
-        'Available Copies',
-        'Active',
-    ])
-    for book in books:
-        writer.writerow([
-            book.title,
-            book.author,
-            book.category.name if book.category else '',
-            book.publisher,
-            book.publish_year,
-            book.isbn or '',
-            book.total_copies,
-            book.available_copies,
-            'Yes' if book.is_active else 'No',
-        ])
-
-    return response
+    return streaming_export_response(books, request.GET.get('format', 'csv'))
 
 
 def book_detail_view(request, pk):
-    book = get_object_or_404(Book, pk=pk, is_active=True)
-    
-    # Lọc review: Hiện tất cả review đã duyệt và hiện cả review của user hiện tại (kể cả đang chờ duyệt) để họ biết đã gửi thành công.
-    if request.user.is_authenticated:
-        reviews_qs = book.reviews.filter(
-            Q(status='APPROVED') | Q(user=request.user)
-        ).select_related('user')
-    else:
-        reviews_qs = book.reviews.filter(status='APPROVED').select_related('user')
+    # Phần dành cho khách (sách, số review đã duyệt, review mới nhất) lấy từ cache
+    data = get_book_detail(pk)
+    if data is None:
+        raise Http404('Không tìm thấy sách')
+    book = data['book']
+    reviews = data['reviews']
+    reviews_count = data['reviews_count']
+
+    # Tìm trong các review đã duyệt của sách (chỉ mục reviews.search, mới nhất trước)
+    review_query = request.GET.get('rq', '').strip()
+    review_page = None
+    if review_query:
+        found = search_reviews(
+            Review.objects.filter(book_id=pk, status='APPROVED').select_related('user'),
+            review_query, status=['APPROVED'], book_id=pk,
+        )
+        review_page = KeysetPaginator(found, TOP_REVIEWS).get_page(request.GET.get('rcursor'))
+        reviews = review_page.object_list
 
-    reviews_count = reviews_qs.count()
-    reviews = reviews_qs.order_by('-created_at')[:10]
+    # User hiện tại vẫn thấy review của mình kể cả đang chờ duyệt để biết đã gửi thành công.
+    hold = None
+    if request.user.is_authenticated:
+        if not book.is_available:
+            hold = BookHold.objects.filter(book_id=pk, user=request.user, status='WAITING').first()
+            if hold:
+                hold.position = queue_position(hold)
+
+        own_review = None if review_query else book.reviews.filter(user=request.user).exclude(
+            status='APPROVED'
+        ).select_related('user').first()
+        if own_review:
+            reviews = sorted(reviews + [own_review], key=lambda r: r.created_at, reverse=True)[:TOP_REVIEWS]
+            reviews_count += 1
+
+    # Older reviews are lazy-loaded from reviews:book_feed, after the last approved one shown
+    feed_cursor = None
+    shown = [review for review in reviews if review.status == 'APPROVED']
+    if not review_query and shown and data['reviews_count'] > len(shown):
+        feed_cursor = feed_paginator(pk).cursor_after(shown[-1])
 
     context = {
         'book': book,
         'reviews': reviews,
         'reviews_count': reviews_count,
+        'hold': hold,
+        'review_query': review_query,
+        'review_page': review_page,
+        'feed_cursor': feed_cursor,
+        'live_events': live_events_enabled(request),
     }
     return render(request, 'library/book_detail.html', context)
 
@@ -0,0 +1,13 @@
+"""
+ASGI entry point. Needed for the live updates stream (``borrowing:live_events``),
+which keeps one cheap coroutine per open connection instead of a worker thread:
+
+    uvicorn library_system.asgi:application
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_system.settings')
+
+application = get_asgi_application()
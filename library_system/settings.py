@@ -35,7 +35,8 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware + one-query, cached User/StudentProfile load
+    'accounts.auth_cache.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +73,39 @@ DATABASES = {
     }
 }
 
+# Cache (dùng chung giữa các worker khi cấu hình Redis/Memcached qua .env)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'bookclub'),
+    }
+}
+# Sessions and the request user are only cached by default when the cache is shared:
+# a per-process LocMemCache would keep serving a logged-out session on other workers.
+_SHARED_CACHE = 'locmem' not in CACHES['default']['BACKEND'].lower()
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if _SHARED_CACHE else 'django.contrib.sessions.backends.db',
+)
+# Seconds the logged-in User + StudentProfile stay cached (accounts.auth_cache); 0 = no cache
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '300' if _SHARED_CACHE else '0'))
+
+# Login throttling (accounts.throttle): failed logins per window, lockout doubling up to the max.
+# Own cache alias so a flood of per-username counters can't cull the per-IP ones (LocMemCache
+# keeps only 300 entries by default); keys expire after two windows.
+CACHES['login_throttle'] = {
+    'BACKEND': CACHES['default']['BACKEND'],
+    'LOCATION': os.getenv('LOGIN_THROTTLE_CACHE_LOCATION', CACHES['default']['LOCATION']),
+    **({} if _SHARED_CACHE else {'OPTIONS': {'MAX_ENTRIES': 100_000}}),
+}
+LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', '300'))
+LOGIN_THROTTLE_USER_LIMIT = int(os.getenv('LOGIN_THROTTLE_USER_LIMIT', '5'))
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', '20'))
+LOGIN_LOCKOUT_SECONDS = int(os.getenv('LOGIN_LOCKOUT_SECONDS', '30'))
+LOGIN_LOCKOUT_MAX_SECONDS = int(os.getenv('LOGIN_LOCKOUT_MAX_SECONDS', '900'))
+# Only when behind our own reverse proxy, e.g. HTTP_X_FORWARDED_FOR
+LOGIN_THROTTLE_IP_HEADER = os.getenv('LOGIN_THROTTLE_IP_HEADER', '')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -112,6 +146,29 @@ EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False') == 'True'
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@bookclub.local')
 
+# Auto-approval of borrow requests (borrowing.rules)
+AUTO_APPROVE_ENABLED = os.getenv('AUTO_APPROVE_ENABLED', 'False') == 'True'
+AUTO_APPROVE_MAX_ACTIVE_LOANS = int(os.getenv('AUTO_APPROVE_MAX_ACTIVE_LOANS', '3'))
+AUTO_APPROVE_MAX_LOAN_DAYS = int(os.getenv('AUTO_APPROVE_MAX_LOAN_DAYS', '14'))
+# Loan length when a returned copy is handed to the next person on the hold queue
+HOLD_LOAN_DAYS = int(os.getenv('HOLD_LOAN_DAYS', '14'))
+# Requests a member may have waiting for approval at once (checked on BorrowerStats)
+BORROW_MAX_PENDING_REQUESTS = int(os.getenv('BORROW_MAX_PENDING_REQUESTS', '5'))
+
+# Review moderation queue (reviews.moderation): batch size and how long a claim is held
+REVIEW_CLAIM_BATCH_SIZE = int(os.getenv('REVIEW_CLAIM_BATCH_SIZE', '20'))
+REVIEW_CLAIM_LEASE_MINUTES = int(os.getenv('REVIEW_CLAIM_LEASE_MINUTES', '15'))
+# Pre-moderation scoring (reviews.scoring): reviews scoring at or below the limit skip the queue.
+# REVIEW_BLOCKLIST_FILE: one term per line, replaces the built-in list.
+REVIEW_AUTO_APPROVE_ENABLED = os.getenv('REVIEW_AUTO_APPROVE_ENABLED', 'False') == 'True'
+REVIEW_AUTO_APPROVE_MAX_SCORE = int(os.getenv('REVIEW_AUTO_APPROVE_MAX_SCORE', '0'))
+REVIEW_BLOCKLIST_FILE = os.getenv('REVIEW_BLOCKLIST_FILE', '')
+
+# Live updates (borrowing.events). Needs an ASGI server; use borrowing.events.RedisBroker when running several nodes.
+LIVE_EVENTS_ENABLED = os.getenv('LIVE_EVENTS_ENABLED', 'False') == 'True'
+LIVE_EVENTS_BACKEND = os.getenv('LIVE_EVENTS_BACKEND', 'borrowing.events.InProcessBroker')
+LIVE_EVENTS_REDIS_URL = os.getenv('LIVE_EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+
 # File Upload
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440
@@ -0,0 +1,49 @@
+"""JSON feed of a book's approved reviews, newest first.
+
+Pages are cut by a ``(created_at, id)`` keyset cursor on
+``idx_reviews_book_feed``. That way, page N costs the same as page 1. The ETag
+comes from the book's denormalized rating counters (``library.ratings``),
+so a repeated request is answered 304 after a single primary-key lookup.
+It never touches ``reviews``.
+"""
+import hashlib
+
+from library.models import Book
+from library.pagination import KeysetPaginator
+from .models import Review
+
+FEED_PAGE_SIZE = 10
+
+
+def feed_queryset(book_id, rating=None):
+    qs = Review.objects.filter(book_id=book_id, status='APPROVED')
+    if rating:
+        qs = qs.filter(rating=rating)
+    return qs.select_related('user').order_by('-created_at', '-id')
+
+
+def feed_paginator(book_id, rating=None):
+    return KeysetPaginator(feed_queryset(book_id, rating), FEED_PAGE_SIZE)
+
+
+def parse_rating(value):
+    return int(value) if value in ('1', '2', '3', '4', '5') else None
+
+
+def feed_etag(request, book_id):
+    """Changes whenever a review of the book is approved. None for hidden/missing books."""
+    counters = Book.objects.filter(pk=book_id, is_active=True).values_list('rating_count', 'rating_sum').first()
+    if counters is None:
+        return None
+    key = f"{book_id}:{counters[0]}:{counters[1]}:{request.GET.get('rating', '')}:{request.GET.get('cursor', '')}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def serialize(review):
+    return {
+        'id': review.pk,
+        'user': review.user.username,
+        'rating': review.rating,
+        'content': review.content,
+        'created_at': review.created_at.isoformat(),
+    }
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.scoring import rescore_pending
+
+
+class Command(BaseCommand):
+    help = 'Chấm điểm lại các đánh giá đang chờ duyệt (tuỳ chọn: tự duyệt các đánh giá sạch)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--approve', action='store_true', help='Tự duyệt các đánh giá đạt ngưỡng')
+        parser.add_argument('--all', action='store_true', help='Chấm cả đánh giá đã duyệt / bị từ chối')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored, approved = rescore_pending(
+            batch_size=options['batch_size'], approve=options['approve'], everything=options['all'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã chấm {scored} đánh giá, tự duyệt {approved} ({scored / elapsed if elapsed else 0:.0f} đánh giá/giây)'
+        ))
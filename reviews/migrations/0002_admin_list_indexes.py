@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0009_admin_list_indexes'),
+        ('library', '0005_book_cover_variants'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='idx_reviews_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', 'rating', 'id'], name='idx_reviews_status_rating'),
+        ),
+    ]
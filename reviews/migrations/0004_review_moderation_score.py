@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_moderation_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderation_flags',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='moderation_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
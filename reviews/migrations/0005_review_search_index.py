@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from library.search import tokenize
+    from reviews.search import MAX_REVIEW_TOKENS
+
+    Review = apps.get_model('reviews', 'Review')
+    ReviewSearchToken = apps.get_model('reviews', 'ReviewSearchToken')
+    batch = []
+    for review in Review.objects.only('book_id', 'status', 'content').iterator(chunk_size=1000):
+        batch.extend(
+            ReviewSearchToken(review_id=review.pk, book_id=review.book_id, status=review.status, token=token, position=i)
+            for i, token in enumerate(tokenize(review.content)[:MAX_REVIEW_TOKENS])
+        )
+        if len(batch) >= 1000:
+            ReviewSearchToken.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ReviewSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_rating_aggregates'),
+        ('reviews', '0004_review_moderation_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=10)),
+                ('token', models.CharField(max_length=64)),
+                ('position', models.PositiveIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='reviews.review')),
+            ],
+            options={
+                'db_table': 'review_search_tokens',
+                'indexes': [models.Index(fields=['status', 'token', 'review'], name='idx_rsearch_status_token'), models.Index(fields=['book', 'status', 'token'], name='idx_rsearch_book_token')],
+                'unique_together': {('review', 'position')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
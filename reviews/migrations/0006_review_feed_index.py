@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0010_borrower_summary'),
+        ('library', '0006_book_rating_aggregates'),
+        ('reviews', '0005_review_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['book', 'status', 'created_at', 'id'], name='idx_reviews_book_feed'),
+        ),
+    ]
@@ -33,12 +33,56 @@ class Review(models.Model):
         related_name='moderated_reviews'
     )
     moderated_at = models.DateTimeField(null=True, blank=True)
+    # Lease on a PENDING review taken from the moderation queue (reviews.moderation)
+    claimed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='claimed_reviews'
+    )
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    # Pre-moderation risk score 0-100 and its reasons (reviews.scoring)
+    moderation_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    moderation_flags = models.CharField(max_length=100, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'reviews'
         ordering = ['-created_at']
         unique_together = [['user', 'book']]
+        indexes = [
+            # Keyset sorts of admin_pending_reviews_view
+            models.Index(fields=['status', 'created_at', 'id'], name='idx_reviews_status_created'),
+            models.Index(fields=['status', 'rating', 'id'], name='idx_reviews_status_rating'),
+            # Moderator throughput on the dashboard
+            models.Index(fields=['moderated_at'], name='idx_reviews_moderated'),
+            # Book detail review feed (reviews.feed)
+            models.Index(fields=['book', 'status', 'created_at', 'id'], name='idx_reviews_book_feed'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title} ({self.rating}★)"
+
+class ReviewSearchToken(models.Model):
+    """Positional inverted index over ``Review.content`` (see ``reviews.search``).
+
+    ``status`` and ``book`` are copied from the review so a scoped lookup
+    (pending queue, one book's approved reviews) stays on one index range.
+    """
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='search_tokens')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=10)
+    token = models.CharField(max_length=64)
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = 'review_search_tokens'
+        unique_together = [['review', 'position']]
+        indexes = [
+            models.Index(fields=['status', 'token', 'review'], name='idx_rsearch_status_token'),
+            models.Index(fields=['book', 'status', 'token'], name='idx_rsearch_book_token'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.book.title} ({self.rating}★)"
\ No newline at end of file
+        return f"{self.token}@{self.position} -> {self.review_id}"
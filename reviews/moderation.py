@@ -0,0 +1,109 @@
+"""Review moderation work queue.
+
+A moderator claims a batch of the oldest PENDING reviews with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so two moderators claiming at the
+same moment get disjoint batches instead of waiting on (or colliding
+over) the same rows. A claim is a lease (``claimed_until``); reviews whose
+lease ran out go back to the pool. The whole batch is then approved or
+rejected with one UPDATE, and the rating aggregates of the approved ones
+are bumped in the same transaction.
+
+Settings: ``REVIEW_CLAIM_BATCH_SIZE``, ``REVIEW_CLAIM_LEASE_MINUTES``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from library.detail_cache import invalidate_book_detail
+from library.ratings import record_ratings
+from .models import Review
+from .search import sync_status
+
+THROUGHPUT_WINDOW_MINUTES = 60
+
+
+def available_to(moderator, now):
+    """Q for PENDING reviews ``moderator`` may act on: unclaimed, lease expired or their own."""
+    return Q(status='PENDING') & (
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now) | Q(claimed_by=moderator)
+    )
+
+
+def claimed_by(moderator, now=None):
+    """The moderator's live claims, oldest first."""
+    now = now or timezone.now()
+    return (
+        Review.objects.filter(status='PENDING', claimed_by=moderator, claimed_until__gte=now)
+        .select_related('user', 'book').order_by('created_at', 'id')
+    )
+
+
+def claim_batch(moderator, size=None):
+    """Top the moderator's claims up to ``size`` and renew their lease. Returns the number newly claimed."""
+    size = size or getattr(settings, 'REVIEW_CLAIM_BATCH_SIZE', 20)
+    now = timezone.now()
+    until = now + timedelta(minutes=getattr(settings, 'REVIEW_CLAIM_LEASE_MINUTES', 15))
+    with transaction.atomic():
+        held = Review.objects.filter(status='PENDING', claimed_by=moderator, claimed_until__gte=now)
+        held_count = held.update(claimed_until=until)
+        if held_count >= size:
+            return 0
+        unclaimed = Review.objects.filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now), status='PENDING')
+        free = list(
+            unclaimed.select_for_update(skip_locked=True)
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)[:size - held_count]
+        )
+        if not free:
+            return 0
+        # Re-checked in the UPDATE for backends without row locks (SQLite)
+        return unclaimed.filter(pk__in=free).update(claimed_by=moderator, claimed_until=until)
+
+
+def release_claims(moderator):
+    """Hand the moderator's unfinished claims back to the pool."""
+    return Review.objects.filter(status='PENDING', claimed_by=moderator).update(
+        claimed_by=None, claimed_until=None,
+    )
+
+
+def moderate_batch(moderator, review_ids, status):
+    """APPROVE / REJECT the given reviews claimed by ``moderator`` in one transaction.
+
+    Reviews that were re-claimed by someone else after the lease ran out, or
+    were already handled, are skipped. Returns the number moderated.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = Review.objects.filter(pk__in=review_ids, status='PENDING', claimed_by=moderator)
+        rows = list(batch.select_for_update().values_list('id', 'book_id', 'rating'))
+        if not rows:
+            return 0
+        ids = [pk for pk, _, _ in rows]
+        Review.objects.filter(pk__in=ids).update(
+            status=status, moderated_by=moderator, moderated_at=now, claimed_by=None, claimed_until=None,
+        )
+        sync_status(ids, status)
+        if status == 'APPROVED':
+            record_ratings([(book_id, rating) for _, book_id, rating in rows])
+            for book_id in {book_id for _, book_id, _ in rows}:
+                invalidate_book_detail(book_id)
+    return len(rows)
+
+
+def moderator_throughput(now=None, window=THROUGHPUT_WINDOW_MINUTES):
+    """``[{'username', 'reviews', 'per_minute'}]`` over the last ``window`` minutes, busiest first."""
+    now = now or timezone.now()
+    rows = (
+        Review.objects.filter(moderated_at__gte=now - timedelta(minutes=window), moderated_by__isnull=False)
+        .values('moderated_by__username').annotate(reviews=Count('id'))
+        .order_by('-reviews', 'moderated_by__username')
+    )
+    return [
+        {'username': row['moderated_by__username'], 'reviews': row['reviews'],
+         'per_minute': round(row['reviews'] / window, 2)}
+        for row in rows
+    ]
@@ -0,0 +1,99 @@
+"""Search over review text.
+
+``Review.content`` is tokenized with the catalog's diacritic folding
+(``library.search.tokenize``) into ``ReviewSearchToken`` rows, one per word
+position. Bare query terms are prefix matches; ``"quoted phrases"`` must
+appear as consecutive words. Every lookup is an index range scan scoped by
+status (and book), replacing ``content__icontains`` over the joined tables.
+
+The index is written when a review is saved (``index_review``) and its
+``status`` copy is moved along by every moderation path (``sync_status``).
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from library.search import MAX_QUERY_TERMS, _prefix_q, tokenize
+from .models import Review, ReviewSearchToken
+
+MAX_REVIEW_TOKENS = 1000
+
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def _rows(review):
+    return [
+        ReviewSearchToken(review_id=review.pk, book_id=review.book_id, status=review.status, token=token, position=i)
+        for i, token in enumerate(tokenize(review.content)[:MAX_REVIEW_TOKENS])
+    ]
+
+
+def index_review(review):
+    """(Re)index one saved review."""
+    with transaction.atomic():
+        ReviewSearchToken.objects.filter(review_id=review.pk).delete()
+        ReviewSearchToken.objects.bulk_create(_rows(review))
+
+
+def sync_status(review_ids, status):
+    """Move the indexed status of moderated reviews along with them."""
+    ReviewSearchToken.objects.filter(review_id__in=review_ids).update(status=status)
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole review index. Returns number of reviews indexed."""
+    count = 0
+    with transaction.atomic():
+        ReviewSearchToken.objects.all().delete()
+        batch = []
+        for review in Review.objects.only('book_id', 'status', 'content').iterator(chunk_size=batch_size):
+            batch.extend(_rows(review))
+            count += 1
+            if len(batch) >= batch_size:
+                ReviewSearchToken.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            ReviewSearchToken.objects.bulk_create(batch)
+    return count
+
+
+def parse_query(query):
+    """Split ``query`` into ``(phrases, terms)``: token lists from quotes, bare prefix terms."""
+    phrases = [tokens for tokens in map(tokenize, _PHRASE_RE.findall(query)) if tokens]
+    terms = list(dict.fromkeys(tokenize(_PHRASE_RE.sub(' ', query))))
+    return phrases[:MAX_QUERY_TERMS], terms[:MAX_QUERY_TERMS]
+
+
+def review_search_q(query, status=None, book_id=None):
+    """Q on ``Review`` for reviews matching every term and phrase of ``query``,
+    or None when the query has no searchable words."""
+    phrases, terms = parse_query(query)
+    if not phrases and not terms:
+        return None
+    scope = Q()
+    if status:
+        scope &= Q(status__in=status)
+    if book_id:
+        scope &= Q(book_id=book_id)
+    tokens = ReviewSearchToken.objects.filter(scope)
+
+    q = Q()
+    for term in terms:
+        q &= Q(pk__in=tokens.filter(_prefix_q(term)).values('review_id'))
+    for phrase in phrases:
+        first = tokens.filter(token=phrase[0])
+        for offset, token in enumerate(phrase[1:], 1):
+            first = first.filter(Exists(ReviewSearchToken.objects.filter(
+                review=OuterRef('review'), position=OuterRef('position') + offset, token=token,
+            )))
+        q &= Q(pk__in=first.values('review_id'))
+    return q
+
+
+def search_reviews(qs, query, status=None, book_id=None):
+    """Filter ``qs`` to reviews matching ``query``, newest first."""
+    q = review_search_q(query, status, book_id)
+    if q is None:
+        return qs.none()
+    return qs.filter(q).order_by('-created_at', '-id')
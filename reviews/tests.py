@@ -1,11 +1,19 @@
-from django.test import TestCase
+from django.db import connection
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 from library.models import Category, Book
+from library.ratings import recompute_ratings
 from borrowing.models import BorrowRequest, BorrowTransaction
 from .models import Review
+from .moderation import claim_batch, claimed_by, moderate_batch, moderator_throughput
+from .scoring import Matcher, rescore_pending, score_text
+from .search import rebuild_index as rebuild_review_index, search_reviews
 
 
 class ReviewWorkflowTests(TestCase):
@@ -29,7 +37,7 @@ class ReviewWorkflowTests(TestCase):
         br = BorrowRequest.objects.create(
             user=self.user,
             book=self.book,
-            expected_return_date=timezone.now().date(),
+            expected_return_date=timezone.localdate(),
             status='APPROVED',
             handled_by=self.admin,
             handled_at=timezone.now(),
@@ -67,3 +75,302 @@ class ReviewWorkflowTests(TestCase):
 
         review.refresh_from_db()
         self.assertEqual(review.status, 'APPROVED')
+
+
+class AdminPendingReviewsPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(title='Dế Mèn', author='A', publisher='P', publish_year=2022, category=cat)
+        users = User.objects.bulk_create([User(username=f'reader{i}', email=f'r{i}@example.com') for i in range(30)])
+        Review.objects.bulk_create([
+            Review(user=user, book=self.book, rating=i % 5 + 1, content=f'Nhận xét số {i}')
+            for i, user in enumerate(users)
+        ])
+        rebuild_review_index()
+        self.client.force_login(self.admin)
+
+    def test_walk_every_sort_with_bounded_queries(self):
+        url = reverse('reviews:admin_pending')
+        for sort in ['-created_at', 'created_at', '-rating', 'rating']:
+            with self.subTest(sort=sort):
+                resp = self.client.get(url, {'sort': sort})
+                first = [r.pk for r in resp.context['reviews']]
+                with self.assertNumQueries(3):  # session + user + page
+                    resp = self.client.get(url, {'sort': sort, 'cursor': resp.context['reviews'].next_cursor})
+                second = [r.pk for r in resp.context['reviews']]
+                self.assertEqual((len(first), len(second)), (25, 5))
+                self.assertEqual(len(set(first) | set(second)), 30)
+                self.assertFalse(resp.context['reviews'].has_next)
+
+    def test_search_covers_title_email_and_indexed_content(self):
+        url = reverse('reviews:admin_pending')
+        self.assertEqual(len(self.client.get(url, {'search': 'dế'}).context['reviews']), 25)
+        resp = self.client.get(url, {'search': 'số 7'})
+        self.assertEqual([r.content for r in resp.context['reviews']], ['Nhận xét số 7'])
+        resp = self.client.get(url, {'search': 'r12@'})
+        self.assertEqual([r.content for r in resp.context['reviews']], ['Nhận xét số 12'])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'search': '"xét số 1"'})
+        self.assertFalse([q for q in queries.captured_queries if "LIKE '%" in q['sql'] or 'LIKE %' in q['sql']])
+
+
+class RatingAggregateTests(TestCase):
+    """Book rating aggregates follow moderation and back the "top rated" sort."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        cat = Category.objects.create(name='Test', description='')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author='A', publisher='P', publish_year=2022, category=cat)
+            for i in range(3)
+        ]
+        self.users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(4)])
+        self.client.force_login(self.admin)
+
+    def _approve(self, book, user, rating):
+        review = Review.objects.create(user=user, book=book, rating=rating, content='...')
+        self.client.post(reverse('reviews:approve_review', args=[review.pk]))
+        return review
+
+    def test_approve_updates_aggregates_once(self):
+        for user, rating in zip(self.users, [5, 4, 4]):
+            review = self._approve(self.books[0], user, rating)
+        self.client.post(reverse('reviews:approve_review', args=[review.pk]))  # double submit
+        rejected = Review.objects.create(user=self.users[3], book=self.books[0], rating=1, content='...')
+        self.client.post(reverse('reviews:reject_review', args=[rejected.pk]))
+
+        book = Book.objects.get(pk=self.books[0].pk)
+        self.assertEqual((book.rating_count, book.rating_sum, str(book.rating_avg)), (3, 13, '4.33'))
+        self.assertEqual([count for _, count, _ in book.rating_histogram], [1, 2, 0, 0, 0])
+
+    def test_recompute_repairs_drift(self):
+        self._approve(self.books[1], self.users[0], 3)
+        Book.objects.filter(pk=self.books[1].pk).update(rating_count=7, rating_3=0)
+        Book.objects.filter(pk=self.books[2].pk).update(rating_count=2, rating_sum=9, rating_avg=4.5)
+        self.assertEqual(recompute_ratings(), 2)
+        self.assertEqual(recompute_ratings(), 0)
+        fixed = Book.objects.get(pk=self.books[1].pk)
+        self.assertEqual((fixed.rating_count, fixed.rating_3, str(fixed.rating_avg)), (1, 1, '3.00'))
+
+    def test_top_rated_sort_needs_no_join(self):
+        self._approve(self.books[1], self.users[0], 5)
+        self._approve(self.books[2], self.users[0], 4)
+        self._approve(self.books[2], self.users[1], 5)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse('library:book_list'), {'sort': 'top_rated'})
+        self.assertEqual([b.pk for b in resp.context['books']], [b.pk for b in [self.books[1], self.books[2], self.books[0]]])
+        page_sql = [q['sql'] for q in queries.captured_queries if 'FROM "books"' in q['sql'] and 'LIMIT' in q['sql']]
+        self.assertEqual(len(page_sql), 1)
+        self.assertNotIn('reviews', page_sql[0])
+
+
+@override_settings(REVIEW_CLAIM_BATCH_SIZE=4, REVIEW_CLAIM_LEASE_MINUTES=10)
+class ModerationQueueTests(TestCase):
+    """Moderators lease disjoint batches and settle each batch in one UPDATE."""
+
+    def setUp(self):
+        self.mods = [
+            User.objects.create_user(username=f'mod{i}', password='x', is_staff=True) for i in range(2)
+        ]
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(title='Book', author='A', publisher='P', publish_year=2022, category=cat)
+        users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(10)])
+        Review.objects.bulk_create([
+            Review(user=user, book=self.book, rating=i % 5 + 1, content=f'review {i}') for i, user in enumerate(users)
+        ])
+
+    def test_claims_are_disjoint_and_topped_up(self):
+        self.assertEqual(claim_batch(self.mods[0]), 4)
+        self.assertEqual(claim_batch(self.mods[1]), 4)
+        self.assertEqual(claim_batch(self.mods[0]), 0)  # already holds a full batch
+        first, second = ({r.pk for r in claimed_by(mod)} for mod in self.mods)
+        self.assertEqual(len(first | second), 8)
+        # The oldest reviews went first
+        self.assertEqual(first, set(Review.objects.order_by('created_at', 'id').values_list('pk', flat=True)[:4]))
+
+    def test_batch_approve_is_one_update_and_updates_ratings(self):
+        self.client.force_login(self.mods[0])
+        self.client.post(reverse('reviews:moderation_queue'), {'action': 'claim'})
+        ids = [r.pk for r in claimed_by(self.mods[0])]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('reviews:moderation_queue'), {'action': 'approve', 'ids': ids})
+        review_updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "reviews"')]
+        self.assertEqual(len(review_updates), 1)
+        self.assertEqual(Review.objects.filter(status='APPROVED', moderated_by=self.mods[0]).count(), 4)
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual((book.rating_count, book.rating_sum), (4, 1 + 2 + 3 + 4))
+        self.assertEqual(moderator_throughput()[0]['username'], 'mod0')
+        self.assertEqual(moderator_throughput()[0]['reviews'], 4)
+
+    def test_expired_lease_returns_to_the_pool(self):
+        claim_batch(self.mods[0])
+        stale = [r.pk for r in claimed_by(self.mods[0])]
+        Review.objects.filter(pk__in=stale).update(claimed_until=timezone.now() - timedelta(minutes=1))
+        claim_batch(self.mods[1])
+        self.assertEqual({r.pk for r in claimed_by(self.mods[1])}, set(stale))
+        # The first moderator can no longer settle them
+        self.assertEqual(moderate_batch(self.mods[0], stale, 'REJECTED'), 0)
+
+    def test_single_approve_respects_other_moderators_claims(self):
+        claim_batch(self.mods[1])
+        review = claimed_by(self.mods[1]).first()
+        self.client.force_login(self.mods[0])
+        self.client.post(reverse('reviews:approve_review', args=[review.pk]))
+        self.assertEqual(Review.objects.get(pk=review.pk).status, 'PENDING')
+
+
+class ReviewScoringTests(TestCase):
+    def test_matcher_finds_whole_words_only(self):
+        matcher = Matcher(['vl', 'óc chó', 'shit'])
+        self.assertEqual(matcher.find('đọc xong thấy vl thật'), {'vl'})
+        self.assertEqual(matcher.find('xem vlog về sách, shitake'), set())
+        self.assertEqual(matcher.find('tác giả là đồ óc chó.'), {'óc chó'})
+        # Diacritics are kept: the unaccented spelling needs its own entry
+        self.assertEqual(matcher.find('oc cho'), set())
+
+    def test_heuristics(self):
+        clean = 'Cốt truyện chặt chẽ, nhân vật có chiều sâu, rất đáng đọc.'
+        self.assertEqual(score_text(clean), (0, []))
+        self.assertIn('short', score_text('Hay')[1])
+        self.assertIn('link', score_text('Mua sách rẻ tại http://example.com nhé mọi người')[1])
+        self.assertIn('shouting', score_text('SÁCH NÀY QUÁ TỆ LUÔN ĐỪNG MUA')[1])
+        self.assertIn('repetition', score_text('hay hay hay hay hay hay hay hay quá đi')[1])
+        self.assertEqual(score_text('Sách như shit, không nên đọc chút nào'), (100, ['blocklist']))
+
+    @override_settings(REVIEW_AUTO_APPROVE_ENABLED=True, REVIEW_AUTO_APPROVE_MAX_SCORE=0)
+    def test_clean_review_is_auto_approved_and_flagged_one_queued(self):
+        cat = Category.objects.create(name='Test', description='')
+        book = Book.objects.create(title='Book', author='A', publisher='P', publish_year=2022, category=cat)
+        users = [User.objects.create_user(username=f'u{i}', password='x') for i in range(2)]
+        for user in users:
+            br = BorrowRequest.objects.create(
+                user=user, book=book, expected_return_date=timezone.localdate(), status='APPROVED',
+            )
+            BorrowTransaction.objects.create(
+                borrow_request=br, due_at=timezone.now(), status='RETURNED', returned_at=timezone.now(),
+            )
+        url = reverse('reviews:create_review', args=[book.pk])
+        self.client.force_login(users[0])
+        self.client.post(url, {'rating': 4, 'content': 'Văn phong nhẹ nhàng, kết thúc bất ngờ và cảm động.'})
+        self.client.force_login(users[1])
+        self.client.post(url, {'rating': 1, 'content': 'Ghé www.casino.vn để nhận quà'})
+
+        clean, flagged = Review.objects.order_by('id')
+        self.assertEqual((clean.status, clean.moderation_score), ('APPROVED', 0))
+        self.assertEqual(flagged.status, 'PENDING')
+        self.assertEqual(flagged.moderation_flags, 'blocklist,link')
+        book.refresh_from_db()
+        self.assertEqual((book.rating_count, book.rating_sum), (1, 4))
+
+    @override_settings(REVIEW_AUTO_APPROVE_ENABLED=True, REVIEW_AUTO_APPROVE_MAX_SCORE=0)
+    def test_rescore_backlog(self):
+        cat = Category.objects.create(name='Test', description='')
+        book = Book.objects.create(title='Book', author='A', publisher='P', publish_year=2022, category=cat)
+        users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(3)])
+        Review.objects.bulk_create([
+            Review(user=users[0], book=book, rating=5, content='Một cuốn sách tuyệt vời cho mùa hè.'),
+            Review(user=users[1], book=book, rating=3, content='fuck this book, thật sự'),
+            Review(user=users[2], book=book, rating=2, content='Ổn thôi'),
+        ])
+        self.assertEqual(rescore_pending(batch_size=2, approve=True), (3, 1))
+        self.assertEqual(
+            list(Review.objects.order_by('id').values_list('status', 'moderation_flags')),
+            [('APPROVED', ''), ('PENDING', 'blocklist'), ('PENDING', 'short')],
+        )
+        self.assertEqual(Book.objects.get(pk=book.pk).rating_count, 1)
+
+
+class ReviewSearchTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(title='Book', author='A', publisher='P', publish_year=2022, category=cat)
+        self.other = Book.objects.create(title='Other', author='A', publisher='P', publish_year=2022, category=cat)
+        users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(4)])
+        Review.objects.bulk_create([
+            Review(user=users[0], book=self.book, rating=5, status='APPROVED', content='Cốt truyện rất đáng đọc'),
+            Review(user=users[1], book=self.book, rating=3, status='APPROVED', content='Đáng tiền, đọc rất nhanh'),
+            Review(user=users[2], book=self.book, rating=1, status='PENDING', content='Cốt truyện rất đáng đọc'),
+            Review(user=users[3], book=self.other, rating=4, status='APPROVED', content='Rất đáng đọc'),
+        ])
+        rebuild_review_index()
+
+    def _search(self, query, **scope):
+        return [r.content for r in search_reviews(Review.objects.all(), query, **scope)]
+
+    def test_phrase_prefix_and_scope(self):
+        approved_here = {'status': ['APPROVED'], 'book_id': self.book.pk}
+        # Folded prefix terms match in any order
+        self.assertEqual(len(self._search('dang doc', **approved_here)), 2)
+        self.assertEqual(self._search('cốt tr', **approved_here), ['Cốt truyện rất đáng đọc'])
+        # Phrases need consecutive words
+        self.assertEqual(self._search('"rất đáng đọc"', **approved_here), ['Cốt truyện rất đáng đọc'])
+        self.assertEqual(self._search('"đọc rất"', **approved_here), ['Đáng tiền, đọc rất nhanh'])
+        self.assertEqual(self._search('"rất đáng đọc"', status=['PENDING']), ['Cốt truyện rất đáng đọc'])
+        self.assertEqual(len(self._search('"rất đáng đọc"')), 3)
+
+    def test_index_follows_moderation(self):
+        pending = Review.objects.get(status='PENDING')
+        moderator = User.objects.create_user(username='mod', password='x', is_staff=True)
+        self.client.force_login(moderator)
+        self.client.post(reverse('reviews:reject_review', args=[pending.pk]))
+        self.assertEqual(self._search('cot truyen', status=['PENDING']), [])
+        self.assertEqual(len(self._search('cot truyen', status=['REJECTED'])), 1)
+
+    def test_book_detail_search(self):
+        resp = self.client.get(reverse('library:book_detail', args=[self.book.pk]), {'rq': '"đáng đọc"'})
+        self.assertEqual([r.content for r in resp.context['reviews']], ['Cốt truyện rất đáng đọc'])
+
+
+class BookReviewFeedTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Test', description='')
+        self.book = Book.objects.create(title='Book', author='A', publisher='P', publish_year=2022, category=cat)
+        users = User.objects.bulk_create([User(username=f'reader{i}') for i in range(25)])
+        Review.objects.bulk_create([
+            Review(user=user, book=self.book, rating=i % 5 + 1, content=f'review {i}', status='APPROVED')
+            for i, user in enumerate(users)
+        ])
+        recompute_ratings()
+        self.url = reverse('reviews:book_feed', args=[self.book.pk])
+
+    def _walk(self, **params):
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(self.url, {**params, **({'cursor': cursor} if cursor else {})}).json()
+            seen.extend(data['reviews'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_walk_newest_first_with_rating_filter(self):
+        seen = self._walk()
+        self.assertEqual(len({r['id'] for r in seen}), 25)
+        self.assertEqual([r['id'] for r in seen], sorted((r['id'] for r in seen), reverse=True))
+        self.assertEqual({r['rating'] for r in self._walk(rating='5')}, {5})
+        self.assertEqual(len(self._walk(rating='5')), 5)
+
+    def test_etag_answers_304_until_a_review_is_approved(self):
+        resp = self.client.get(self.url)
+        etag = resp['ETag']
+        with self.assertNumQueries(1):  # book counters only
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        late = User.objects.create_user(username='late', password='x')
+        review = Review.objects.create(user=late, book=self.book, rating=4, content='review mới')
+        moderator = User.objects.create_user(username='mod', password='x', is_staff=True)
+        self.client.force_login(moderator)
+        self.client.post(reverse('reviews:approve_review', args=[review.pk]))
+        self.client.logout()
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['reviews'][0]['content'], 'review mới')
+
+    def test_detail_page_continues_from_cached_reviews(self):
+        resp = self.client.get(reverse('library:book_detail', args=[self.book.pk]))
+        shown = [r.pk for r in resp.context['reviews']]
+        data = self.client.get(self.url, {'cursor': resp.context['feed_cursor']}).json()
+        rest = [r['id'] for r in data['reviews']]
+        self.assertEqual(len(shown) + len(rest), 20)
+        self.assertFalse(set(shown) & set(rest))
+        self.assertLess(max(rest), min(shown))
@@ -5,7 +5,9 @@ app_name = 'reviews'
 
 urlpatterns = [
     path('create/<int:book_id>/', views.create_review_view, name='create_review'),
+    path('book/<int:book_id>/feed/', views.book_reviews_feed_view, name='book_feed'),
     path('admin/pending/', views.admin_pending_reviews_view, name='admin_pending'),
+    path('admin/queue/', views.moderation_queue_view, name='moderation_queue'),
     path('admin/approve/<int:pk>/', views.approve_review_view, name='approve_review'),
     path('admin/reject/<int:pk>/', views.reject_review_view, name='reject_review'),
 ]
\ No newline at end of file
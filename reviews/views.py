@@ -1,12 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_GET
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.utils import timezone
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 from .models import Review
 from .forms import ReviewForm
 from library.models import Book
 from borrowing.models import BorrowTransaction
+from dashboard.snapshot import invalidate_dashboard
+from library.detail_cache import invalidate_book_detail
+from library.pagination import KeysetPaginator
+from library.ratings import record_rating
+from .moderation import available_to, claim_batch, claimed_by, moderate_batch, release_claims
+from .feed import feed_etag, feed_paginator, parse_rating, serialize
+from .scoring import prescore
+from .search import review_search_q, sync_status
+from library.search import admin_search_q
+
+ADMIN_PAGE_SIZE = 25
 
 
 @login_required
@@ -35,8 +50,11 @@ def create_review_view(request, book_id):
             review = form.save(commit=False)
             review.user = request.user
             review.book = book
-            review.save()
-            messages.success(request, 'Đã gửi đánh giá. Đánh giá sẽ được hiển thị sau khi được duyệt.')
+            if prescore(review):
+                messages.success(request, 'Đã đăng đánh giá. Cảm ơn bạn!')
+            else:
+                messages.success(request, 'Đã gửi đánh giá. Đánh giá sẽ được hiển thị sau khi được duyệt.')
+            invalidate_dashboard()
             return redirect('library:book_detail', pk=book_id)
     else:
         form = ReviewForm()
@@ -44,6 +62,19 @@ def create_review_view(request, book_id):
     return render(request, 'reviews/create_review.html', {'form': form, 'book': book})
 
 
+@require_GET
+@condition(etag_func=feed_etag)
+def book_reviews_feed_view(request, book_id):
+    """JSON: one page of a book's approved reviews, ``?cursor=`` / ``?rating=``."""
+    if not Book.objects.filter(pk=book_id, is_active=True).exists():
+        raise Http404('Không tìm thấy sách')
+    page = feed_paginator(book_id, parse_rating(request.GET.get('rating'))).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'reviews': [serialize(review) for review in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
 def is_admin(user):
     return user.is_staff
 
@@ -51,26 +82,26 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_pending_reviews_view(request):
-    """Admin: pending reviews with search/sort."""
-    qs = Review.objects.filter(status='PENDING').select_related('user', 'book')
+    """Admin: pending reviews with search/sort, keyset-paginated."""
+    qs = Review.objects.filter(status='PENDING').select_related('user', 'book', 'claimed_by')
 
-    search = request.GET.get('search', '')
+    search = request.GET.get('search', '').strip()
     if search:
-        qs = qs.filter(
-            Q(user__username__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(book__title__icontains=search) |
-            Q(content__icontains=search)
-        )
+        # Username / email / title prefixes and the review token index only: no LIKE '%...%' scan
+        q = admin_search_q(search) | Q(user__in=User.objects.filter(email__istartswith=search).values('pk'))
+        content_q = review_search_q(search, status=['PENDING'])
+        qs = qs.filter(q | content_q if content_q is not None else q)
 
     sort = request.GET.get('sort', '-created_at')
-    if sort in ['created_at', '-created_at', 'rating', '-rating']:
-        qs = qs.order_by(sort)
-    else:
-        qs = qs.order_by('-created_at')
+    if sort not in ['created_at', '-created_at', 'rating', '-rating']:
+        sort = '-created_at'
+    qs = qs.order_by(sort, '-id' if sort.startswith('-') else 'id')
+
+    page = KeysetPaginator(qs, ADMIN_PAGE_SIZE).get_page(request.GET.get('cursor'))
 
     return render(request, 'reviews/admin_pending_reviews.html', {
-        'reviews': qs,
+        'now': timezone.now(),
+        'reviews': page,
         'search': search,
         'sort': sort,
     })
@@ -82,10 +113,21 @@ def approve_review_view(request, pk):
     review = get_object_or_404(Review, pk=pk, status='PENDING')
 
     if request.method == 'POST':
-        review.status = 'APPROVED'
-        review.moderated_by = request.user
-        review.moderated_at = timezone.now()
-        review.save()
+        # Conditional UPDATE so a double submit can't count the rating twice, and
+        # a review leased to another moderator's queue is left to them
+        now = timezone.now()
+        with transaction.atomic():
+            done = Review.objects.filter(available_to(request.user, now), pk=review.pk).update(
+                status='APPROVED', moderated_by=request.user, moderated_at=now, claimed_by=None, claimed_until=None,
+            )
+            if done:
+                sync_status([review.pk], 'APPROVED')
+                record_rating(review.book_id, review.rating)
+        if not done:
+            messages.error(request, 'Đánh giá này đã được xử lý hoặc đang được người khác duyệt')
+            return redirect('reviews:admin_pending')
+        invalidate_book_detail(review.book_id)
+        invalidate_dashboard()
         messages.success(request, 'Đã duyệt đánh giá')
         return redirect('reviews:admin_pending')
 
@@ -98,11 +140,49 @@ def reject_review_view(request, pk):
     review = get_object_or_404(Review, pk=pk, status='PENDING')
 
     if request.method == 'POST':
-        review.status = 'REJECTED'
-        review.moderated_by = request.user
-        review.moderated_at = timezone.now()
-        review.save()
+        # Rejected reviews never reach the rating aggregates; the conditional UPDATE keeps
+        # a concurrent approval from being flipped to REJECTED after it was counted
+        now = timezone.now()
+        with transaction.atomic():
+            done = Review.objects.filter(available_to(request.user, now), pk=review.pk).update(
+                status='REJECTED', moderated_by=request.user, moderated_at=now, claimed_by=None, claimed_until=None,
+            )
+            if done:
+                sync_status([review.pk], 'REJECTED')
+        if not done:
+            messages.error(request, 'Đánh giá này đã được xử lý hoặc đang được người khác duyệt')
+            return redirect('reviews:admin_pending')
+        invalidate_dashboard()
         messages.success(request, 'Đã từ chối đánh giá')
         return redirect('reviews:admin_pending')
 
-    return render(request, 'reviews/reject_review.html', {'review': review})
\ No newline at end of file
+    return render(request, 'reviews/reject_review.html', {'review': review})
+
+@login_required
+@user_passes_test(is_admin)
+def moderation_queue_view(request):
+    """Hàng đợi duyệt: mỗi người nhận một lô review riêng rồi duyệt / từ chối cả lô."""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'claim':
+            claimed = claim_batch(request.user)
+            if claimed:
+                messages.success(request, f'Đã nhận thêm {claimed} đánh giá')
+            else:
+                messages.info(request, 'Không còn đánh giá nào chưa có người nhận')
+        elif action in ('approve', 'reject'):
+            ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+            status = 'APPROVED' if action == 'approve' else 'REJECTED'
+            done = moderate_batch(request.user, ids, status)
+            if done:
+                invalidate_dashboard()
+                verb = 'duyệt' if action == 'approve' else 'từ chối'
+                messages.success(request, f'Đã {verb} {done} đánh giá')
+            else:
+                messages.warning(request, 'Chưa chọn đánh giá nào (hoặc lượt nhận đã hết hạn)')
+        elif action == 'release':
+            release_claims(request.user)
+            messages.info(request, 'Đã trả lại các đánh giá chưa xử lý')
+        return redirect('reviews:moderation_queue')
+
+    return render(request, 'reviews/moderation_queue.html', {'reviews': list(claimed_by(request.user))})